@@ -1,655 +1,1023 @@
+import argparse
+import operator
 import sys
-import random
-import math
+import time
+from collections import OrderedDict
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QGraphicsView, QGraphicsScene, 
-    QGraphicsRectItem, QGraphicsEllipseItem, QGraphicsTextItem)
-from PyQt6.QtGui import QBrush, QPainter, QFont, QColor, QRadialGradient, QLinearGradient
+    QGraphicsItem, QGraphicsRectItem, QGraphicsEllipseItem)
+from PyQt6.QtGui import (
+    QBrush, QPainter, QFont, QColor, QRadialGradient, QLinearGradient, QPolygonF,
+    QPixmap, QStaticText, QFontMetricsF, QTransform)
 from PyQt6.QtCore import Qt, QTimer, QPointF, QRectF
 from PyQt6.QtGui import QPen
+import numpy as np
+
+import engine
+import levels
+from pacing import FramePacer, QualityController
+from particles import PARTICLE_SIZE
+from pools import DEFAULT_POOL_SIZES, Pool
+from profiler import COUNTERS, PHASES, PHASE_PAINT, PHASE_SYNC, FrameProfiler, LatencyMeter
+from replay import InputLog
+from simthread import SimulationThread
+from snapshot import Rewind
+from spectate import SpectatorServer
+
+# Large boards: how far outside the view entities are still drawn, and how
+# far the camera moves towards its target each frame
+CULL_MARGIN = 200
+CAMERA_EASING = 0.2
+# How far one press of Backspace goes back
+REWIND_TICKS = engine.ms_to_ticks(5000)
+
+
+def lerp(a, b, alpha):
+    return a + (b - a) * alpha
+
 
 # Paddle Class
-class Paddle(QGraphicsRectItem):
-    def __init__(self, scene_width, scene_height):
-        super().__init__(0, 0, 100, 15)
-        self.normal_width = 100
-        self.setBrush(QBrush(QColor(70, 130, 180)))
-        self.setPos(scene_width / 2 - 50, scene_height - 40)
-        self.scene_width = scene_width
-        self.scene_height = scene_height
-        self.speed = 10
-        self.sticky = False
-        self.power_timer = QTimer()
-        self.power_timer.timeout.connect(self.reset_power)
-        self.power_timer.setSingleShot(True)
-
-    def move_left(self):
-        self.setX(max(0, self.x() - self.speed))
-
-    def move_right(self):
-        self.setX(min(self.scene_width - self.rect().width(), self.x() + self.speed))
-
-    def expand(self):
-        self.power_timer.stop()
-        old_width = self.rect().width()
-        new_width = self.normal_width * 1.5
-        self.setRect(0, 0, new_width, self.rect().height())
-        self.setX(self.x() - (new_width - old_width) / 2)
-        self.power_timer.start(10000)
-
-    def shrink(self):
-        self.power_timer.stop()
-        new_width = self.normal_width * 0.75
-        current_center = self.x() + self.rect().width() / 2
-        self.setRect(0, 0, new_width, self.rect().height())
-        self.setX(current_center - new_width / 2)
-        self.power_timer.start(8000)
-
-    def make_sticky(self):
-        self.power_timer.stop()
-        self.sticky = True
-        self.setBrush(QBrush(QColor(50, 205, 50)))
-        self.power_timer.start(15000)
-
-    def reset_power(self):
-        current_center = self.x() + self.rect().width() / 2
-        self.setRect(0, 0, self.normal_width, self.rect().height())
-        self.setX(current_center - self.normal_width / 2)
-        self.sticky = False
-        self.setBrush(QBrush(QColor(70, 130, 180)))
+class PaddleItem(QGraphicsRectItem):
+    def __init__(self, paddle):
+        super().__init__(0, 0, paddle.width, paddle.height)
+        self.paddle = paddle
+        self.sticky = None
+        self.setPen(QPen(Qt.PenStyle.NoPen))
+        self.sync()
+
+    def sync(self, alpha=1.0):
+        paddle = self.paddle
+        if self.rect().width() != paddle.width:
+            self.setRect(0, 0, paddle.width, paddle.height)
+        if self.sticky != paddle.sticky:
+            self.sticky = paddle.sticky
+            color = QColor(50, 205, 50) if paddle.sticky else QColor(70, 130, 180)
+            self.setBrush(QBrush(color))
+        self.setPos(lerp(paddle.prev_x, paddle.x, alpha), paddle.y)
 
 
 # Ball Class
-class Ball(QGraphicsEllipseItem):
-    def __init__(self, scene_width, scene_height, game):
-        super().__init__(0, 0, 15, 15)
+class BallItem(QGraphicsEllipseItem):
+    def __init__(self):
+        super().__init__(0, 0, engine.Ball.size, engine.Ball.size)
+        self.ball = None
         gradient = QRadialGradient(7, 7, 7, 3, 3)
         gradient.setColorAt(0, QColor(255, 255, 255))
         gradient.setColorAt(0.7, QColor(220, 20, 60))
         gradient.setColorAt(1, QColor(139, 0, 0))
         self.setBrush(QBrush(gradient))
         self.setPen(QPen(Qt.GlobalColor.transparent))
-        self.setPos(scene_width / 2, scene_height / 2)
-        self.vx = random.choice([-4, 4])
-        self.vy = -4
-        self.scene_width = scene_width
-        self.scene_height = scene_height
-        self.in_play = True
-        self.game = game
-        self.trail_points = []
-        self.trail_timer = 0
-
-    def move(self):
-        if not self.in_play:
-            return
 
-        self.setPos(self.x() + self.vx, self.y() + self.vy)
-
-        # Wall collisions
-        if self.x() <= 0 or self.x() + self.rect().width() >= self.scene_width:
-            self.vx *= -1
-        if self.y() <= 0:
-            self.vy *= -1
-
-        # Fell out
-        if self.y() > self.scene_height:
-            self.in_play = False
-            self.game.ball_lost()
-
-        # Trail
-        self.trail_timer += 1
-        if self.trail_timer >= 3:
-            self.trail_points.append((self.x() + 7.5, self.y() + 7.5))
-            self.trail_timer = 0
-            if len(self.trail_points) > 8:
-                self.trail_points.pop(0)
-
-    def reset(self):
-        self.setPos(self.scene_width / 2, self.scene_height / 2)
-        self.vx = random.choice([-4, 4])
-        self.vy = -4
-        self.in_play = True
-        self.trail_points = []
-
-    def draw_trail(self, painter):
-        if len(self.trail_points) < 2:
-            return
+    def bind(self, ball):
+        self.ball = ball
+
+    def sync(self, alpha=1.0):
+        ball = self.ball
+        self.setPos(lerp(ball.prev_x, ball.x, alpha), lerp(ball.prev_y, ball.y, alpha))
+
+
+# Trail Layer
+class TrailLayer(QGraphicsItem):
+    """Draws every ball's trail from a pre-rendered sprite atlas.
+
+    Trail step ``i`` of a trail with ``n`` points always has the same alpha
+    and size, so each (n, i) glow is rendered once into the atlas and then
+    blitted.
+    """
+    cell = 18
+
+    def __init__(self, balls_source, max_length=engine.TRAIL_LENGTH + 1):
+        super().__init__()
+        self.balls_source = balls_source
+        self.max_length = max_length
+        self.atlas, self.sprites = self.build_atlas(max_length)
+        self.rect = QRectF()
+        self.shown = []
+        self.setZValue(-1)
+
+    def build_atlas(self, max_length):
+        cell = self.cell
+        atlas = QPixmap(cell * max_length, cell * (max_length + 1))
+        atlas.fill(Qt.GlobalColor.transparent)
+        sprites = {}
+        painter = QPainter(atlas)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         painter.setPen(Qt.PenStyle.NoPen)
-        for i in range(len(self.trail_points) - 1):
-            alpha = int(i / len(self.trail_points) * 255)
-            size = 5 + i * 0.5
-            gradient = QRadialGradient(self.trail_points[i][0], self.trail_points[i][1], size)
-            gradient.setColorAt(0, QColor(255, 100, 100, alpha))
-            gradient.setColorAt(1, QColor(255, 0, 0, 0))
-            painter.setBrush(QBrush(gradient))
-            painter.drawEllipse(QPointF(self.trail_points[i][0], self.trail_points[i][1]), size, size)
-
-
-# Brick Class
-class Brick(QGraphicsRectItem):
-    def __init__(self, x, y, width, height, type="normal", health=1, game=None):
-        super().__init__(0, 0, width, height)
-        self.type = type
-        self.health = health
-        self.max_health = health
-        self.game = game
-        self.setPos(x, y)
-        self.update_color()
-        self.setPen(QPen(Qt.PenStyle.NoPen))
+        for n in range(2, max_length + 1):
+            for i in range(n - 1):
+                alpha = int(i / n * 255)
+                size = 5 + i * 0.5
+                center = QPointF(i * cell + cell / 2, n * cell + cell / 2)
+                gradient = QRadialGradient(center, size)
+                gradient.setColorAt(0, QColor(255, 100, 100, alpha))
+                gradient.setColorAt(1, QColor(255, 0, 0, 0))
+                painter.setBrush(QBrush(gradient))
+                painter.drawEllipse(center, size, size)
+                sprites[n, i] = QRectF(i * cell, n * cell, cell, cell)
+        painter.end()
+        return atlas, sprites
+
+    def boundingRect(self):
+        return self.rect
+
+    def sync(self, area=None):
+        # Track the box around all trail points so only that area repaints;
+        # balls outside area (the visible part of a large board) are skipped
+        self.shown = [ball for ball in self.balls_source()
+                      if area is None or area.contains(ball.x, ball.y)]
+        x0 = y0 = float("inf")
+        x1 = y1 = float("-inf")
+        for ball in self.shown:
+            for x, y in ball.trail_points:
+                x0 = min(x0, x)
+                y0 = min(y0, y)
+                x1 = max(x1, x)
+                y1 = max(y1, y)
+        half = self.cell / 2
+        rect = QRectF(x0 - half, y0 - half, x1 - x0 + self.cell, y1 - y0 + self.cell) \
+            if x0 <= x1 else QRectF()
+        if rect != self.rect:
+            self.prepareGeometryChange()
+            self.rect = rect
+        self.update()
+
+    def paint(self, painter, option, widget=None):
+        half = self.cell / 2
+        sprites = self.sprites
+        atlas = self.atlas
+        for ball in self.shown:
+            points = ball.trail_points
+            n = min(len(points), self.max_length)
+            for i in range(n - 1):
+                x, y = points[i]
+                painter.drawPixmap(QPointF(x - half, y - half), atlas, sprites[n, i])
+
+
+# Brick Layer
+class BrickLayer(QGraphicsItem):
+    """Draws every brick from cached pixmap tiles.
+
+    The layout is split into square tiles that are rendered the first time
+    they are painted. After that a hit only redraws the area of the bricks
+    that changed inside their tile, so painting costs the same blit per tile
+    however many bricks the layout holds. On large boards only the most
+    recently painted tiles keep their pixmaps. Bricks can overlap (power-up
+    bricks are stacked on regular ones), so bricks are always drawn in slot
+    order and later ones stay on top.
+    """
+    tile_size = 512
+    max_tiles = 48
 
-    def update_color(self):
-        if self.type == "normal":
-            colors = [QColor(220, 20, 60), QColor(255, 140, 0), QColor(255, 215, 0),
-                    QColor(50, 205, 50), QColor(65, 105, 225)]
-            color_idx = min(self.max_health - self.health, len(colors) - 1)
-            self.setBrush(QBrush(colors[color_idx]))
-        elif self.type == "strong":
-            self.setBrush(QBrush(QColor(70, 130, 180)))
-        elif self.type == "explosive":
-            self.setBrush(QBrush(QColor(178, 34, 34)))
-        elif self.type == "powerup":
-            gradient = QLinearGradient(0, 0, self.rect().width(), 0)
-            gradient.setColorAt(0, QColor(255, 105, 180))
-            gradient.setColorAt(0.5, QColor(255, 215, 0))
-            gradient.setColorAt(1, QColor(255, 105, 180))
-            self.setBrush(QBrush(gradient))
-
-    def hit(self):
-        self.health -= 1
-        if self.health <= 0:
-            if self.type == "explosive":
-                self.game.explode_brick(self)
-            elif self.type == "powerup":
-                self.game.spawn_powerup(self.x() + self.rect().width()/2, self.y() + self.rect().height()/2)
-            return True
-        else:
-            self.update_color()
-            return False
+    def __init__(self):
+        super().__init__()
+        self.rect = QRectF()
+        # (column, row) -> [pixmap or None, bricks touching the tile]
+        self.tiles = {}
+        self.rendered = OrderedDict()
+        self.stamps = {}
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self):
+        return self.rect
+
+    def rebuild(self, bricks):
+        right = max((brick.x + brick.width for brick in bricks), default=0)
+        bottom = max((brick.y + brick.height for brick in bricks), default=0)
+        self.prepareGeometryChange()
+        self.rect = QRectF(0, 0, right, bottom)
+        self.tiles = {}
+        self.rendered.clear()
+        for brick in sorted(bricks, key=operator.attrgetter("slot")):
+            for key in self.tile_keys(brick):
+                tile = self.tiles.get(key)
+                if tile is None:
+                    tile = self.tiles[key] = [None, []]
+                tile[1].append(brick)
+        self.update()
+
+    def tile_keys(self, brick):
+        size = self.tile_size
+        for row in range(int(brick.y // size), int((brick.y + brick.height - 1) // size) + 1):
+            for col in range(int(brick.x // size), int((brick.x + brick.width - 1) // size) + 1):
+                yield col, row
+
+    def stamp(self, brick):
+        # One pre-rendered pixmap per look, blitted for every brick sharing it
+        key = ("powerup" if brick.type == "powerup" else brick.color(),
+               brick.width, brick.height)
+        pixmap = self.stamps.get(key)
+        if pixmap is None:
+            pixmap = QPixmap(int(brick.width), int(brick.height))
+            painter = QPainter(pixmap)
+            if brick.type == "powerup":
+                gradient = QLinearGradient(0, 0, brick.width, 0)
+                gradient.setColorAt(0, QColor(255, 105, 180))
+                gradient.setColorAt(0.5, QColor(255, 215, 0))
+                gradient.setColorAt(1, QColor(255, 105, 180))
+                painter.fillRect(pixmap.rect(), QBrush(gradient))
+            else:
+                painter.fillRect(pixmap.rect(), QColor(*brick.color()))
+            painter.end()
+            self.stamps[key] = pixmap
+        return pixmap
+
+    def render_tile(self, key):
+        left = key[0] * self.tile_size
+        top = key[1] * self.tile_size
+        pixmap = QPixmap(self.tile_size, self.tile_size)
+        pixmap.fill(Qt.GlobalColor.transparent)
+        painter = QPainter(pixmap)
+        for brick in self.tiles[key][1]:
+            if brick.alive:
+                painter.drawPixmap(QPointF(brick.x - left, brick.y - top), self.stamp(brick))
+        painter.end()
+        self.tiles[key][0] = pixmap
+        self.rendered[key] = True
+        while len(self.rendered) > self.max_tiles:
+            oldest, _ = self.rendered.popitem(last=False)
+            self.tiles[oldest][0] = None
+
+    def refresh(self, bricks):
+        """Redraw the area of changed bricks in the tiles already rendered.
+
+        The area is cleared and every alive brick overlapping it is drawn
+        again in slot order, so a brick under or over the changed one comes
+        back as it was.
+        """
+        for brick in bricks:
+            area = QRectF(brick.x, brick.y, brick.width, brick.height)
+            for key in self.tile_keys(brick):
+                tile = self.tiles.get(key)
+                if tile is None or tile[0] is None:
+                    continue
+                left = key[0] * self.tile_size
+                top = key[1] * self.tile_size
+                painter = QPainter(tile[0])
+                painter.setClipRect(area.translated(-left, -top))
+                painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_Source)
+                painter.fillRect(area.translated(-left, -top), Qt.GlobalColor.transparent)
+                painter.setCompositionMode(QPainter.CompositionMode.CompositionMode_SourceOver)
+                for other in tile[1]:
+                    if (other.alive and other.x < area.right() and area.left() < other.x + other.width
+                            and other.y < area.bottom() and area.top() < other.y + other.height):
+                        painter.drawPixmap(QPointF(other.x - left, other.y - top), self.stamp(other))
+                painter.end()
+            self.update(area)
+
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect.intersected(self.rect)
+        if painter.hasClipping():
+            # Rendering outside a paint event exposes the whole item; the
+            # clip still says which part is actually drawn
+            exposed = exposed.intersected(painter.clipBoundingRect())
+        if exposed.isEmpty():
+            return
+        size = self.tile_size
+        for row in range(int(exposed.top() // size), int(exposed.bottom() // size) + 1):
+            for col in range(int(exposed.left() // size), int(exposed.right() // size) + 1):
+                key = (col, row)
+                tile = self.tiles.get(key)
+                if tile is None:
+                    continue
+                if tile[0] is None:
+                    self.render_tile(key)
+                else:
+                    self.rendered.move_to_end(key)
+                origin = QPointF(col * size, row * size)
+                source = exposed.intersected(QRectF(origin.x(), origin.y(), size, size))
+                painter.drawPixmap(source, tile[0], source.translated(-origin))
 
 
 # PowerUp Class
-class PowerUp(QGraphicsEllipseItem):
-    def __init__(self, x, y, type, game):
-        super().__init__(0, 0, 20, 20)
-        self.type = type
-        self.game = game
-        self.setPos(x, y)
-        self.vy = 2
-        self.setPen(Qt.PenStyle.NoPen)
-        colors = {"expand": QColor(65, 105, 225), "shrink": QColor(255, 99, 71),
-                "multiball": QColor(255, 215, 0), "extra_life": QColor(50, 205, 50),
-                "sticky": QColor(138, 43, 226)}
-        self.setBrush(QBrush(colors.get(type, QColor(255, 255, 255))))
-
-    def move(self):
-        self.setPos(self.x(), self.y() + self.vy)
-        if self.y() > self.game.scene_height:
-            self.game.scene().removeItem(self)
-            return True
-        return False
-
-
-# Particle Class
-class Particle(QGraphicsEllipseItem):
-    def __init__(self, x, y, color):
-        super().__init__(0, 0, 4, 4)
-        self.setPos(x, y)
-        self.vx = random.uniform(-2, 2)
-        self.vy = random.uniform(-2, 2)
-        self.lifetime = 30
-        self.setBrush(QBrush(color))
-        self.setPen(Qt.PenStyle.NoPen)
-
-    def update(self):
-        self.setPos(self.x() + self.vx, self.y() + self.vy)
-        self.lifetime -= 1
-        self.setOpacity(max(0, self.lifetime / 30.0))
-        return self.lifetime > 0
+class PowerUpItem(QGraphicsEllipseItem):
+    colors = {"expand": QColor(65, 105, 225), "shrink": QColor(255, 99, 71),
+              "multiball": QColor(255, 215, 0), "extra_life": QColor(50, 205, 50),
+              "sticky": QColor(138, 43, 226)}
+
+    def __init__(self):
+        super().__init__(0, 0, engine.PowerUp.size, engine.PowerUp.size)
+        self.powerup = None
+        self.type = None
+        self.setPen(QPen(Qt.PenStyle.NoPen))
+
+    def bind(self, powerup):
+        # Pooled power-ups are reused with a different type
+        self.powerup = powerup
+        if self.type != powerup.type:
+            self.type = powerup.type
+            self.setBrush(QBrush(self.colors.get(powerup.type, QColor(255, 255, 255))))
+
+    def sync(self, alpha=1.0):
+        powerup = self.powerup
+        self.setPos(powerup.x, lerp(powerup.prev_y, powerup.y, alpha))
+
+
+# Particle Layer
+class ParticleLayer(QGraphicsItem):
+    alpha_levels = 8
+
+    def __init__(self, particles, rect):
+        super().__init__()
+        self.particles = particles
+        self.rect = QRectF(rect)
+        self.points = QPolygonF()
+        self.pens = {}
+        self.drawn = False
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+        self.setZValue(1)
+
+    def boundingRect(self):
+        return self.rect
+
+    def set_rect(self, rect):
+        self.prepareGeometryChange()
+        self.rect = QRectF(rect)
+
+    def sync(self):
+        # Repaint while particles are alive and once more to clear the last
+        if self.particles.count or self.drawn:
+            self.drawn = self.particles.count > 0
+            self.update()
+
+    def point_buffer(self, n):
+        # Reuse one QPolygonF and write into its storage through NumPy
+        if len(self.points) < n:
+            self.points.fill(QPointF(), max(n, 2 * len(self.points)))
+        ptr = self.points.data()
+        ptr.setsize(len(self.points) * 16)
+        return np.frombuffer(ptr, dtype=np.float64).reshape(-1, 2)
+
+    def pen(self, color_id, level):
+        key = (color_id, level)
+        pen = self.pens.get(key)
+        if pen is None:
+            color = QColor(*self.particles.palette[color_id])
+            color.setAlphaF((level + 1) / self.alpha_levels)
+            pen = QPen(color, PARTICLE_SIZE)
+            pen.setCapStyle(Qt.PenCapStyle.RoundCap)
+            self.pens[key] = pen
+        return pen
+
+    def paint(self, painter, option, widget=None):
+        particles = self.particles
+        n = particles.count
+        if n == 0:
+            return
+        # Only the particles inside the exposed area are drawn
+        exposed = option.exposedRect.adjusted(-PARTICLE_SIZE, -PARTICLE_SIZE, 0, 0)
+        pos = particles.pos[:n]
+        inside = np.flatnonzero((pos[:, 0] >= exposed.left()) & (pos[:, 0] <= exposed.right()) &
+                                (pos[:, 1] >= exposed.top()) & (pos[:, 1] <= exposed.bottom()))
+        n = len(inside)
+        if n == 0:
+            return
+        levels = self.alpha_levels
+        level = np.minimum((particles.opacity()[inside] * levels).astype(np.int32), levels - 1)
+        group = particles.color[inside] * levels + level
+        order = np.argsort(group, kind="stable")
+        points = self.point_buffer(n)
+        points[:n] = pos[inside[order]] + PARTICLE_SIZE / 2
+        counts = np.bincount(group, minlength=1)
+        start = 0
+        for key in np.flatnonzero(counts):
+            size = int(counts[key])
+            painter.setPen(self.pen(int(key) // levels, int(key) % levels))
+            painter.drawPoints(self.points.mid(start, size))
+            start += size
+
+
+# HUD
+class HudField:
+    def __init__(self, x, y, font, color, fmt, visible=True):
+        self.x = x
+        self.y = y
+        self.font = font
+        self.pen = QPen(color)
+        self.line_height = QFontMetricsF(font).lineSpacing()
+        self.fmt = fmt
+        self.values = None
+        self.lines = []
+        self.rect = QRectF()
+        self.visible = visible
+
+    def layout(self, values):
+        # The only place text is laid out; QStaticText keeps the glyph
+        # positions so painting it again is just a blit.
+        self.values = values
+        self.lines = []
+        width = 0
+        for line in self.fmt.format(*values).split("\n"):
+            text = QStaticText(line)
+            text.setTextFormat(Qt.TextFormat.PlainText)
+            text.setPerformanceHint(QStaticText.PerformanceHint.AggressiveCaching)
+            text.prepare(QTransform(), self.font)
+            width = max(width, text.size().width())
+            self.lines.append(text)
+        self.rect = QRectF(self.x, self.y, width, self.line_height * len(self.lines))
+
+
+class HudLayer(QGraphicsItem):
+    """Every HUD counter and banner drawn by one item.
+
+    Values can be set every frame: a field is only laid out again when its
+    values change, and sync() repaints once, covering just the changed fields.
+    """
+
+    def __init__(self, rect):
+        super().__init__()
+        self.rect = rect
+        self.fields = {}
+        self.dirty = QRectF()
+        # Needed for a meaningful exposedRect in paint()
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemUsesExtendedStyleOption)
+        self.setZValue(5)
+
+    def boundingRect(self):
+        return self.rect
+
+    def add_field(self, key, x, y, font, color, fmt, *values, visible=True):
+        field = HudField(x, y, font, color, fmt, visible)
+        field.layout(values)
+        self.fields[key] = field
+        return field
+
+    def set(self, key, *values):
+        field = self.fields[key]
+        if values == field.values:
+            return
+        old = field.rect
+        field.layout(values)
+        if field.visible:
+            self.mark(old.united(field.rect))
+
+    def set_visible(self, key, visible):
+        field = self.fields[key]
+        if visible != field.visible:
+            field.visible = visible
+            self.mark(field.rect)
+
+    def mark(self, rect):
+        self.dirty = self.dirty.united(rect)
+
+    def sync(self):
+        if not self.dirty.isNull():
+            self.update(self.dirty.adjusted(-2, -2, 2, 2))
+            self.dirty = QRectF()
+
+    def paint(self, painter, option, widget=None):
+        exposed = option.exposedRect
+        for field in self.fields.values():
+            if not field.visible or not field.rect.intersects(exposed):
+                continue
+            painter.setFont(field.font)
+            painter.setPen(field.pen)
+            for i, text in enumerate(field.lines):
+                painter.drawStaticText(QPointF(field.x, field.y + i * field.line_height), text)
+
+
+# Profiler Overlay
+class ProfilerOverlay(QGraphicsItem):
+    refresh_frames = 15
+
+    def __init__(self, profiler, latency=None, quality=None):
+        super().__init__()
+        self.profiler = profiler
+        self.latency = latency
+        self.quality = quality
+        self.lines = []
+        self.font = QFont("Courier", 9)
+        self.rect = QRectF(0, 0, 210, 14 * (len(PHASES) + len(COUNTERS) + 5) + 8)
+        self.setZValue(10)
+        self.setVisible(False)
+
+    def boundingRect(self):
+        return self.rect
+
+    def sync(self):
+        # Text only changes every few frames so the overlay stays cheap
+        if not self.isVisible() or self.profiler.frames % self.refresh_frames:
+            return
+        means = self.profiler.recent_mean()
+        counts = self.profiler.last_counts()
+        lines = [f"{name:<16}{ms:6.2f} ms" for name, ms in zip(PHASES, means)]
+        lines.append(f"{'frame':<16}{means.sum():6.2f} ms")
+        lines.append("")
+        lines.extend(f"{name:<16}{int(n):6d}" for name, n in zip(COUNTERS, counts))
+        lines.append("")
+        if self.quality is not None:
+            lines.append(f"{'quality':<16}{self.quality.settings['name']:>6}")
+        if self.latency is not None:
+            latency = self.latency.summary()
+            if latency["count"]:
+                lines.append(f"{'input latency':<16}{latency['p50_ms']:6.1f} ms")
+        self.lines = lines
+        self.update()
+
+    def paint(self, painter, option, widget=None):
+        painter.fillRect(self.rect, QColor(0, 0, 0, 160))
+        painter.setPen(QColor(200, 255, 200))
+        painter.setFont(self.font)
+        for i, line in enumerate(self.lines):
+            painter.drawText(QPointF(6, 16 + i * 14), line)
 
 
 # GameView Class
 class GameView(QGraphicsView):
-    def __init__(self, scene, parent=None):
+    def __init__(self, scene, parent=None, game=None, pool_sizes=None, seed=None,
+                 levels=None, mouse_control=False, adaptive_quality=True, threaded=False,
+                 large_board=False, chaos=False, spectate_port=None):
         super().__init__(scene, parent)
         self.setRenderHint(QPainter.RenderHint.Antialiasing)
+        # The background is a cached pixmap and every moving thing is an
+        # item, so only the bounding box of what changed needs repainting.
+        self.setCacheMode(QGraphicsView.CacheModeFlag.CacheBackground)
+        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.BoundingRectViewportUpdate)
+        self.setOptimizationFlag(QGraphicsView.OptimizationFlag.DontAdjustForAntialiasing)
+        self.scene().setItemIndexMethod(QGraphicsScene.ItemIndexMethod.NoIndex)
         self.setFixedSize(800, 600)
         self.setSceneRect(0, 0, 800, 600)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
-        
+        self.setMouseTracking(True)
+
         # Game state
-        self.score = 0
-        self.lives = 3
-        self.level = 1
-        self.game_over = False
-        self.paused = False
-        self.scene_width = 800
-        self.scene_height = 600
-
-        # Game objects
-        self.paddle = Paddle(self.scene_width, self.scene_height)
-        self.scene().addItem(self.paddle)
-        self.balls = []
-        self.bricks = []
-        self.powerups = []
-        self.particles = []
-
-        # Load levels
-        self.levels = self.load_levels()
-        self.create_bricks()
-        
-        # Add initial ball after bricks are created
-        initial_ball = Ball(self.scene_width, self.scene_height, self)
-        self.scene().addItem(initial_ball)
-        self.balls.append(initial_ball)
+        self.game = game if game is not None else \
+            engine.Game(levels=levels, seed=seed, large_board=large_board, chaos=chaos)
+        # Every session is recorded so it can be saved (F5) and replayed
+        self.game.input_log = InputLog.for_game(self.game)
+        # The last ticks are kept for rewinding (Backspace)
+        self.game.rewind = Rewind()
+        # Optionally stream every tick to spectators on localhost
+        self.spectators = None
+        if spectate_port is not None:
+            self.spectators = SpectatorServer(port=spectate_port).start()
+            self.game.spectators = self.spectators
+        # Threaded, a worker owns the game and the view only reads the
+        # snapshots it publishes; otherwise the view reads the game itself.
+        # Either way self.state is what the scene is synced from.
+        self.sim = SimulationThread(self.game) if threaded else None
+        self.state = self.sim.latest() if threaded else self.game
+        self.entity_key = operator.attrgetter("key") if threaded else id
+        self.scene_width = engine.SCENE_WIDTH
+        self.scene_height = engine.SCENE_HEIGHT
+        # Scene point the view is centred on when the board is larger than
+        # the view and the camera follows the balls
+        self.camera = None
+        self.visible = QRectF(self.sceneRect())
+        self.background_colors = (QColor(25, 25, 50), QColor(10, 10, 30))
+        self.background_cache = None
+        # Paddle follows the mouse instead of the arrow keys (toggle with M)
+        self.mouse_control = mouse_control
+        self.mouse_x = None
+
+        # Scene items mirroring the game state
+        self.paddle_item = PaddleItem(self.state.paddle)
+        self.scene().addItem(self.paddle_item)
+        # Ball and power-up items are pre-allocated hidden in the scene and
+        # shown/hidden as the game's entities come and go.
+        pool_sizes = dict(DEFAULT_POOL_SIZES, **(pool_sizes or {}))
+        self.ball_item_pool = Pool(lambda: self.hidden_item(BallItem), pool_sizes["balls"])
+        self.powerup_item_pool = Pool(lambda: self.hidden_item(PowerUpItem),
+                                      pool_sizes["powerups"])
+        self.ball_items = {}
+        self.brick_layer = BrickLayer()
+        self.scene().addItem(self.brick_layer)
+        self.brick_states = {}
+        self.powerup_items = {}
+        self.particle_layer = ParticleLayer(self.state.particles, self.sceneRect())
+        self.scene().addItem(self.particle_layer)
+        self.trail_layer = TrailLayer(lambda: self.state.balls)
+        self.scene().addItem(self.trail_layer)
+        self.layout_serial = None
+        self.fps = 0.0
+        self.fps_frames = 0
+        self.fps_start = time.perf_counter()
+
+        # Per-phase timing, shown with F3 and exported with F4
+        # (simulation phases are only timed when the game runs on this thread)
+        self.profiler = FrameProfiler()
+        if self.sim is None:
+            self.game.profiler = self.profiler
+        self.latency = LatencyMeter()
+        self.quality = QualityController()
+        self.profiler_overlay = ProfilerOverlay(self.profiler, self.latency, self.quality)
+        self.profiler_overlay.setPos(10, 45)
+        self.scene().addItem(self.profiler_overlay)
 
         # UI
         self.setup_ui()
-
-        # Game loop
+        self.sync_scene()
+
+        # Game loop: the timer only drives frames, the simulation itself
+        # advances in fixed ticks measured against a monotonic clock. Each
+        # frame re-arms a precise single-shot timer for the next deadline.
+        self.stepper = engine.FixedTimestep(self.game.step)
+        self.pacer = FramePacer()
+        self.adaptive_quality = adaptive_quality
         self.timer = QTimer()
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setSingleShot(True)
         self.timer.timeout.connect(self.game_loop)
-        self.timer.start(16)
-        
-        self.setFocus()
+        self.timer.start(engine.TICK_MS)
+        if self.sim is not None:
+            self.sim.start()
 
-    # === Level and Brick Creation ===
-    def load_levels(self):
-        return [
-            {
-                "layout": [
-                    "1111111111",
-                    "1222222221",
-                    "1233333321",
-                    "1234444321",
-                    "1234543210"
-                ],
-                "mapping": {
-                    "1": {"type": "normal", "health": 1},
-                    "2": {"type": "normal", "health": 2},
-                    "3": {"type": "normal", "health": 3},
-                    "4": {"type": "strong", "health": 2},
-                    "5": {"type": "explosive", "health": 1}
-                }
-            }
-        ]
-
-    def create_bricks(self):
-        if self.level > len(self.levels):
-            return
-            
-        mapping = self.levels[self.level-1]["mapping"]
-        brick_width = 70
-        brick_height = 20
-        layout = self.levels[self.level-1]["layout"]
-        
-        rows = len(layout)
-        cols = max(len(row) for row in layout)
-
-        for row_idx, row_data in enumerate(layout):
-            for col_idx, brick_type in enumerate(row_data):
-                if brick_type != "0" and brick_type in mapping:
-                    brick_info = mapping[brick_type]
-                    brick = Brick(
-                        10 + col_idx * (brick_width + 5),
-                        30 + row_idx * (brick_height + 5),
-                        brick_width,
-                        brick_height,
-                        brick_info["type"],
-                        brick_info["health"],
-                        self
-                    )
-                    self.scene().addItem(brick)
-                    self.bricks.append(brick)
-
-        # Random power-up bricks
-        for _ in range(3):
-            row = random.randint(0, rows-1)
-            col = random.randint(0, cols-1)
-            if row < len(layout) and col < len(layout[row]) and layout[row][col] != "0":
-                brick = Brick(10 + col * (brick_width + 5),
-                              30 + row * (brick_height + 5),
-                              brick_width, brick_height,
-                              "powerup", 1, self)
-                self.scene().addItem(brick)
-                self.bricks.append(brick)
+        self.setFocus()
 
     # === UI Setup ===
     def setup_ui(self):
-        self.score_text = QGraphicsTextItem(f"Score: {self.score}")
-        self.score_text.setDefaultTextColor(Qt.GlobalColor.white)
-        self.score_text.setFont(QFont("Arial", 14, QFont.Weight.Bold))
-        self.score_text.setPos(10, 10)
-        self.scene().addItem(self.score_text)
-
-        self.lives_text = QGraphicsTextItem(f"Lives: {self.lives}")
-        self.lives_text.setDefaultTextColor(Qt.GlobalColor.white)
-        self.lives_text.setFont(QFont("Arial", 14, QFont.Weight.Bold))
-        self.lives_text.setPos(700, 10)
-        self.scene().addItem(self.lives_text)
-
-        self.level_text = QGraphicsTextItem(f"Level: {self.level}")
-        self.level_text.setDefaultTextColor(Qt.GlobalColor.white)
-        self.level_text.setFont(QFont("Arial", 14, QFont.Weight.Bold))
-        self.level_text.setPos(350, 10)
-        self.scene().addItem(self.level_text)
-
-        self.game_over_text = QGraphicsTextItem("GAME OVER\nPress R to restart")
-        self.game_over_text.setDefaultTextColor(Qt.GlobalColor.red)
-        self.game_over_text.setFont(QFont("Arial", 24, QFont.Weight.Bold))
-        self.game_over_text.setPos(250, 250)
-        self.game_over_text.setVisible(False)
-        self.scene().addItem(self.game_over_text)
-
-        self.pause_text = QGraphicsTextItem("PAUSED\nPress P to continue")
-        self.pause_text.setDefaultTextColor(Qt.GlobalColor.yellow)
-        self.pause_text.setFont(QFont("Arial", 24, QFont.Weight.Bold))
-        self.pause_text.setPos(280, 250)
-        self.pause_text.setVisible(False)
-        self.scene().addItem(self.pause_text)
+        self.hud = HudLayer(self.sceneRect())
+        self.scene().addItem(self.hud)
+        hud = self.hud
+        font = QFont("Arial", 14, QFont.Weight.Bold)
+        banner = QFont("Arial", 24, QFont.Weight.Bold)
+        white = QColor(Qt.GlobalColor.white)
+        hud.add_field("score", 14, 14, font, white, "Score: {}", 0)
+        hud.add_field("time", 190, 14, font, white, "Time: {}:{:02d}", 0, 0)
+        hud.add_field("level", 354, 14, font, white, "Level: {}", 1)
+        hud.add_field("combo", 500, 14, font, QColor(255, 215, 0), "Combo x{}", 0,
+                      visible=False)
+        hud.add_field("lives", 704, 14, font, white, "Lives: {}", 3)
+        hud.add_field("fps", 730, 578, QFont("Arial", 9), QColor(160, 160, 160), "{} FPS", 0)
+        hud.add_field("game_over", 254, 254, banner, QColor(Qt.GlobalColor.red),
+                      "GAME OVER\nPress R to restart", visible=False)
+        hud.add_field("won", 254, 254, banner, QColor(Qt.GlobalColor.red),
+                      "YOU WIN!\nPress R to play again", visible=False)
+        hud.add_field("paused", 284, 254, banner, QColor(Qt.GlobalColor.yellow),
+                      "PAUSED\nPress P to continue", visible=False)
 
     # === Game Loop ===
     def game_loop(self):
         try:
-            if self.paused or self.game_over:
-                return
-
-            # Move balls
-            for ball in self.balls[:]:
-                try:
-                    ball.move()
-                except Exception as e:
-                    print(f"Ball move error: {e}")
-                    try:
-                        self.scene().removeItem(ball)
-                        self.balls.remove(ball)
-                    except:
-                        pass
-
-            # Move power-ups
-            for powerup in self.powerups[:]:
-                try:
-                    if powerup.move():
-                        self.powerups.remove(powerup)
-                except Exception as e:
-                    print(f"Powerup move error: {e}")
-                    try:
-                        self.scene().removeItem(powerup)
-                        self.powerups.remove(powerup)
-                    except:
-                        pass
-
-            # Update particles
-            for particle in self.particles[:]:
-                try:
-                    if not particle.update():
-                        self.scene().removeItem(particle)
-                        self.particles.remove(particle)
-                except Exception as e:
-                    print(f"Particle update error: {e}")
-                    try:
-                        self.scene().removeItem(particle)
-                        self.particles.remove(particle)
-                    except:
-                        pass
-
-            # Powerup collisions with paddle (using manual collision detection)
-            for powerup in self.powerups[:]:
-                try:
-                    powerup_rect = powerup.sceneBoundingRect()
-                    paddle_rect = self.paddle.sceneBoundingRect()
-                    
-                    if powerup_rect.intersects(paddle_rect):
-                        self.apply_powerup(powerup.type)
-                        self.scene().removeItem(powerup)
-                        self.powerups.remove(powerup)
-                except Exception as e:
-                    print(f"Powerup collision error: {e}")
-                    try:
-                        self.scene().removeItem(powerup)
-                        self.powerups.remove(powerup)
-                    except:
-                        pass
-
-            # Ball collisions
-            for ball in self.balls[:]:
-                # Paddle collision
-                try:
-                    ball_rect = ball.sceneBoundingRect()
-                    paddle_rect = self.paddle.sceneBoundingRect()
-                    
-                    if ball_rect.intersects(paddle_rect):
-                        paddle_center = self.paddle.x() + self.paddle.rect().width()/2
-                        ball_center = ball.x() + ball.rect().width()/2
-                        offset = (ball_center - paddle_center)/(self.paddle.rect().width()/2)
-                        ball.vx = offset * 5
-                        ball.vy = -abs(ball.vy)
-                        if self.paddle.sticky:
-                            ball.in_play = False
-                            ball.setPos(ball.x(), self.paddle.y() - ball.rect().height())
-                except Exception as e:
-                    print(f"Paddle collision error: {e}")
-
-                # Brick collisions
-                for brick in self.bricks[:]:
-                    try:
-                        ball_rect = ball.sceneBoundingRect()
-                        brick_rect = brick.sceneBoundingRect()
-                        
-                        if ball_rect.intersects(brick_rect):
-                            # Simple collision response
-                            ball.vy *= -1
-                            
-                            if brick.hit():
-                                self.scene().removeItem(brick)
-                                self.bricks.remove(brick)
-                                self.score += 10 * brick.max_health
-                                self.score_text.setPlainText(f"Score: {self.score}")
-                                self.create_particles(brick.x() + brick.rect().width()/2,
-                                                      brick.y() + brick.rect().height()/2,
-                                                      brick.brush().color())
-                            
-                            if len(self.bricks) == 0:
-                                self.next_level()
-                            break
-                    except Exception as e:
-                        print(f"Brick collision error: {e}")
-                        try:
-                            self.scene().removeItem(brick)
-                            self.bricks.remove(brick)
-                        except:
-                            pass
-
-            # Remove lost balls
-            for ball in self.balls[:]:
-                if not ball.in_play and ball.y() > self.scene_height:
-                    try:
-                        self.scene().removeItem(ball)
-                        self.balls.remove(ball)
-                    except:
-                        pass
-                    
-            if len(self.balls) == 0:
-                self.ball_lost()
-
+            # Close the previous frame, including the paint that followed it
+            profiler = self.profiler
+            profiler.commit(self.state.entity_counts())
+            if self.adaptive_quality and self.quality.observe(profiler.last_frame_ms()):
+                self.apply_quality()
+            if self.sim is None:
+                alpha = self.stepper.advance()
+            else:
+                self.state = self.sim.latest()
+                alpha = min(1.0, (self.sim.clock() - self.state.time) / engine.TICK_SECONDS)
+            start = profiler.clock()
+            self.sync_scene(alpha)
+            profiler.lap(PHASE_SYNC, start)
+            self.profiler_overlay.sync()
+            self.count_frame()
         except Exception as e:
             print(f"Game loop critical error: {e}")
             import traceback
             traceback.print_exc()
-
-    # === Game Logic Methods ===
-    def ball_lost(self):
-        self.lives -= 1
-        self.lives_text.setPlainText(f"Lives: {self.lives}")
-        if self.lives <= 0:
-            self.end_game()
+        self.timer.start(round(self.pacer.next_delay() * 1000))
+
+    def apply_quality(self):
+        # Scale back (or restore) the optional work: particle counts, trail
+        # length and antialiasing
+        settings = self.quality.settings
+
+        def apply(game):
+            game.particle_scale = settings["particle_scale"]
+            game.trail_length = settings["trail_length"]
+
+        self.run_on_game(apply)
+        self.setRenderHint(QPainter.RenderHint.Antialiasing, settings["antialiasing"])
+
+    # === Rendering From Game State ===
+    def sync_scene(self, alpha=1.0):
+        state = self.state
+        if (state.scene_width, state.scene_height) != (self.scene_width, self.scene_height):
+            self.fit_scene(state.scene_width, state.scene_height)
+        self.paddle_item.paddle = state.paddle
+        self.paddle_item.sync(alpha)
+        if self.camera is not None:
+            self.follow(state, alpha)
+        # Entities more than CULL_MARGIN outside the view are not drawn
+        area = self.visible.adjusted(-CULL_MARGIN, -CULL_MARGIN, CULL_MARGIN, CULL_MARGIN)
+        self.sync_items(self.ball_items, state.balls, self.ball_item_pool, alpha, area)
+        self.sync_items(self.powerup_items, state.powerups, self.powerup_item_pool, alpha, area)
+        self.particle_layer.particles = state.particles
+        self.particle_layer.sync()
+        self.sync_bricks()
+        self.trail_layer.sync(area)
+        self.sync_hud()
+
+    def fit_scene(self, width, height):
+        # The game resized its board (large-board levels are sized to fit)
+        self.scene_width = width
+        self.scene_height = height
+        rect = QRectF(0, 0, width, height)
+        self.scene().setSceneRect(rect)
+        self.setSceneRect(rect)
+        self.particle_layer.set_rect(rect)
+        scrolling = width > self.viewport().width() or height > self.viewport().height()
+        if scrolling:
+            # The view moves nearly every frame, so the whole viewport is
+            # repainted and the background is drawn fixed to the screen
+            # rather than cached and scrolled with the scene.
+            self.setCacheMode(QGraphicsView.CacheModeFlag.CacheNone)
+            self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.FullViewportUpdate)
+            if self.camera is None:
+                self.camera = QPointF(width / 2, height)
         else:
-            new_ball = Ball(self.scene_width, self.scene_height, self)
-            self.scene().addItem(new_ball)
-            self.balls.append(new_ball)
-
-    def end_game(self):
-        self.game_over = True
-        self.game_over_text.setVisible(True)
-
-    def next_level(self):
-        self.level += 1
-        if self.level > len(self.levels):
-            self.win_game()
+            self.setCacheMode(QGraphicsView.CacheModeFlag.CacheBackground)
+            self.setViewportUpdateMode(
+                QGraphicsView.ViewportUpdateMode.BoundingRectViewportUpdate)
+            self.camera = None
+            self.pin_overlays()
+        self.invalidate_background()
+
+    def follow(self, state, alpha):
+        # Ease the camera towards the lowest ball, the one the paddle has
+        # to reach next, or the paddle when there are none, and keep the
+        # HUD pinned to the view.
+        lowest = max(state.balls, key=operator.attrgetter("y"), default=None)
+        if lowest is not None:
+            x = lerp(lowest.prev_x, lowest.x, alpha)
+            y = lerp(lowest.prev_y, lowest.y, alpha)
+        else:
+            paddle = state.paddle
+            x = paddle.x + paddle.width / 2
+            y = paddle.y
+        camera = self.camera
+        camera.setX(camera.x() + (x - camera.x()) * CAMERA_EASING)
+        camera.setY(camera.y() + (y - camera.y()) * CAMERA_EASING)
+        self.centerOn(camera)
+        self.pin_overlays()
+
+    def pin_overlays(self):
+        self.visible = self.mapToScene(self.viewport().rect()).boundingRect()
+        origin = self.visible.topLeft()
+        if self.hud.pos() != origin:
+            self.hud.setPos(origin)
+            self.profiler_overlay.setPos(origin + QPointF(10, 45))
+
+    def hidden_item(self, item_class):
+        item = item_class()
+        item.setVisible(False)
+        self.scene().addItem(item)
+        return item
+
+    def sync_items(self, items, states, pool, alpha=1.0, area=None):
+        # Pooled game entities keep their identity while in use, so a stale
+        # key here means the entity went back to the game's pool.
+        live = set()
+        entity_key = self.entity_key
+        for state in states:
+            key = entity_key(state)
+            live.add(key)
+            item = items.get(key)
+            if item is None:
+                item = pool.acquire()
+                items[key] = item
+            item.bind(state)
+            if area is None or area.contains(state.x, state.y):
+                item.sync(alpha)
+                item.setVisible(True)
+            else:
+                item.setVisible(False)
+        for key in [key for key in items if key not in live]:
+            item = items.pop(key)
+            item.setVisible(False)
+            pool.release(item)
+
+    def pool_stats(self):
+        return {"ball_items": self.ball_item_pool.stats(),
+                "powerup_items": self.powerup_item_pool.stats()}
+
+    def sync_bricks(self):
+        if self.sim is not None:
+            self.sync_brick_events()
+            return
+        game = self.game
+        if self.layout_serial != game.layout_serial:
+            self.layout_serial = game.layout_serial
+            self.brick_layer.rebuild(game.bricks)
+            game.take_dirty_bricks()
             return
-            
-        self.level_text.setPlainText(f"Level: {self.level}")
-        
-        # Clear existing bricks
-        for brick in self.bricks[:]:
-            self.scene().removeItem(brick)
-            self.bricks.remove(brick)
-            
-        # Create new bricks for the next level
-        self.create_bricks()
-        
-        # Reset paddle position
-        self.paddle.reset_power()
-        self.paddle.setPos(self.scene_width/2 - self.paddle.rect().width()/2,
-                           self.scene_height - 40)
 
-    def win_game(self):
-        self.game_over = True
-        self.game_over_text.setPlainText("YOU WIN!\nPress R to play again")
-        self.game_over_text.setVisible(True)
+        dirty = game.take_dirty_bricks()
+        if dirty:
+            self.brick_layer.refresh(dirty)
+
+    def sync_brick_events(self):
+        # Threaded: bricks arrive as layout and change events from the worker,
+        # applied to the view's own BrickState copies
+        for kind, payload in self.sim.take_brick_events():
+            if kind == "layout":
+                self.brick_states = {state.key: state for state in payload}
+                self.brick_layer.rebuild(payload)
+                continue
+            changed = []
+            for change in payload:
+                state = self.brick_states.get(change[0])
+                if state is not None:
+                    state.apply(change)
+                    changed.append(state)
+            self.brick_layer.refresh(changed)
+
+    def sync_hud(self):
+        game = self.state
+        hud = self.hud
+        hud.set("score", game.score)
+        hud.set("lives", game.lives)
+        hud.set("level", game.level)
+        minutes, seconds = divmod(int(game.elapsed_seconds()), 60)
+        hud.set("time", minutes, seconds)
+        hud.set("combo", game.combo)
+        hud.set_visible("combo", game.combo >= 2)
+        hud.set("fps", round(self.fps))
+        hud.set_visible("game_over", game.game_over and not game.won)
+        hud.set_visible("won", game.game_over and game.won)
+        hud.set_visible("paused", game.paused)
+        hud.sync()
+
+    def count_frame(self):
+        # Frames per second, measured over one-second windows
+        self.fps_frames += 1
+        now = time.perf_counter()
+        if now - self.fps_start >= 1.0:
+            self.fps = self.fps_frames / (now - self.fps_start)
+            self.fps_frames = 0
+            self.fps_start = now
 
+    # === Game Logic Methods ===
     def reset_game(self):
-        # Clear all game objects
-        for brick in self.bricks[:]:
-            self.scene().removeItem(brick)
-            self.bricks.remove(brick)
-            
-        for ball in self.balls[:]:
-            self.scene().removeItem(ball)
-            self.balls.remove(ball)
-            
-        for powerup in self.powerups[:]:
-            self.scene().removeItem(powerup)
-            self.powerups.remove(powerup)
-            
-        for particle in self.particles[:]:
-            self.scene().removeItem(particle)
-            self.particles.remove(particle)
-
-        # Reset game state
-        self.score = 0
-        self.lives = 3
-        self.level = 1
-        self.game_over = False
-        self.score_text.setPlainText(f"Score: {self.score}")
-        self.lives_text.setPlainText(f"Lives: {self.lives}")
-        self.level_text.setPlainText(f"Level: {self.level}")
-        self.game_over_text.setVisible(False)
-
-        # Reset paddle and create new ball
-        self.paddle.reset_power()
-        self.paddle.setPos(self.scene_width/2 - self.paddle.rect().width()/2,
-                           self.scene_height - 40)
-                           
-        new_ball = Ball(self.scene_width, self.scene_height, self)
-        self.scene().addItem(new_ball)
-        self.balls.append(new_ball)
-        
-        # Create bricks for the first level
-        self.create_bricks()
-
-    def explode_brick(self, brick):
-        self.create_particles(brick.x() + brick.rect().width()/2,
-                              brick.y() + brick.rect().height()/2,
-                              QColor(255, 165, 0), 30)
-        
-        # Remove nearby bricks (explosion effect)
-        for other_brick in self.bricks[:]:
-            if other_brick is not brick:
-                dx = (other_brick.x() + other_brick.rect().width()/2) - (brick.x() + brick.rect().width()/2)
-                dy = (other_brick.y() + other_brick.rect().height()/2) - (brick.y() + brick.rect().height()/2)
-                distance = math.sqrt(dx*dx + dy*dy)
-                
-                if distance < 100:  # Explosion radius
-                    self.scene().removeItem(other_brick)
-                    self.bricks.remove(other_brick)
-                    self.score += 10 * other_brick.max_health
-                    self.score_text.setPlainText(f"Score: {self.score}")
-
-    def spawn_powerup(self, x, y):
-        powerup_types = ["expand", "shrink", "multiball", "extra_life", "sticky"]
-        powerup_type = random.choice(powerup_types)
-        powerup = PowerUp(x - 10, y - 10, powerup_type, self)
-        self.scene().addItem(powerup)
-        self.powerups.append(powerup)
-
-    def apply_powerup(self, type):
-        if type == "expand":
-            self.paddle.expand()
-        elif type == "shrink":
-            self.paddle.shrink()
-        elif type == "multiball":
-            for _ in range(2):
-                new_ball = Ball(self.scene_width, self.scene_height, self)
-                new_ball.setPos(self.paddle.x() + self.paddle.rect().width()/2,
-                                self.paddle.y() - new_ball.rect().height())
-                new_ball.vx = random.choice([-4, -3, 3, 4])
-                new_ball.vy = -4
-                self.scene().addItem(new_ball)
-                self.balls.append(new_ball)
-        elif type == "extra_life":
-            self.lives += 1
-            self.lives_text.setPlainText(f"Lives: {self.lives}")
-        elif type == "sticky":
-            self.paddle.make_sticky()
-
-    # === Particles and Sound ===
-    def create_particles(self, x, y, color, count=15):
-        for _ in range(count):
-            particle = Particle(x, y, color)
-            self.scene().addItem(particle)
-            self.particles.append(particle)
-
-    def play_sound(self, sound_type):
-        pass  # Placeholder
+        self.send_input(engine.ACTION_RESET)
+        self.sync_scene()
 
     # === Drawing ===
+    def set_background_theme(self, top, bottom):
+        self.background_colors = (top, bottom)
+        self.invalidate_background()
+
+    def invalidate_background(self):
+        self.background_cache = None
+        self.resetCachedContent()
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.invalidate_background()
+
+    def render_background(self):
+        # One screenful, drawn fixed to the view however large the board is
+        size = self.viewport().size()
+        pixmap = QPixmap(size)
+        gradient = QLinearGradient(0, 0, 0, size.height())
+        gradient.setColorAt(0, self.background_colors[0])
+        gradient.setColorAt(1, self.background_colors[1])
+        painter = QPainter(pixmap)
+        painter.fillRect(pixmap.rect(), gradient)
+        painter.end()
+        return pixmap
+
     def drawBackground(self, painter, rect):
-        gradient = QLinearGradient(0, 0, 0, self.scene_height)
-        gradient.setColorAt(0, QColor(25, 25, 50))
-        gradient.setColorAt(1, QColor(10, 10, 30))
-        painter.fillRect(rect, gradient)
-        
-        # Draw ball trails
-        for ball in self.balls:
-            ball.draw_trail(painter)
+        if self.background_cache is None:
+            self.background_cache = self.render_background()
+        origin = self.mapToScene(0, 0)
+        painter.drawPixmap(rect, self.background_cache, rect.translated(-origin))
+
+    def paintEvent(self, event):
+        start = self.profiler.clock()
+        super().paintEvent(event)
+        self.profiler.lap(PHASE_PAINT, start)
+        self.latency.frame(self.state.tick)
+
+    # === Profiling ===
+    def export_profile(self, basename=None):
+        if basename is None:
+            basename = time.strftime("profile-%Y%m%d-%H%M%S")
+        self.profiler.export_csv(basename + ".csv")
+        self.profiler.export_json(basename + ".json")
+        print(f"Profile written to {basename}.csv and {basename}.json")
+        latency = self.latency.summary()
+        if latency["count"]:
+            print(f"Input latency over {latency['count']} inputs: "
+                  f"mean {latency['mean_ms']:.1f} ms, p50 {latency['p50_ms']:.1f} ms, "
+                  f"p95 {latency['p95_ms']:.1f} ms, max {latency['max_ms']:.1f} ms")
+        return basename
+
+    def save_session(self, path=None):
+        if path is None:
+            path = time.strftime("session-%Y%m%d-%H%M%S.brkr")
+
+        def save(game):
+            game.input_log.finish(game)
+            game.input_log.save(path)
+
+        self.run_on_game(save, wait=True)
+        print(f"Session written to {path} (replay with: python replay.py {path})")
+        return path
 
     # === Input Handling ===
+    def send_input(self, action, value=None):
+        if self.sim is not None:
+            self.sim.send(action, value)
+        else:
+            self.game.apply_input(action, value)
+
+    def apply_input(self, action, value=None):
+        # Player input that moves something on screen, timed for latency
+        self.send_input(action, value)
+        self.latency.input(self.state.tick)
+
+    def run_on_game(self, fn, wait=False):
+        if self.sim is None:
+            fn(self.game)
+        elif wait:
+            self.sim.call(fn)
+        else:
+            self.sim.post(fn)
+
+    def shutdown(self):
+        self.timer.stop()
+        if self.sim is not None:
+            self.sim.stop()
+        if self.spectators is not None:
+            self.spectators.stop()
+
     def keyPressEvent(self, event):
-        if self.game_over and event.key() == Qt.Key.Key_R:
+        # Held keys are tracked by press and release; auto-repeat is noise
+        if event.isAutoRepeat():
+            return
+        if self.state.game_over and event.key() == Qt.Key.Key_R:
             self.reset_game()
             return
-            
+
         if event.key() == Qt.Key.Key_P:
-            self.paused = not self.paused
-            self.pause_text.setVisible(self.paused)
+            self.send_input(engine.ACTION_PAUSE)
+            self.sync_hud()
+            return
+
+        if event.key() == Qt.Key.Key_F3:
+            self.profiler_overlay.setVisible(not self.profiler_overlay.isVisible())
+            return
+        if event.key() == Qt.Key.Key_F4:
+            self.export_profile()
+            return
+        if event.key() == Qt.Key.Key_F5:
+            self.save_session()
+            return
+        if event.key() == Qt.Key.Key_M:
+            self.set_mouse_control(not self.mouse_control)
+            return
+        if event.key() == Qt.Key.Key_Backspace:
+            self.rewind()
             return
-            
+
         if event.key() == Qt.Key.Key_Left:
-            self.paddle.move_left()
+            self.apply_input(engine.ACTION_LEFT_PRESS)
         elif event.key() == Qt.Key.Key_Right:
-            self.paddle.move_right()
+            self.apply_input(engine.ACTION_RIGHT_PRESS)
         elif event.key() == Qt.Key.Key_Space:
-            for ball in self.balls:
-                if not ball.in_play:
-                    ball.in_play = True
-                    ball.vy = -4
+            self.apply_input(engine.ACTION_LAUNCH)
+
+    def keyReleaseEvent(self, event):
+        if event.isAutoRepeat():
+            return
+        if event.key() == Qt.Key.Key_Left:
+            self.send_input(engine.ACTION_LEFT_RELEASE)
+        elif event.key() == Qt.Key.Key_Right:
+            self.send_input(engine.ACTION_RIGHT_RELEASE)
+
+    def focusOutEvent(self, event):
+        # A release that happens in another window never reaches us. Both
+        # are sent unconditionally: threaded, self.state may not show a
+        # press that is still on its way, and a release of a key that is
+        # not held does nothing.
+        self.send_input(engine.ACTION_LEFT_RELEASE)
+        self.send_input(engine.ACTION_RIGHT_RELEASE)
+        super().focusOutEvent(event)
+
+    def rewind(self, ticks=REWIND_TICKS):
+        self.run_on_game(lambda game: game.rewind.rewind(game, ticks))
+        if self.sim is None:
+            self.stepper.reset()
+
+    def set_mouse_control(self, enabled):
+        self.mouse_control = enabled
+        self.mouse_x = None
+        if not enabled:
+            self.send_input(engine.ACTION_PADDLE_FREE)
+
+    def mouseMoveEvent(self, event):
+        if not self.mouse_control:
+            return
+        x = max(0, int(self.mapToScene(event.position().toPoint()).x()))
+        if x != self.mouse_x:
+            self.mouse_x = x
+            self.apply_input(engine.ACTION_PADDLE_TARGET, x)
+
+    def mousePressEvent(self, event):
+        if self.mouse_control and event.button() == Qt.MouseButton.LeftButton:
+            self.apply_input(engine.ACTION_LAUNCH)
 
 
 # Main Window
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, seed=None, levels=None, mouse_control=False, threaded=True,
+                 large_board=False, chaos=False, spectate_port=None):
         super().__init__()
         self.setWindowTitle("Breakout - PyQt6")
         self.setFixedSize(800, 600)
@@ -659,16 +1027,39 @@ class MainWindow(QMainWindow):
         self.scene.setSceneRect(0, 0, 800, 600)
         
         # Then create view with the scene
-        self.view = GameView(self.scene, self)
+        self.view = GameView(self.scene, self, seed=seed, levels=levels,
+                             mouse_control=mouse_control, threaded=threaded,
+                             large_board=large_board, chaos=chaos,
+                             spectate_port=spectate_port)
         self.setCentralWidget(self.view)
 
+    def closeEvent(self, event):
+        self.view.shutdown()
+        super().closeEvent(event)
+
 
 # Run Game
 def main():
-    app = QApplication(sys.argv)
+    parser = argparse.ArgumentParser(description="Breakout - PyQt6")
+    parser.add_argument("--seed", type=int, help="seed the game for a reproducible session")
+    parser.add_argument("--levels", help="level pack to play (.bpk or source .txt)")
+    parser.add_argument("--mouse", action="store_true", help="steer the paddle with the mouse")
+    parser.add_argument("--single-thread", action="store_true",
+                        help="run the simulation on the GUI thread")
+    parser.add_argument("--large-board", action="store_true",
+                        help="size the board to each level and scroll to follow the balls")
+    parser.add_argument("--chaos", action="store_true",
+                        help="let the balls collide with each other")
+    parser.add_argument("--spectate", type=int, metavar="PORT",
+                        help="stream the game to spectators on localhost:PORT")
+    args, qt_args = parser.parse_known_args()
+    app = QApplication(sys.argv[:1] + qt_args)
     
     try:
-        win = MainWindow()
+        pack = levels.load(args.levels) if args.levels else None
+        win = MainWindow(seed=args.seed, levels=pack, mouse_control=args.mouse,
+                         threaded=not args.single_thread, large_board=args.large_board,
+                         chaos=args.chaos, spectate_port=args.spectate)
         win.show()
         sys.exit(app.exec())
     except Exception as e:
@@ -0,0 +1,451 @@
+"""Reproducible benchmarks for the game loop.
+
+    python bench.py                          # all scenarios, offscreen Qt
+    python bench.py --headless               # engine only, no Qt
+    python bench.py --scenario balls50 --ticks 2000 --output result.json
+    python bench.py --save-baseline baseline.json
+    python bench.py --baseline baseline.json --threshold 0.2
+    python bench.py --collision              # grid vs linear collision query
+    python bench.py --allocations            # traced memory growth per scenario
+
+Each scenario is seeded, so repeated runs do the same work. Results are
+printed as JSON; with ``--baseline`` the run fails (exit status 1) when a
+scenario's mean tick time regressed by more than the threshold. With
+``--allocations`` each scenario runs headless under tracemalloc and the run
+fails when the traced memory keeps growing after warm-up.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+
+import engine
+
+DEFAULT_TICKS = 1000
+WARMUP_TICKS = 50
+ALLOCATION_TICKS = 5000
+ALLOCATION_WARMUP_TICKS = 500
+# Traced memory a scenario may gain over the measured ticks. A steady loop
+# stays well under it; anything kept per tick soon passes it.
+ALLOCATION_SLACK = 64 * 1024
+
+
+def filled_level(brick_count, cols=10, char="1", mapping=None):
+    rows = -(-brick_count // cols)
+    layout = []
+    for row in range(rows):
+        width = min(cols, brick_count - row * cols)
+        layout.append(char * width + "0" * (cols - width))
+    if mapping is None:
+        mapping = {"1": {"type": "normal", "health": 1}}
+    return {"layout": layout, "mapping": mapping}
+
+
+def board_game(brick_count, seed=0, level=None, **kwargs):
+    rows = -(-brick_count // 10)
+    height = max(engine.SCENE_HEIGHT,
+                 engine.BRICK_TOP + rows * (engine.BRICK_HEIGHT + engine.BRICK_GAP) + 200)
+    level = level if level is not None else filled_level(brick_count)
+    return engine.Game(height=height, levels=[level], seed=seed, **kwargs)
+
+
+def add_balls(game, count, rng):
+    for _ in range(count):
+        ball = game.ball_pool.acquire()
+        ball.place(rng.uniform(0, game.scene_width - ball.size),
+                   rng.uniform(game.scene_height * 0.5, game.scene_height * 0.8))
+        ball.vx = rng.choice([-4, -3, 3, 4])
+        ball.vy = -4
+        game.balls.append(ball)
+
+
+def keep_balls(count, rng):
+    # Top the ball count back up each tick so the load stays constant
+    def per_tick(game):
+        if len(game.balls) < count:
+            add_balls(game, count - len(game.balls), rng)
+    return per_tick
+
+
+def autopilot(game):
+    # Keep the game going: follow the lowest falling ball and never run out
+    # of lives, so every tick of a scenario does comparable work.
+    paddle = game.paddle
+    lowest = None
+    for ball in game.balls:
+        if ball.in_play and ball.vy > 0 and (lowest is None or ball.y > lowest.y):
+            lowest = ball
+    if lowest is not None:
+        target = lowest.x + lowest.radius - paddle.width / 2
+        paddle.x = min(max(0, target), paddle.scene_width - paddle.width)
+    game.launch_balls()
+    game.lives = max(game.lives, 3)
+
+
+def prepare_tick(game, per_tick):
+    autopilot(game)
+    if game.game_over:
+        game.reset()
+    if per_tick is not None:
+        per_tick(game)
+
+
+# === Scenarios ===
+def scenario_standard(seed):
+    return board_game(0, seed, level=engine.default_levels()[0]), None
+
+
+def scenario_balls50(seed):
+    game = board_game(0, seed, level=engine.default_levels()[0])
+    return game, keep_balls(50, random.Random(seed))
+
+
+def scenario_bricks5000(seed):
+    game = board_game(5000, seed)
+    return game, keep_balls(5, random.Random(seed))
+
+
+def scenario_explosion_storm(seed):
+    # Explosives on every other column of every fourth row sit just out of
+    # each other's blast radius, so blasts are frequent but do not cascade
+    # through the whole board.
+    mapping = {"1": {"type": "normal", "health": 1}, "5": {"type": "explosive", "health": 1}}
+    layout = ["5151515151" if row % 4 == 0 else "1111111111" for row in range(100)]
+    game = board_game(1000, seed, level={"layout": layout, "mapping": mapping})
+    return game, keep_balls(20, random.Random(seed))
+
+
+def scenario_explosion_chain(seed):
+    # Two adjacent explosive columns run the height of the board, so one
+    # hit sets off a cascade through every explosive and the columns either
+    # side. The board is rebuilt after each chain so every one does the
+    # same work.
+    mapping = {"1": {"type": "normal", "health": 1}, "5": {"type": "explosive", "health": 1}}
+    layout = ["1111551111"] * 40
+    game = board_game(400, seed, level={"layout": layout, "mapping": mapping})
+    top_up = keep_balls(20, random.Random(seed))
+
+    def rebuild_after_chain(game):
+        if any(brick.type == "explosive" and not brick.alive for brick in game.layout):
+            game.create_bricks()
+        top_up(game)
+
+    return game, rebuild_after_chain
+
+
+def scenario_chaos1000(seed):
+    # 1,000 balls bouncing off each other in chaos mode
+    game = board_game(0, seed, level=engine.default_levels()[0], chaos=True,
+                      pool_sizes={"balls": 1000})
+    return game, keep_balls(1000, random.Random(seed))
+
+
+def scenario_large_board(seed):
+    # 50,000 bricks on a board sized to the level, many screens each way
+    game = engine.Game(levels=[filled_level(50000, cols=250)], seed=seed, large_board=True)
+    return game, keep_balls(5, random.Random(seed))
+
+
+def scenario_particle_flood(seed):
+    game = board_game(0, seed, level=engine.default_levels()[0])
+    rng = random.Random(seed)
+
+    def flood(game):
+        for _ in range(10):
+            game.create_particles(rng.uniform(0, game.scene_width),
+                                  rng.uniform(0, game.scene_height),
+                                  (rng.randrange(256), 128, 64), 30)
+
+    return game, flood
+
+
+SCENARIOS = {
+    "standard": scenario_standard,
+    "balls50": scenario_balls50,
+    "bricks5000": scenario_bricks5000,
+    "explosion_storm": scenario_explosion_storm,
+    "explosion_chain": scenario_explosion_chain,
+    "particle_flood": scenario_particle_flood,
+    "large_board": scenario_large_board,
+    "chaos1000": scenario_chaos1000,
+}
+
+
+# === Runner ===
+class QtHarness:
+    """Drives a real GameView on the offscreen platform and paints it."""
+
+    def __init__(self):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt6.QtWidgets import QApplication
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    def attach(self, game):
+        from PyQt6.QtGui import QImage, QPainter
+        from PyQt6.QtWidgets import QGraphicsScene
+        import Breakout
+
+        self.scene = QGraphicsScene()
+        self.view = Breakout.GameView(self.scene, game=game)
+        self.view.timer.stop()
+        self.image = QImage(self.view.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        self.painter_class = QPainter
+
+    def frame(self):
+        self.view.sync_scene()
+        painter = self.painter_class(self.image)
+        self.view.render(painter)
+        painter.end()
+
+    def detach(self):
+        self.view.deleteLater()
+        self.app.processEvents()
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_scenario(name, ticks=DEFAULT_TICKS, seed=0, harness=None):
+    game, per_tick = SCENARIOS[name](seed)
+    if harness is not None:
+        harness.attach(game)
+
+    timings = []
+    clock = time.perf_counter
+    pairs = None
+    for tick in range(WARMUP_TICKS + ticks):
+        if tick == WARMUP_TICKS:
+            pairs = (game.ball_pairs_tested, game.ball_pairs_found)
+        prepare_tick(game, per_tick)
+        start = clock()
+        game.step()
+        if harness is not None:
+            harness.frame()
+        if tick >= WARMUP_TICKS:
+            timings.append(clock() - start)
+
+    if harness is not None:
+        harness.detach()
+    timings.sort()
+    total = sum(timings)
+    result = {
+        "ticks": ticks,
+        "mean_ms": total / ticks * 1000,
+        "p50_ms": percentile(timings, 0.5) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+        "ticks_per_sec": ticks / total if total else float("inf"),
+        "balls": len(game.balls),
+        "bricks": len(game.bricks),
+        "particles": len(game.particles),
+    }
+    if game.chaos:
+        # Sort and sweep against testing every pair of balls each tick
+        tested = game.ball_pairs_tested - pairs[0]
+        found = game.ball_pairs_found - pairs[1]
+        result["ball_pairs_tested"] = tested / ticks
+        result["ball_pairs_found"] = found / ticks
+        result["ball_pairs_all"] = len(game.balls) * (len(game.balls) - 1) // 2
+    return result
+
+
+def run_suite(names, ticks=DEFAULT_TICKS, seed=0, headless=False):
+    harness = None if headless else QtHarness()
+    results = {name: run_scenario(name, ticks, seed, harness) for name in names}
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "mode": "headless" if headless else "offscreen",
+            "ticks": ticks,
+            "seed": seed,
+        },
+        "scenarios": results,
+    }
+
+
+def compare(report, baseline, threshold):
+    """Return a list of regressions of mean tick time beyond threshold."""
+    baseline_mode = baseline.get("meta", {}).get("mode")
+    if baseline_mode != report["meta"]["mode"]:
+        raise ValueError(f"baseline was recorded in {baseline_mode!r} mode, "
+                         f"this run is {report['meta']['mode']!r}")
+    regressions = []
+    for name, result in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if before is None or before["mean_ms"] <= 0:
+            continue
+        change = result["mean_ms"] / before["mean_ms"] - 1
+        result["change_vs_baseline"] = change
+        if change > threshold:
+            regressions.append(f"{name}: mean {before['mean_ms']:.3f} ms -> "
+                               f"{result['mean_ms']:.3f} ms (+{change:.0%})")
+    return regressions
+
+
+# === Allocations ===
+def allocation_check(name, ticks=ALLOCATION_TICKS, seed=0):
+    """Traced memory growth of a headless scenario once it has warmed up.
+
+    Pools and particle arrays fill up during the warm-up; after that a
+    steady loop frees everything it allocates. The traced memory still
+    rises and falls with the game (levels rebuilt, power-ups falling), so
+    growth is the peak over the second half of the ticks minus the peak
+    over the first half, which only a leak keeps positive.
+    """
+    game, per_tick = SCENARIOS[name](seed)
+    for _ in range(ALLOCATION_WARMUP_TICKS):
+        prepare_tick(game, per_tick)
+        game.step()
+        game.take_dirty_bricks()
+    samples = array("q", bytes(8 * ticks))
+    gc.collect()
+    tracemalloc.start()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    before = tracemalloc.take_snapshot().filter_traces(ignore)
+    collections = gc.get_stats()[0]["collections"]
+    for tick in range(ticks):
+        prepare_tick(game, per_tick)
+        game.step()
+        # Renderers take the changed bricks every frame
+        game.take_dirty_bricks()
+        samples[tick] = tracemalloc.get_traced_memory()[0]
+    collections = gc.get_stats()[0]["collections"] - collections
+    after = tracemalloc.take_snapshot().filter_traces(ignore)
+    tracemalloc.stop()
+
+    # Where the memory went between the first and the last tick
+    diff = after.compare_to(before, "lineno")
+    growth = [stat for stat in diff if stat.size_diff > 0]
+    half = ticks // 2
+    return {
+        "ticks": ticks,
+        "growth_bytes": max(samples[half:]) - max(samples[:half]),
+        "net_bytes": sum(stat.size_diff for stat in diff),
+        "gc_collections_per_1000_ticks": collections * 1000 / ticks,
+        "top_growth": [f"{stat.traceback[0].filename}:{stat.traceback[0].lineno} "
+                       f"+{stat.size_diff} B" for stat in growth[:3]],
+    }
+
+
+def run_allocation_checks(names, ticks=ALLOCATION_TICKS, seed=0):
+    results = {name: allocation_check(name, ticks, seed) for name in names}
+    failures = [f"{name}: traced memory grew {result['growth_bytes']} B over "
+                f"{result['ticks']} ticks" for name, result in results.items()
+                if result["growth_bytes"] > ALLOCATION_SLACK]
+    return {"scenarios": results, "failures": failures}
+
+
+# === Collision ===
+def first_brick_contact_linear(game, cx, cy, dx, dy, r):
+    best = None
+    for brick in game.bricks:
+        hit = engine.sweep_circle_rect(cx, cy, dx, dy, r, brick.x, brick.y,
+                                       brick.width, brick.height)
+        if hit is not None and (best is None or hit[0] < best[0]):
+            best = hit
+    return best
+
+
+def collision_benchmark(brick_counts=(50, 500, 1000, 5000), balls=20, ticks=200):
+    """Time the ball/brick collision query per tick for growing layouts."""
+    results = []
+    for count in brick_counts:
+        game = board_game(count)
+        rng = random.Random(count)
+        probes = []
+        for _ in range(balls):
+            ball = engine.Ball(game.scene_width, game.scene_height)
+            cx = rng.uniform(ball.radius, game.scene_width - ball.radius)
+            cy = rng.uniform(ball.radius, game.scene_height - ball.radius)
+            probes.append((cx, cy, ball.vx, ball.vy, ball.radius))
+
+        timings = {}
+        for name, find in (("grid", game.first_contact),
+                           ("linear", lambda *probe: first_brick_contact_linear(game, *probe))):
+            start = time.perf_counter()
+            for _ in range(ticks):
+                for probe in probes:
+                    find(*probe)
+            timings[name] = (time.perf_counter() - start) / ticks * 1e6
+        results.append({"bricks": len(game.bricks), "balls": balls,
+                        "grid_us_per_tick": timings["grid"],
+                        "linear_us_per_tick": timings["linear"]})
+    return results
+
+
+def print_collision_table():
+    print(f"{'bricks':>8} {'balls':>6} {'grid us/tick':>14} {'linear us/tick':>16}")
+    for row in collision_benchmark():
+        print(f"{row['bricks']:>8} {row['balls']:>6} "
+              f"{row['grid_us_per_tick']:>14.1f} {row['linear_us_per_tick']:>16.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Breakout game loop.")
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable, default: all)")
+    parser.add_argument("--ticks", type=int,
+                        help=f"ticks per scenario (default {DEFAULT_TICKS}, "
+                             f"{ALLOCATION_TICKS} with --allocations)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--headless", action="store_true",
+                        help="step the engine only, without GameView or painting")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="compare against a stored JSON report")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed mean tick time regression (default 0.2 = 20%%)")
+    parser.add_argument("--save-baseline", help="store this run as a baseline")
+    parser.add_argument("--collision", action="store_true",
+                        help="run the grid vs linear collision benchmark instead")
+    parser.add_argument("--allocations", action="store_true",
+                        help="check headless scenarios for traced memory growth instead")
+    args = parser.parse_args(argv)
+
+    if args.collision:
+        print_collision_table()
+        return 0
+
+    names = args.scenario or list(SCENARIOS)
+    if args.allocations:
+        report = run_allocation_checks(names, args.ticks or ALLOCATION_TICKS, args.seed)
+        print(json.dumps(report, indent=2))
+        for failure in report["failures"]:
+            print(f"ALLOCATION GROWTH {failure}", file=sys.stderr)
+        return 1 if report["failures"] else 0
+
+    report = run_suite(names, args.ticks or DEFAULT_TICKS, args.seed, args.headless)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        try:
+            regressions = compare(report, baseline, args.threshold)
+        except ValueError as e:
+            parser.error(str(e))
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                f.write(text + "\n")
+
+    if regressions:
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
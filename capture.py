@@ -0,0 +1,297 @@
+"""Offscreen frame capture for gameplay recordings.
+
+A single-threaded GameView renders every simulation tick into one of a few
+preallocated QImages, and a writer thread saves them as a raw BGRA stream
+or a PNG sequence, or pipes them to a local encoder. The images are the
+bounded queue between the two: when the writer falls behind, rendering
+waits for a free image instead of buffering frames without limit.
+image_array() exposes an image's pixels to NumPy without copying them.
+
+    python capture.py session.brkr --png frames/
+    python capture.py --seed 3 --ticks 1200 --raw gameplay.bgra
+    python capture.py session.brkr --pipe "ffmpeg -y -f rawvideo -pix_fmt bgra \\
+        -s 800x600 -r 62.5 -i - gameplay.mp4"
+"""
+import argparse
+import os
+import queue
+import shlex
+import struct
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+import numpy as np
+
+import engine
+import levels
+import replay
+
+DEFAULT_QUEUE_SIZE = 8
+# Fast zlib level: frames are mostly flat color, so more effort saves little
+PNG_LEVEL = 1
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+class CaptureError(Exception):
+    pass
+
+
+def image_array(image):
+    """The pixels of a 32-bit QImage as a (rows, columns, 4) BGRA array.
+
+    The array shares the image's memory, so it is only valid while the
+    image is alive and changes whenever the image is drawn on.
+    """
+    pointer = image.bits()
+    pointer.setsize(image.sizeInBytes())
+    pixels = np.frombuffer(pointer, dtype=np.uint8)
+    return pixels.reshape(image.height(), image.bytesPerLine() // 4, 4)[:, :image.width()]
+
+
+# Writers
+class RawWriter:
+    """Appends every frame's BGRA bytes to one file."""
+
+    def __init__(self, path):
+        self.file = open(path, "wb")
+
+    def write(self, frame):
+        self.file.write(np.ascontiguousarray(frame.pixels))
+
+    def close(self):
+        self.file.close()
+
+
+class PngWriter:
+    """Writes every frame as an opaque RGB PNG file.
+
+    Frames are encoded here rather than with QImage.save(), which holds the
+    GIL while it compresses and would stall the simulation thread; zlib and
+    the NumPy copies release it.
+    """
+
+    def __init__(self, directory, level=PNG_LEVEL):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.level = level
+        self.rows = None
+
+    def write(self, frame):
+        path = os.path.join(self.directory, f"frame{frame.index:06d}.png")
+        with open(path, "wb") as f:
+            f.write(self.encode(frame.pixels))
+
+    def encode(self, pixels):
+        height, width = pixels.shape[:2]
+        if self.rows is None or self.rows.shape != (height, 1 + width * 3):
+            # Each row is a filter type byte (0, none) and the RGB samples
+            self.rows = np.zeros((height, 1 + width * 3), dtype=np.uint8)
+        rgb = self.rows[:, 1:].reshape(height, width, 3)
+        rgb[..., 0] = pixels[..., 2]
+        rgb[..., 1] = pixels[..., 1]
+        rgb[..., 2] = pixels[..., 0]
+        header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+        return b"".join((PNG_SIGNATURE, png_chunk(b"IHDR", header),
+                         png_chunk(b"IDAT", zlib.compress(self.rows, self.level)),
+                         png_chunk(b"IEND", b"")))
+
+    def close(self):
+        pass
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+class PipeWriter:
+    """Streams raw BGRA frames to an encoder's standard input."""
+
+    def __init__(self, command):
+        self.command = command
+        self.process = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        try:
+            self.process.stdin.write(np.ascontiguousarray(frame.pixels))
+        except BrokenPipeError:
+            raise CaptureError(f"encoder exited early: {self.command}") from None
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if self.process.wait() != 0:
+            raise CaptureError(f"encoder failed with status {self.process.returncode}")
+
+
+# Capture
+class Frame:
+    __slots__ = ("image", "pixels", "index", "tick")
+
+    def __init__(self, image):
+        self.image = image
+        self.pixels = image_array(image)
+        self.index = 0
+        self.tick = 0
+
+
+class FrameCapture:
+    """Renders a view into pooled images and writes them on a worker thread."""
+
+    def __init__(self, view, writer, queue_size=DEFAULT_QUEUE_SIZE):
+        from PyQt6.QtGui import QImage
+
+        self.view = view
+        self.writer = writer
+        # One frame more than the queue holds is being written, one more
+        # is being rendered
+        self.free = queue.Queue()
+        size = view.size()
+        for _ in range(queue_size + 2):
+            image = QImage(size, QImage.Format.Format_ARGB32_Premultiplied)
+            self.free.put(Frame(image))
+        self.pending = queue.Queue(maxsize=queue_size)
+        self.frames = 0
+        self.render_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="frame-writer", daemon=True)
+        self.thread.start()
+
+    def grab(self, tick):
+        from PyQt6.QtGui import QPainter
+
+        if self.error is not None:
+            raise CaptureError(f"writer failed: {self.error}") from self.error
+        start = time.perf_counter()
+        frame = self.free.get()
+        ready = time.perf_counter()
+        self.wait_seconds += ready - start
+        frame.index = self.frames
+        frame.tick = tick
+        painter = QPainter(frame.image)
+        self.view.render(painter)
+        painter.end()
+        self.render_seconds += time.perf_counter() - ready
+        self.pending.put(frame)
+        self.frames += 1
+
+    def run(self):
+        while True:
+            frame = self.pending.get()
+            if frame is None:
+                return
+            try:
+                if self.error is None:
+                    self.writer.write(frame)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.free.put(frame)
+
+    def close(self):
+        self.pending.put(None)
+        self.thread.join()
+        self.writer.close()
+        if self.error is not None:
+            raise CaptureError(f"writer failed: {self.error}") from self.error
+
+
+def capture_game(game, writer, frames, queue_size=DEFAULT_QUEUE_SIZE):
+    """Capture one frame per tick that frames yields, and return the timings.
+
+    frames steps game and yields after each tick; replay.steps() does that
+    for a recorded session.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QGraphicsScene
+    import Breakout
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    scene = QGraphicsScene()
+    view = Breakout.GameView(scene, game=game, adaptive_quality=False)
+    view.timer.stop()
+    # The view records and keeps rewind history for a player; neither is
+    # wanted while capturing
+    game.input_log = None
+    game.rewind = None
+
+    capture = FrameCapture(view, writer, queue_size)
+    start = time.perf_counter()
+    try:
+        for _ in frames:
+            view.sync_scene()
+            capture.grab(game.tick)
+    finally:
+        capture.close()
+        view.deleteLater()
+        app.processEvents()
+    seconds = time.perf_counter() - start
+    return {
+        "frames": capture.frames,
+        "seconds": seconds,
+        "fps": capture.frames / seconds if seconds else 0.0,
+        "realtime_factor": capture.frames * engine.TICK_SECONDS / seconds if seconds else 0.0,
+        "render_ms": capture.render_seconds / max(1, capture.frames) * 1000,
+        "writer_wait_s": capture.wait_seconds,
+    }
+
+
+def play(game, ticks):
+    for _ in range(ticks):
+        if game.game_over:
+            return
+        game.launch_balls()
+        game.step()
+        yield game
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Capture Breakout gameplay frames offscreen.")
+    parser.add_argument("session", nargs="?", help="recorded .brkr session to capture")
+    parser.add_argument("--levels", help="level pack the session was played on")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="without a session, play this seed with the ball relaunched")
+    parser.add_argument("--ticks", type=int, default=600,
+                        help="without a session, ticks to capture (default 600)")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--raw", metavar="FILE", help="write raw BGRA frames to FILE")
+    output.add_argument("--png", metavar="DIR", help="write a PNG sequence to DIR")
+    output.add_argument("--pipe", metavar="COMMAND",
+                        help="pipe raw BGRA frames to an encoder command")
+    parser.add_argument("--queue", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f"frames that may wait for the writer (default {DEFAULT_QUEUE_SIZE})")
+    args = parser.parse_args(argv)
+
+    pack = levels.load(args.levels) if args.levels else None
+    if args.session:
+        log = replay.InputLog.load(args.session)
+        game = replay.new_game(log, pack)
+        frames = replay.steps(game, log)
+    else:
+        game = engine.Game(levels=pack, seed=args.seed)
+        frames = play(game, args.ticks)
+
+    if args.raw:
+        writer = RawWriter(args.raw)
+    elif args.png:
+        writer = PngWriter(args.png)
+    else:
+        writer = PipeWriter(args.pipe)
+    try:
+        stats = capture_game(game, writer, frames, args.queue)
+    except (CaptureError, replay.ReplayError) as e:
+        print(f"capture failed: {e}", file=sys.stderr)
+        return 1
+    print(f"{stats['frames']} frames in {stats['seconds']:.2f}s ({stats['fps']:.0f} fps, "
+          f"{stats['realtime_factor']:.1f}x real time), render {stats['render_ms']:.2f} ms/frame, "
+          f"waited {stats['writer_wait_s']:.2f}s for the writer")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
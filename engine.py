@@ -0,0 +1,1126 @@
+"""Headless Breakout simulation.
+
+The complete game state lives here as plain Python objects, so the rules can
+be stepped thousands of times per second without a QApplication.
+``Breakout.GameView`` only renders from a ``Game``.
+"""
+import hashlib
+import math
+import random
+import struct
+import time
+from array import array
+
+import numpy as np
+
+from levels import as_levels
+from particles import DEFAULT_MAX_PARTICLES, ParticleSystem
+from pools import DEFAULT_POOL_SIZES, Pool
+from profiler import (
+    PHASE_BALLS, PHASE_LOST_BALLS, PHASE_PARTICLES, PHASE_POWERUP_PADDLE, PHASE_POWERUPS)
+from scheduler import KIND, Scheduler
+from spatial import UniformGrid, sweep_pairs
+
+SCENE_WIDTH = 800
+SCENE_HEIGHT = 600
+TICK_MS = 16
+TICK_SECONDS = TICK_MS / 1000.0
+DEFAULT_SUBSTEPS = 2
+MAX_BOUNCES = 4
+TRAIL_LENGTH = 8
+# Large boards are sized to their level, with this much open space between
+# the lowest brick row and the bottom edge
+LARGE_BOARD_FLOOR = 450
+
+BRICK_WIDTH = 70
+BRICK_HEIGHT = 20
+BRICK_GAP = 5
+BRICK_LEFT = 10
+BRICK_TOP = 30
+
+POWERUP_TYPES = ["expand", "shrink", "multiball", "extra_life", "sticky"]
+
+# Player inputs, as recorded in replay.InputLog
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_LAUNCH = 3
+ACTION_PAUSE = 4
+ACTION_RESET = 5
+# Held keys: the paddle moves every tick between press and release
+ACTION_LEFT_PRESS = 6
+ACTION_LEFT_RELEASE = 7
+ACTION_RIGHT_PRESS = 8
+ACTION_RIGHT_RELEASE = 9
+# Steer the paddle center towards an x position (mouse control); the
+# position is the action's value. ACTION_PADDLE_FREE hands back to the keys.
+ACTION_PADDLE_TARGET = 10
+ACTION_PADDLE_FREE = 11
+VALUE_ACTIONS = frozenset((ACTION_PADDLE_TARGET,))
+
+NORMAL_COLORS = [(220, 20, 60), (255, 140, 0), (255, 215, 0),
+                 (50, 205, 50), (65, 105, 225)]
+STRONG_COLOR = (70, 130, 180)
+EXPLOSIVE_COLOR = (178, 34, 34)
+POWERUP_BRICK_COLOR = (255, 105, 180)
+EXPLOSION_COLOR = (255, 165, 0)
+EXPLOSION_RADIUS = 100
+
+NO_BRICKS = frozenset()
+
+# Timed events, run by Game.scheduler when their tick comes
+EVENT_WIDTH_END = 1
+EVENT_STICKY_END = 2
+
+
+def ms_to_ticks(ms):
+    return max(1, round(ms / TICK_MS))
+
+
+EXPAND_TICKS = ms_to_ticks(10000)
+SHRINK_TICKS = ms_to_ticks(8000)
+STICKY_TICKS = ms_to_ticks(15000)
+
+
+def default_levels():
+    return [
+        {
+            "layout": [
+                "1111111111",
+                "1222222221",
+                "1233333321",
+                "1234444321",
+                "1234543210"
+            ],
+            "mapping": {
+                "1": {"type": "normal", "health": 1},
+                "2": {"type": "normal", "health": 2},
+                "3": {"type": "normal", "health": 3},
+                "4": {"type": "strong", "health": 2},
+                "5": {"type": "explosive", "health": 1}
+            }
+        }
+    ]
+
+
+def rects_intersect(ax, ay, aw, ah, bx, by, bw, bh):
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+# === Swept Collision ===
+def ray_circle(cx, cy, dx, dy, kx, ky, r):
+    # Earliest t in [0, 1] where the point c + d*t is at distance r from k
+    fx = cx - kx
+    fy = cy - ky
+    a = dx * dx + dy * dy
+    if a == 0:
+        return None
+    b = 2 * (fx * dx + fy * dy)
+    c = fx * fx + fy * fy - r * r
+    disc = b * b - 4 * a * c
+    if disc < 0:
+        return None
+    t = (-b - math.sqrt(disc)) / (2 * a)
+    if 0 <= t <= 1:
+        return t
+    return None
+
+
+def corner_contact(cx, cy, dx, dy, r, kx, ky):
+    t = ray_circle(cx, cy, dx, dy, kx, ky, r)
+    if t is None:
+        return None
+    nx = cx + dx * t - kx
+    ny = cy + dy * t - ky
+    length = math.hypot(nx, ny) or 1.0
+    return t, nx / length, ny / length
+
+
+def sweep_circle_rect(cx, cy, dx, dy, r, rx, ry, rw, rh):
+    """First contact of a circle moving by (dx, dy) with a rectangle.
+
+    Returns ``(t, nx, ny)`` with ``t`` in [0, 1] along the motion and the unit
+    normal of the face (or corner) that was hit, or None if the circle does
+    not touch the rectangle during the move.
+    """
+    left = rx - r
+    right = rx + rw + r
+    top = ry - r
+    bottom = ry + rh + r
+    x1 = rx + rw
+    y1 = ry + rh
+
+    # Which corner region (if any) the start point lies in
+    kx = rx if cx < rx else x1 if cx > x1 else None
+    ky = ry if cy < ry else y1 if cy > y1 else None
+
+    if left < cx < right and top < cy < bottom:
+        if kx is not None and ky is not None and \
+                (cx - kx) ** 2 + (cy - ky) ** 2 > r * r:
+            # Inside the expanded box but clear of the rounded corner
+            return corner_contact(cx, cy, dx, dy, r, kx, ky)
+        # Already overlapping: push out along the shallowest axis, but only
+        # if the circle is moving further in.
+        depth, nx, ny = min((cx - left, -1, 0), (right - cx, 1, 0),
+                            (cy - top, 0, -1), (bottom - cy, 0, 1))
+        if dx * nx + dy * ny < 0:
+            return 0.0, nx, ny
+        return None
+
+    # Slab test against the rectangle expanded by r
+    t_enter = -math.inf
+    t_exit = math.inf
+    nx = ny = 0
+    if dx == 0:
+        if not left <= cx <= right:
+            return None
+    else:
+        t0 = (left - cx) / dx
+        t1 = (right - cx) / dx
+        if t0 > t1:
+            t0, t1 = t1, t0
+        if t0 > t_enter:
+            t_enter = t0
+            nx, ny = (-1 if dx > 0 else 1), 0
+        t_exit = min(t_exit, t1)
+    if dy == 0:
+        if not top <= cy <= bottom:
+            return None
+    else:
+        t0 = (top - cy) / dy
+        t1 = (bottom - cy) / dy
+        if t0 > t1:
+            t0, t1 = t1, t0
+        if t0 > t_enter:
+            t_enter = t0
+            nx, ny = 0, (-1 if dy > 0 else 1)
+        t_exit = min(t_exit, t1)
+    if t_enter > t_exit or t_enter < 0 or t_enter > 1:
+        return None
+
+    # Entering through a corner of the expanded box means the real contact
+    # is with the rounded corner, if at all.
+    px = cx + dx * t_enter
+    py = cy + dy * t_enter
+    kx = rx if px < rx else x1 if px > x1 else None
+    ky = ry if py < ry else y1 if py > y1 else None
+    if kx is not None and ky is not None:
+        return corner_contact(cx, cy, dx, dy, r, kx, ky)
+    return t_enter, nx, ny
+
+
+def reflect(vx, vy, nx, ny):
+    dot = vx * nx + vy * ny
+    if dot >= 0:
+        return vx, vy
+    return vx - 2 * dot * nx, vy - 2 * dot * ny
+
+
+# Fixed Timestep
+class FixedTimestep:
+    """Runs a step callback at a fixed rate from a monotonic clock.
+
+    ``advance()`` is called once per rendered frame; it runs however many
+    whole ticks have elapsed and returns the interpolation factor between
+    the previous and the current state.
+    """
+
+    def __init__(self, step, tick_seconds=TICK_SECONDS, max_steps=8,
+                 clock=time.perf_counter):
+        self.step = step
+        self.tick_seconds = tick_seconds
+        self.max_steps = max_steps
+        self.clock = clock
+        self.accumulator = 0.0
+        self.last = None
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.last = None
+
+    def advance(self):
+        now = self.clock()
+        if self.last is None:
+            self.last = now
+            return 0.0
+        self.accumulator += now - self.last
+        self.last = now
+
+        steps = 0
+        while self.accumulator >= self.tick_seconds:
+            if steps == self.max_steps:
+                # Too far behind to catch up: drop the backlog instead of
+                # spiralling, the game just runs slow for this frame.
+                self.accumulator %= self.tick_seconds
+                break
+            self.step()
+            self.accumulator -= self.tick_seconds
+            steps += 1
+        return self.accumulator / self.tick_seconds
+
+
+# Sentinel target for the scene walls
+WALL = object()
+
+
+# Paddle
+class Paddle:
+    def __init__(self, scene_width, scene_height):
+        self.normal_width = 100
+        self.width = 100
+        self.height = 15
+        self.scene_width = scene_width
+        self.scene_height = scene_height
+        self.x = scene_width / 2 - 50
+        self.y = scene_height - 40
+        self.prev_x = self.x
+        self.speed = 10
+        self.sticky = False
+
+    def move_left(self):
+        self.x = max(0, self.x - self.speed)
+
+    def move_right(self):
+        self.x = min(self.scene_width - self.width, self.x + self.speed)
+
+    def center(self):
+        return self.x + self.width / 2
+
+    def set_width(self, width):
+        current_center = self.center()
+        self.width = width
+        self.x = current_center - width / 2
+
+    # Power-up durations are kept by Game.scheduler
+    def expand(self):
+        self.set_width(self.normal_width * 1.5)
+
+    def shrink(self):
+        self.set_width(self.normal_width * 0.75)
+
+    def make_sticky(self):
+        self.sticky = True
+
+    def reset_width(self):
+        self.set_width(self.normal_width)
+
+    def reset_power(self):
+        self.reset_width()
+        self.sticky = False
+
+    def recenter(self):
+        self.x = self.scene_width / 2 - self.width / 2
+        self.y = self.scene_height - 40
+        self.prev_x = self.x
+
+
+# Trail
+class Trail:
+    """A ball's recent centers, oldest first, in a fixed-size ring buffer.
+
+    The coordinates live in one preallocated array, so recording a point
+    allocates nothing and a full trail overwrites its oldest point.
+    """
+
+    def __init__(self, capacity=TRAIL_LENGTH):
+        self.capacity = capacity
+        self.coords = array("d", bytes(16 * capacity))
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        j = 2 * ((self.start + i) % self.capacity)
+        return self.coords[j], self.coords[j + 1]
+
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    def append(self, x, y):
+        if self.count == self.capacity:
+            j = 2 * self.start
+            self.start = (self.start + 1) % self.capacity
+        else:
+            j = 2 * ((self.start + self.count) % self.capacity)
+            self.count += 1
+        self.coords[j] = x
+        self.coords[j + 1] = y
+
+    def trim(self, length):
+        # Drop the oldest points beyond length
+        excess = self.count - max(0, length)
+        if excess > 0:
+            self.start = (self.start + excess) % self.capacity
+            self.count -= excess
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+
+# Ball
+class Ball:
+    size = 15
+    radius = 7.5
+
+    def __init__(self, scene_width, scene_height, rng=random):
+        self.scene_width = scene_width
+        self.scene_height = scene_height
+        self.rng = rng
+        self.trail_points = Trail()
+        self.reset()
+
+    def reset(self):
+        self.x = self.scene_width / 2
+        self.y = self.scene_height / 2
+        self.prev_x = self.x
+        self.prev_y = self.y
+        self.vx = self.rng.choice([-4, 4])
+        self.vy = -4
+        self.in_play = True
+        self.stuck = False
+        self.lost = False
+        self.stick_offset = 0
+        self.trail_points.clear()
+        self.trail_timer = 0
+
+    def center(self):
+        return self.x + self.radius, self.y + self.radius
+
+    def place(self, x, y):
+        # Teleport without interpolating from the old position
+        self.x = self.prev_x = x
+        self.y = self.prev_y = y
+
+    def update_trail(self, max_length=TRAIL_LENGTH):
+        self.trail_timer += 1
+        if self.trail_timer >= 3:
+            self.trail_points.append(self.x + self.size / 2, self.y + self.size / 2)
+            self.trail_timer = 0
+            self.trail_points.trim(max_length)
+
+    def stick_to(self, paddle):
+        self.in_play = False
+        self.stuck = True
+        self.stick_offset = self.x - paddle.x
+        self.place(self.x, paddle.y - self.size)
+
+    def launch(self):
+        self.in_play = True
+        self.stuck = False
+        self.vy = -4
+
+
+# Brick
+class Brick:
+    def __init__(self, x, y, width, height, type="normal", health=1):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.type = type
+        self.health = health
+        self.max_health = health
+        self.alive = True
+        self.index = -1
+        # Position in the layout's creation order, stable until the next layout
+        self.slot = -1
+
+    def center(self):
+        return self.x + self.width / 2, self.y + self.height / 2
+
+    def color(self):
+        if self.type == "normal":
+            color_idx = min(self.max_health - self.health, len(NORMAL_COLORS) - 1)
+            return NORMAL_COLORS[color_idx]
+        elif self.type == "strong":
+            return STRONG_COLOR
+        elif self.type == "explosive":
+            return EXPLOSIVE_COLOR
+        return POWERUP_BRICK_COLOR
+
+    def hit(self):
+        self.health -= 1
+        return self.health <= 0
+
+
+# PowerUp
+class PowerUp:
+    size = 20
+
+    def __init__(self, x, y, type):
+        self.spawn(x, y, type)
+
+    def spawn(self, x, y, type):
+        self.x = x
+        self.y = y
+        self.type = type
+        self.vy = 2
+        self.prev_y = y
+
+    def move(self, scene_height):
+        self.prev_y = self.y
+        self.y += self.vy
+        return self.y > scene_height
+
+
+# Game
+class Game:
+    def __init__(self, width=SCENE_WIDTH, height=SCENE_HEIGHT, levels=None,
+                 max_particles=DEFAULT_MAX_PARTICLES, substeps=DEFAULT_SUBSTEPS,
+                 pool_sizes=None, seed=None, large_board=False, chaos=False):
+        # Every random choice in the simulation comes from this generator,
+        # so a seed plus the input log reproduces a session exactly.
+        if seed is None:
+            seed = random.randrange(2 ** 63)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        # Optional replay.InputLog that apply_input() records into
+        self.input_log = None
+        self.tick = 0
+        self.scene_width = width
+        self.scene_height = height
+        # Large-board mode resizes the board to fit each level instead of
+        # using the fixed width and height
+        self.large_board = large_board
+        # Chaos mode: balls in play collide with each other as well
+        self.chaos = chaos
+        self.ball_pairs_tested = 0
+        self.ball_pairs_found = 0
+        # Compiled levels.Level objects, or an indexed levels.LevelPack
+        self.levels = as_levels(levels if levels is not None else default_levels())
+        self.substeps = max(1, substeps)
+        # Optional profiler.FrameProfiler timing each phase of step()
+        self.profiler = None
+        # Power-up durations, in ticks
+        self.scheduler = Scheduler()
+        self.paddle = Paddle(width, height)
+        # Input state, applied once per tick by steer_paddle()
+        self.held_left = False
+        self.held_right = False
+        self.paddle_target = None
+        pool_sizes = dict(DEFAULT_POOL_SIZES, **(pool_sizes or {}))
+        self.ball_pool = Pool(lambda: Ball(self.scene_width, self.scene_height, self.rng),
+                              pool_sizes["balls"], self.reset_ball)
+        self.powerup_pool = Pool(lambda: PowerUp(0, 0, None), pool_sizes["powerups"])
+        self.balls = []
+        self.bricks = []
+        self.powerups = []
+        # Scratch list for the power-ups caught in a tick, reused every tick
+        self.caught = []
+        self.particles = ParticleSystem(max_particles, seed)
+        # Cosmetic detail, lowered by the view when frames run over budget
+        self.particle_scale = 1.0
+        self.trail_length = TRAIL_LENGTH
+        self.grid = UniformGrid(BRICK_WIDTH + BRICK_GAP, BRICK_HEIGHT + BRICK_GAP,
+                                BRICK_LEFT, BRICK_TOP)
+        # Bricks whose health or existence changed since the renderer last
+        # looked; layout_serial bumps whenever the whole brick set is rebuilt.
+        self.dirty_bricks = set()
+        self.layout_serial = 0
+        # Bricks destroyed this tick as (brick, was_hit) events, resolved in
+        # one batch at the end of the ball phase.
+        self.destroyed = []
+        self.live_bricks = 0
+        # Every brick of the current layout in creation (slot) order, with
+        # byte-per-slot health and the slots of self.bricks in list order;
+        # kept in step with the bricks so snapshot.py can copy them whole.
+        self.layout = []
+        self.brick_health = bytearray()
+        self.brick_order = array("I")
+        # Optional snapshot.Rewind that records the state after every tick
+        self.rewind = None
+        # Optional spectate.SpectatorServer that streams every tick
+        self.spectators = None
+        self.reset()
+
+    # === State ===
+    def reset(self):
+        self.score = 0
+        self.lives = 3
+        self.level = 1
+        self.game_over = False
+        self.won = False
+        self.paused = False
+        # Bricks destroyed since the ball last left the paddle
+        self.combo = 0
+        self.start_tick = self.tick
+        self.clear_entities()
+        self.scheduler.clear()
+        self.paddle.reset_power()
+        self.paddle.recenter()
+        self.create_bricks()
+        self.balls.append(self.ball_pool.acquire())
+
+    def clear_entities(self):
+        # Hand every ball, power-up and particle back to its pool
+        self.ball_pool.release_all(self.balls)
+        self.powerup_pool.release_all(self.powerups)
+        self.balls = []
+        self.powerups = []
+        self.particles.clear()
+
+    def pool_stats(self):
+        return {"balls": self.ball_pool.stats(),
+                "powerups": self.powerup_pool.stats(),
+                "particles": self.particles.stats()}
+
+    def take_dirty_bricks(self):
+        dirty = self.dirty_bricks
+        if not dirty:
+            # Most frames change no brick; hand out a shared empty set
+            # rather than allocate a fresh one
+            return NO_BRICKS
+        self.dirty_bricks = set()
+        return dirty
+
+    # === Level and Brick Creation ===
+    def create_bricks(self):
+        self.bricks = []
+        self.grid.clear()
+        self.dirty_bricks = set()
+        self.destroyed = []
+        self.live_bricks = 0
+        self.layout = []
+        self.brick_health = bytearray()
+        self.brick_order = array("I")
+        self.layout_serial += 1
+        if self.level > len(self.levels):
+            return
+
+        level = self.levels[self.level - 1]
+        if self.large_board:
+            self.fit_board(level)
+        for row, col, brick_type, health in level.bricks():
+            self.add_brick(Brick(
+                BRICK_LEFT + col * (BRICK_WIDTH + BRICK_GAP),
+                BRICK_TOP + row * (BRICK_HEIGHT + BRICK_GAP),
+                BRICK_WIDTH,
+                BRICK_HEIGHT,
+                brick_type,
+                health))
+
+        # Random power-up bricks
+        if not level.rows or not level.cols:
+            return
+        for _ in range(3):
+            row = self.rng.randint(0, level.rows - 1)
+            col = self.rng.randint(0, level.cols - 1)
+            if level.occupied(row, col):
+                self.add_brick(Brick(
+                    BRICK_LEFT + col * (BRICK_WIDTH + BRICK_GAP),
+                    BRICK_TOP + row * (BRICK_HEIGHT + BRICK_GAP),
+                    BRICK_WIDTH, BRICK_HEIGHT, "powerup", 1))
+
+    def fit_board(self, level):
+        width = max(SCENE_WIDTH, 2 * BRICK_LEFT + level.cols * (BRICK_WIDTH + BRICK_GAP))
+        height = max(SCENE_HEIGHT,
+                     BRICK_TOP + level.rows * (BRICK_HEIGHT + BRICK_GAP) + LARGE_BOARD_FLOOR)
+        if (width, height) == (self.scene_width, self.scene_height):
+            return
+        self.resize_board(width, height)
+        self.paddle.recenter()
+        # Balls carried over from the previous level restart at the spawn point
+        for ball in self.balls:
+            if not ball.stuck:
+                self.reset_ball(ball)
+
+    def resize_board(self, width, height):
+        self.scene_width = width
+        self.scene_height = height
+        paddle = self.paddle
+        paddle.scene_width = width
+        paddle.scene_height = height
+        for ball in self.ball_pool.free + self.balls:
+            ball.scene_width = width
+            ball.scene_height = height
+
+    def reset_ball(self, ball):
+        ball.reset()
+        if self.large_board:
+            # Ball.reset() serves at mid-board, which on a tall board is
+            # among the bricks; serve a screen's height above the floor.
+            ball.place(ball.x, self.scene_height - SCENE_HEIGHT / 2)
+
+    def add_brick(self, brick):
+        brick.index = len(self.bricks)
+        brick.slot = len(self.layout)
+        self.bricks.append(brick)
+        self.layout.append(brick)
+        self.brick_health.append(brick.health)
+        self.brick_order.append(brick.slot)
+        self.grid.insert(brick)
+        self.live_bricks += 1
+
+    # === Input ===
+    def apply_input(self, action, value=None):
+        # Single entry point for player input, so sessions can be recorded
+        # against the simulation tick and replayed.
+        if self.input_log is not None:
+            self.input_log.record(self.tick, action, value)
+        if action == ACTION_LEFT_PRESS:
+            self.held_left = True
+            self.paddle_target = None
+        elif action == ACTION_LEFT_RELEASE:
+            self.held_left = False
+        elif action == ACTION_RIGHT_PRESS:
+            self.held_right = True
+            self.paddle_target = None
+        elif action == ACTION_RIGHT_RELEASE:
+            self.held_right = False
+        elif action == ACTION_PADDLE_TARGET:
+            self.paddle_target = value
+        elif action == ACTION_PADDLE_FREE:
+            self.paddle_target = None
+        elif action == ACTION_LEFT:
+            self.move_paddle_left()
+        elif action == ACTION_RIGHT:
+            self.move_paddle_right()
+        elif action == ACTION_LAUNCH:
+            self.launch_balls()
+        elif action == ACTION_PAUSE:
+            self.toggle_pause()
+        elif action == ACTION_RESET:
+            self.reset()
+
+    def move_paddle_left(self):
+        self.paddle.move_left()
+
+    def move_paddle_right(self):
+        self.paddle.move_right()
+
+    def steer_paddle(self):
+        paddle = self.paddle
+        if self.paddle_target is not None:
+            # Same top speed as the keys, so mouse play gains no reach
+            offset = self.paddle_target - paddle.center()
+            step = max(-paddle.speed, min(paddle.speed, offset))
+            paddle.x = min(max(0, paddle.x + step), paddle.scene_width - paddle.width)
+        elif self.held_left and not self.held_right:
+            paddle.move_left()
+        elif self.held_right and not self.held_left:
+            paddle.move_right()
+
+    def launch_balls(self):
+        for ball in self.balls:
+            if ball.stuck:
+                ball.launch()
+
+    def toggle_pause(self):
+        self.paused = not self.paused
+
+    # === Simulation Step ===
+    def step(self):
+        if self.paused or self.game_over:
+            return
+        self.run_tick()
+        if self.rewind is not None:
+            self.rewind.record(self)
+        if self.spectators is not None:
+            self.spectators.publish(self)
+
+    def run_tick(self):
+        self.tick += 1
+        prof = self.profiler
+        if prof is not None:
+            t = prof.clock()
+        paddle = self.paddle
+        paddle.prev_x = paddle.x
+        self.steer_paddle()
+        self.run_events()
+
+        # Move power-ups. Lists are compacted in place so a steady tick
+        # allocates no containers.
+        powerups = self.powerups
+        kept = 0
+        for powerup in powerups:
+            if powerup.move(self.scene_height):
+                self.powerup_pool.release(powerup)
+            else:
+                powerups[kept] = powerup
+                kept += 1
+        del powerups[kept:]
+        if prof is not None:
+            t = prof.lap(PHASE_POWERUPS, t)
+
+        # Update particles
+        self.particles.update()
+        if prof is not None:
+            t = prof.lap(PHASE_PARTICLES, t)
+
+        # Power-up collisions with paddle; every catch is tested against the
+        # paddle as it was before any of them took effect
+        caught = self.caught
+        for powerup in powerups:
+            if rects_intersect(powerup.x, powerup.y, powerup.size, powerup.size,
+                               paddle.x, paddle.y, paddle.width, paddle.height):
+                caught.append(powerup)
+        if caught:
+            for powerup in caught:
+                powerups.remove(powerup)
+                self.powerup_pool.release(powerup)
+                self.apply_powerup(powerup.type)
+            caught.clear()
+        if prof is not None:
+            t = prof.lap(PHASE_POWERUP_PADDLE, t)
+
+        # Move balls, resolving collisions along the way, then apply the
+        # tick's brick destruction as one batch
+        for ball in self.balls:
+            self.move_ball(ball)
+            if self.level_cleared():
+                break
+        if self.chaos and not self.level_cleared():
+            self.collide_balls()
+        if self.destroyed:
+            self.resolve_destruction()
+        if self.level_cleared():
+            self.next_level()
+            if prof is not None:
+                prof.lap(PHASE_BALLS, t)
+            return
+        if prof is not None:
+            t = prof.lap(PHASE_BALLS, t)
+
+        # Remove lost balls
+        balls = self.balls
+        kept = 0
+        for ball in balls:
+            if ball.lost:
+                self.ball_pool.release(ball)
+            else:
+                balls[kept] = ball
+                kept += 1
+        if kept < len(balls):
+            del balls[kept:]
+            if not balls:
+                self.ball_lost()
+        if prof is not None:
+            prof.lap(PHASE_LOST_BALLS, t)
+
+    def state_hash(self):
+        """Digest of the gameplay state (particles and trails excluded)."""
+        h = hashlib.blake2b(digest_size=16)
+        pack = struct.pack
+        h.update(pack("<qqqq??", self.tick, self.score, self.lives, self.level,
+                      self.game_over, self.won))
+        paddle = self.paddle
+        h.update(pack("<ddd?", paddle.x, paddle.y, paddle.width, paddle.sticky))
+        for due, _, kind, value in self.scheduler.pending():
+            h.update(pack("<qBq", due, kind, value))
+        for ball in self.balls:
+            h.update(pack("<dddd??", ball.x, ball.y, ball.vx, ball.vy,
+                          ball.in_play, ball.stuck))
+        for brick in self.bricks:
+            h.update(pack("<ddq", brick.x, brick.y, brick.health))
+            h.update(brick.type.encode())
+        for powerup in self.powerups:
+            h.update(pack("<dd", powerup.x, powerup.y))
+            h.update(powerup.type.encode())
+        return h.hexdigest()
+
+    def elapsed_seconds(self):
+        # Simulated play time; ticks do not advance while paused
+        return (self.tick - self.start_tick) * TICK_SECONDS
+
+    def entity_counts(self):
+        return (len(self.balls), len(self.bricks), len(self.powerups), len(self.particles))
+
+    # === Ball Physics ===
+    def move_ball(self, ball):
+        if ball.stuck:
+            ball.place(self.paddle.x + ball.stick_offset, self.paddle.y - ball.size)
+            return
+        if not ball.in_play:
+            return
+
+        ball.prev_x = ball.x
+        ball.prev_y = ball.y
+        fraction = 1.0 / self.substeps
+        for _ in range(self.substeps):
+            self.sweep_ball(ball, fraction)
+            if not ball.in_play or self.level_cleared():
+                break
+
+        # Fell out
+        if ball.y > self.scene_height:
+            ball.in_play = False
+            ball.lost = True
+        ball.update_trail(self.trail_length)
+
+    def sweep_ball(self, ball, fraction):
+        # Move the ball by fraction of its velocity, stopping at each
+        # contact on the way to bounce off the face that was hit.
+        r = ball.radius
+        remaining = fraction
+        for _ in range(MAX_BOUNCES):
+            cx, cy = ball.center()
+            dx = ball.vx * remaining
+            dy = ball.vy * remaining
+            t, nx, ny, target = self.first_contact(cx, cy, dx, dy, r)
+            ball.x += dx * t
+            ball.y += dy * t
+            if target is None:
+                return
+            remaining *= 1 - t
+
+            if target is self.paddle:
+                self.bounce_paddle(ball, nx, ny)
+                if not ball.in_play:
+                    return
+            else:
+                ball.vx, ball.vy = reflect(ball.vx, ball.vy, nx, ny)
+                if target is not WALL:
+                    self.hit_brick(target)
+            if remaining <= 0:
+                return
+
+    def first_contact(self, cx, cy, dx, dy, r):
+        best_t = 1.0
+        best = (1.0, 0, 0, None)
+
+        # Walls
+        if dx < 0 and cx - r + dx <= 0:
+            t = max(0.0, (r - cx) / dx)
+            if t < best_t:
+                best_t, best = t, (t, 1, 0, WALL)
+        elif dx > 0 and cx + r + dx >= self.scene_width:
+            t = max(0.0, (self.scene_width - r - cx) / dx)
+            if t < best_t:
+                best_t, best = t, (t, -1, 0, WALL)
+        if dy < 0 and cy - r + dy <= 0:
+            t = max(0.0, (r - cy) / dy)
+            if t < best_t:
+                best_t, best = t, (t, 0, 1, WALL)
+
+        # The box swept by the circle; anything clear of it cannot be hit
+        x0 = min(cx, cx + dx) - r
+        y0 = min(cy, cy + dy) - r
+        x1 = max(cx, cx + dx) + r
+        y1 = max(cy, cy + dy) + r
+
+        # Paddle
+        paddle = self.paddle
+        if y1 >= paddle.y and y0 <= paddle.y + paddle.height and \
+                x1 >= paddle.x and x0 <= paddle.x + paddle.width:
+            hit = sweep_circle_rect(cx, cy, dx, dy, r, paddle.x, paddle.y,
+                                    paddle.width, paddle.height)
+            if hit is not None and hit[0] < best_t:
+                best_t, best = hit[0], (hit[0], hit[1], hit[2], paddle)
+
+        # Bricks in the grid cells covered by the swept circle
+        if y0 > self.grid.bottom:
+            return best
+        for brick in self.grid.query(x0, y0, x1, y1):
+            hit = sweep_circle_rect(cx, cy, dx, dy, r, brick.x, brick.y,
+                                    brick.width, brick.height)
+            if hit is not None and hit[0] < best_t:
+                best_t, best = hit[0], (hit[0], hit[1], hit[2], brick)
+        return best
+
+    def bounce_paddle(self, ball, nx, ny):
+        paddle = self.paddle
+        if ny >= 0:
+            # Side or underside: a plain reflection
+            ball.vx, ball.vy = reflect(ball.vx, ball.vy, nx, ny)
+            return
+        offset = (ball.x + ball.radius - paddle.center()) / (paddle.width / 2)
+        ball.vx = offset * 5
+        ball.vy = -abs(ball.vy)
+        self.combo = 0
+        if paddle.sticky:
+            ball.stick_to(paddle)
+
+    # === Ball-Ball Collisions ===
+    def collide_balls(self):
+        """Bounce overlapping balls off each other (chaos mode).
+
+        Runs once per tick after every ball has moved. The sort-and-sweep
+        broad phase in spatial.sweep_pairs() keeps the candidate pairs close
+        to the pairs that actually touch, rather than all n * (n - 1) / 2.
+        """
+        balls = [ball for ball in self.balls if ball.in_play]
+        n = len(balls)
+        if n < 2:
+            return
+        xs = np.fromiter((ball.x for ball in balls), np.float64, n)
+        ys = np.fromiter((ball.y for ball in balls), np.float64, n)
+        tested, firsts, seconds = sweep_pairs(xs, ys, Ball.size)
+        self.ball_pairs_tested += tested
+        self.ball_pairs_found += len(firsts)
+        for i, j in zip(firsts.tolist(), seconds.tolist()):
+            self.bounce_balls(balls[i], balls[j])
+
+    def bounce_balls(self, a, b):
+        dx = b.x - a.x
+        dy = b.y - a.y
+        dist = math.hypot(dx, dy)
+        if dist == 0:
+            nx, ny = 1.0, 0.0
+        else:
+            nx = dx / dist
+            ny = dy / dist
+        # Equal masses: closing balls swap their velocities along the normal
+        closing = (a.vx - b.vx) * nx + (a.vy - b.vy) * ny
+        if closing > 0:
+            a.vx -= closing * nx
+            a.vy -= closing * ny
+            b.vx += closing * nx
+            b.vy += closing * ny
+        # Split the overlap between them, without pushing either out of the board
+        push = (a.size - dist) / 2
+        limit = self.scene_width - a.size
+        a.x = min(max(0, a.x - nx * push), limit)
+        a.y = max(0, a.y - ny * push)
+        b.x = min(max(0, b.x + nx * push), limit)
+        b.y = max(0, b.y + ny * push)
+
+    def level_cleared(self):
+        # Destroyed bricks stay in self.bricks until the tick's batch is resolved
+        return not self.live_bricks
+
+    # === Game Logic ===
+    def hit_brick(self, brick):
+        self.dirty_bricks.add(brick)
+        destroyed = brick.hit()
+        self.brick_health[brick.slot] = max(0, brick.health)
+        if destroyed:
+            self.destroy_brick(brick, True)
+
+    def destroy_brick(self, brick, was_hit):
+        # Take the brick out of play at once so no other ball collides with
+        # it this tick; the side effects wait for resolve_destruction().
+        brick.alive = False
+        self.dirty_bricks.add(brick)
+        self.grid.remove(brick)
+        self.live_bricks -= 1
+        self.destroyed.append((brick, was_hit))
+
+    def resolve_destruction(self):
+        """Apply every brick destroyed this tick as a single batch."""
+        events = self.destroyed
+
+        # Explosion cascades: the event list grows while it is walked, so
+        # explosive bricks caught in a blast go off in the same pass.
+        radius_sq = EXPLOSION_RADIUS * EXPLOSION_RADIUS
+        i = 0
+        while i < len(events):
+            brick = events[i][0]
+            i += 1
+            if brick.type != "explosive":
+                continue
+            cx, cy = brick.center()
+            for other in self.grid.query(cx - EXPLOSION_RADIUS, cy - EXPLOSION_RADIUS,
+                                         cx + EXPLOSION_RADIUS, cy + EXPLOSION_RADIUS):
+                if not other.alive:
+                    continue
+                ox, oy = other.center()
+                dx = ox - cx
+                dy = oy - cy
+                if dx * dx + dy * dy < radius_sq:
+                    self.destroy_brick(other, False)
+        self.destroyed = []
+
+        score = 0
+        for brick, was_hit in events:
+            score += 10 * brick.max_health
+            self.remove_brick(brick)
+            cx, cy = brick.center()
+            if brick.type == "explosive":
+                self.create_particles(cx, cy, EXPLOSION_COLOR, 30)
+            if was_hit:
+                if brick.type == "powerup":
+                    self.spawn_powerup(cx, cy)
+                self.create_particles(cx, cy, brick.color())
+        self.score += score
+        self.combo += len(events)
+
+    def remove_brick(self, brick):
+        # Swap-remove keeps removal O(1) regardless of layout size
+        last = self.bricks.pop()
+        last_slot = self.brick_order.pop()
+        if last is not brick:
+            self.bricks[brick.index] = last
+            self.brick_order[brick.index] = last_slot
+            last.index = brick.index
+        brick.index = -1
+
+    def spawn_powerup(self, x, y):
+        powerup_type = self.rng.choice(POWERUP_TYPES)
+        powerup = self.powerup_pool.acquire()
+        powerup.spawn(x - 10, y - 10, powerup_type)
+        self.powerups.append(powerup)
+
+    # === Timed Effects ===
+    def run_events(self):
+        if not self.scheduler.ready(self.tick):
+            return
+        for event in self.scheduler.due(self.tick):
+            kind = event[KIND]
+            if kind == EVENT_WIDTH_END:
+                self.paddle.reset_width()
+            elif kind == EVENT_STICKY_END:
+                self.paddle.sticky = False
+
+    def start_effect(self, kind, ticks):
+        # Catching an effect again restarts its clock; expand and shrink
+        # share one, the later catch wins
+        self.scheduler.schedule(self.tick + ticks, kind, replace=True)
+
+    def end_effects(self):
+        self.scheduler.cancel_kind(EVENT_WIDTH_END)
+        self.scheduler.cancel_kind(EVENT_STICKY_END)
+        self.paddle.reset_power()
+
+    def apply_powerup(self, type):
+        paddle = self.paddle
+        if type == "expand":
+            paddle.expand()
+            self.start_effect(EVENT_WIDTH_END, EXPAND_TICKS)
+        elif type == "shrink":
+            paddle.shrink()
+            self.start_effect(EVENT_WIDTH_END, SHRINK_TICKS)
+        elif type == "multiball":
+            for _ in range(2):
+                new_ball = self.ball_pool.acquire()
+                new_ball.place(paddle.center(), paddle.y - new_ball.size)
+                new_ball.vx = self.rng.choice([-4, -3, 3, 4])
+                new_ball.vy = -4
+                self.balls.append(new_ball)
+        elif type == "extra_life":
+            self.lives += 1
+        elif type == "sticky":
+            paddle.make_sticky()
+            self.start_effect(EVENT_STICKY_END, STICKY_TICKS)
+
+    def create_particles(self, x, y, color, count=15):
+        count = int(count * self.particle_scale)
+        if count:
+            self.particles.emit(x, y, color, count)
+
+    def ball_lost(self):
+        self.lives -= 1
+        self.combo = 0
+        if self.lives <= 0:
+            self.game_over = True
+        else:
+            self.balls.append(self.ball_pool.acquire())
+
+    def next_level(self):
+        self.level += 1
+        if self.level > len(self.levels):
+            self.game_over = True
+            self.won = True
+            return
+
+        # Balls in play carry over; falling power-ups and particles do not
+        self.powerup_pool.release_all(self.powerups)
+        self.powerups = []
+        self.particles.clear()
+        self.create_bricks()
+        self.end_effects()
+        self.paddle.recenter()
@@ -0,0 +1,321 @@
+"""Gym-style training environments over the headless engine.
+
+    env = BreakoutEnv(seed=0)
+    obs = env.reset()
+    obs, reward, done, info = env.step(ACTION_RIGHT)
+
+    venv = VectorEnv(num_envs=256, num_workers=8)
+    obs = venv.reset()                        # (256, OBS_SIZE) float32
+    obs, rewards, dones, infos = venv.step(actions)
+    venv.close()
+
+VectorEnv runs its games in worker processes, one slice of environments
+per worker. Actions, observations, rewards and done flags live in shared
+memory NumPy arrays, so a batch step only sends a one-word command down
+each worker's pipe instead of pickling observations.
+"""
+import multiprocessing as mp
+import os
+import random
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import engine
+
+ACTION_NOOP = 0
+ACTION_LEFT = 1
+ACTION_RIGHT = 2
+ACTION_LAUNCH = 3
+NUM_ACTIONS = 4
+
+ENGINE_ACTIONS = {ACTION_LEFT: engine.ACTION_LEFT, ACTION_RIGHT: engine.ACTION_RIGHT,
+                  ACTION_LAUNCH: engine.ACTION_LAUNCH}
+
+# Observation: paddle (x, width, lives), MAX_BALLS x (x, y, vx, vy, active),
+# then brick health / max health on a GRID_ROWS x GRID_COLS grid.
+MAX_BALLS = 4
+GRID_ROWS = 8
+GRID_COLS = 10
+PADDLE_SIZE = 3
+BALL_SIZE = 5
+BALLS_OFFSET = PADDLE_SIZE
+GRID_OFFSET = BALLS_OFFSET + MAX_BALLS * BALL_SIZE
+OBS_SIZE = GRID_OFFSET + GRID_ROWS * GRID_COLS
+
+DEFAULT_MAX_TICKS = 20000
+
+
+# Environment
+class BreakoutEnv:
+    def __init__(self, seed=None, levels=None, max_ticks=DEFAULT_MAX_TICKS, frame_skip=1):
+        self.seed = seed
+        # Follow-up episode seeds come from here, never from the game's rng
+        self.seeds = random.Random(seed)
+        self.levels = levels
+        self.max_ticks = max_ticks
+        self.frame_skip = frame_skip
+        self.game = None
+        self.episode_ticks = 0
+        self.layout_serial = None
+        # Layout bricks by grid cell; power-up bricks can share a cell with
+        # the brick beneath them
+        self.cells = {}
+        self.obs = np.zeros(OBS_SIZE, dtype=np.float32)
+
+    def reset(self, seed=None, out=None):
+        if seed is not None:
+            self.seed = seed
+            self.seeds = random.Random(seed)
+        self.game = engine.Game(levels=self.levels, seed=self.seed)
+        # Later resets draw fresh seeds so episodes differ. Drawing them from
+        # the game's rng would shift its stream away from a Game built from
+        # the same seed, and the episode would no longer replay.
+        self.seed = self.seeds.randrange(2 ** 63)
+        self.episode_ticks = 0
+        self.layout_serial = None
+        return self.observe(out)
+
+    def step(self, action, out=None):
+        game = self.game
+        score = game.score
+        engine_action = ENGINE_ACTIONS.get(int(action))
+        for _ in range(self.frame_skip):
+            if engine_action is not None:
+                game.apply_input(engine_action)
+            game.step()
+            self.episode_ticks += 1
+            if game.game_over:
+                break
+        reward = float(game.score - score)
+        truncated = self.episode_ticks >= self.max_ticks
+        done = game.game_over or truncated
+        info = {"score": game.score, "lives": game.lives, "level": game.level,
+                "truncated": truncated and not game.game_over}
+        return self.observe(out), reward, done, info
+
+    def observe(self, out=None):
+        obs = self.obs
+        game = self.game
+        width = game.scene_width
+        height = game.scene_height
+        paddle = game.paddle
+        obs[0] = paddle.x / width
+        obs[1] = paddle.width / width
+        obs[2] = game.lives / 3.0
+
+        balls = obs[BALLS_OFFSET:GRID_OFFSET]
+        balls[:] = 0
+        for i, ball in enumerate(game.balls[:MAX_BALLS]):
+            j = i * BALL_SIZE
+            balls[j] = ball.x / width
+            balls[j + 1] = ball.y / height
+            balls[j + 2] = ball.vx / 10.0
+            balls[j + 3] = ball.vy / 10.0
+            balls[j + 4] = 1.0
+
+        # The brick grid only changes where the game marked bricks dirty
+        grid = obs[GRID_OFFSET:]
+        if self.layout_serial != game.layout_serial:
+            self.layout_serial = game.layout_serial
+            game.take_dirty_bricks()
+            self.cells = {}
+            for brick in game.layout:
+                cell = self.grid_cell(brick)
+                if cell is not None:
+                    self.cells.setdefault(cell, []).append(brick)
+            grid[:] = 0
+            for cell in self.cells:
+                self.write_cell(grid, cell)
+        else:
+            for brick in game.take_dirty_bricks():
+                cell = self.grid_cell(brick)
+                if cell is not None:
+                    self.write_cell(grid, cell)
+
+        if out is not None:
+            out[:] = obs
+            return out
+        return obs.copy()
+
+    @staticmethod
+    def grid_cell(brick):
+        col = int((brick.x - engine.BRICK_LEFT) // (engine.BRICK_WIDTH + engine.BRICK_GAP))
+        row = int((brick.y - engine.BRICK_TOP) // (engine.BRICK_HEIGHT + engine.BRICK_GAP))
+        if 0 <= row < GRID_ROWS and 0 <= col < GRID_COLS:
+            return row * GRID_COLS + col
+        return None
+
+    def write_cell(self, grid, cell):
+        # The strongest alive brick in the cell, whatever order they changed in
+        grid[cell] = max((brick.health / brick.max_health
+                          for brick in self.cells[cell] if brick.alive), default=0.0)
+
+
+# === Vectorized Environments ===
+class SharedBuffers:
+    """NumPy arrays for a batch of environments, backed by shared memory."""
+
+    def __init__(self, num_envs, name=None):
+        sizes = (("obs", (num_envs, OBS_SIZE), np.float32),
+                 ("rewards", (num_envs,), np.float32),
+                 ("dones", (num_envs,), np.uint8),
+                 ("actions", (num_envs,), np.int8),
+                 ("scores", (num_envs,), np.int64))
+        layout = []
+        offset = 0
+        for key, shape, dtype in sizes:
+            # Keep every array 8-byte aligned
+            offset = -(-offset // 8) * 8
+            layout.append((key, shape, dtype, offset))
+            offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        for key, shape, dtype, start in layout:
+            setattr(self, key, np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=start))
+
+    def close(self, unlink=False):
+        # Drop the array views first, the buffer cannot close while exported
+        for key in ("obs", "rewards", "dones", "actions", "scores"):
+            setattr(self, key, None)
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def run_slice(envs, indices, buffers, command, seeds=None):
+    obs = buffers.obs
+    if command == "reset":
+        for env, i in zip(envs, indices):
+            env.reset(None if seeds is None else seeds[i], out=obs[i])
+            buffers.rewards[i] = 0
+            buffers.dones[i] = 0
+            buffers.scores[i] = 0
+        return
+    actions = buffers.actions
+    for env, i in zip(envs, indices):
+        _, reward, done, info = env.step(actions[i], out=obs[i])
+        buffers.rewards[i] = reward
+        buffers.dones[i] = done
+        buffers.scores[i] = info["score"]
+        if done:
+            # Auto-reset, as vectorized Gym environments do
+            env.reset(out=obs[i])
+
+
+def worker_main(conn, shm_name, num_envs, indices, seeds, env_kwargs):
+    buffers = SharedBuffers(num_envs, shm_name)
+    envs = [BreakoutEnv(seed=seeds[i], **env_kwargs) for i in indices]
+    try:
+        while True:
+            command = conn.recv()
+            if command == "close":
+                break
+            run_slice(envs, indices, buffers, command)
+            conn.send(True)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        buffers.close()
+        conn.close()
+
+
+class VectorEnv:
+    """N independent games stepped as one batch across worker processes.
+
+    With ``num_workers=0`` the games run in the calling process, which is
+    handy for debugging; the arrays and semantics are the same.
+    """
+
+    def __init__(self, num_envs, num_workers=None, seed=0, **env_kwargs):
+        if num_workers is None:
+            num_workers = os.cpu_count() or 1
+        num_workers = min(num_workers, num_envs)
+        self.num_envs = num_envs
+        self.buffers = SharedBuffers(num_envs)
+        seeds = [seed + i for i in range(num_envs)]
+        self.workers = []
+        self.local = None
+        if num_workers == 0:
+            indices = list(range(num_envs))
+            self.local = ([BreakoutEnv(seed=seeds[i], **env_kwargs) for i in indices], indices)
+            return
+
+        ctx = mp.get_context("fork" if sys.platform.startswith("linux") else "spawn")
+        for slice_indices in np.array_split(np.arange(num_envs), num_workers):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=worker_main, daemon=True,
+                                  args=(child, self.buffers.shm.name, num_envs,
+                                        [int(i) for i in slice_indices], seeds, env_kwargs))
+            process.start()
+            child.close()
+            self.workers.append((process, parent))
+
+    def run(self, command):
+        if self.local is not None:
+            run_slice(*self.local, self.buffers, command)
+            return
+        for _, conn in self.workers:
+            conn.send(command)
+        for _, conn in self.workers:
+            conn.recv()
+
+    def reset(self):
+        self.run("reset")
+        return self.buffers.obs
+
+    def step(self, actions):
+        """Step every game once; returns views into the shared arrays."""
+        self.buffers.actions[:] = actions
+        self.run("step")
+        buffers = self.buffers
+        return buffers.obs, buffers.rewards, buffers.dones.astype(bool), \
+            {"scores": buffers.scores}
+
+    def close(self):
+        for process, conn in self.workers:
+            try:
+                conn.send("close")
+            except (BrokenPipeError, OSError):
+                pass
+        for process, conn in self.workers:
+            process.join(timeout=5)
+            conn.close()
+        self.workers = []
+        self.buffers.close(unlink=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure VectorEnv throughput.")
+    parser.add_argument("--envs", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--steps", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    with VectorEnv(args.envs, args.workers) as venv:
+        venv.reset()
+        start = time.perf_counter()
+        for _ in range(args.steps):
+            venv.step(rng.integers(0, NUM_ACTIONS, size=args.envs))
+        elapsed = time.perf_counter() - start
+    total = args.envs * args.steps
+    print(f"{args.envs} envs x {args.steps} steps on {args.workers} workers: "
+          f"{total / elapsed:.0f} steps/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""Level packs.
+
+Levels are written in a plain-text source format and compiled into a
+binary pack that is memory-mapped and indexed, so opening a pack and
+loading level N take the same time however many levels it holds.
+
+Source format::
+
+    # comment
+    1: normal 1          legend lines before the first level apply to all
+    = Pyramid            starts a level
+    5: explosive 1       legend lines inside a level only apply to it
+    1111111111           layout rows; '0', '.' and unmapped characters are empty
+    1234543210
+
+    python levels.py compile pack.txt pack.bpk
+    python levels.py info pack.bpk
+"""
+import argparse
+import mmap
+import re
+import struct
+import sys
+
+BRICK_TYPES = ("normal", "strong", "explosive", "powerup")
+TYPE_CODES = {name: code for code, name in enumerate(BRICK_TYPES)}
+EMPTY = 0xFF
+
+MAGIC = b"BPAK"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxIQ")
+RECORD = struct.Struct("<HHH")
+INDEX_ENTRY = struct.Struct("<QI")
+
+LEGEND_LINE = re.compile(r"^(\S):\s*(\w+)\s+(\d+)$")
+
+
+class LevelError(Exception):
+    pass
+
+
+# Level
+class Level:
+    """A compiled level: a rows x cols grid of (type code, health) byte pairs."""
+
+    __slots__ = ("name", "rows", "cols", "cells")
+
+    def __init__(self, name, rows, cols, cells):
+        self.name = name
+        self.rows = rows
+        self.cols = cols
+        self.cells = cells
+
+    def bricks(self):
+        cols = self.cols
+        types = bytes(self.cells[0::2])
+        healths = bytes(self.cells[1::2])
+        for i, code in enumerate(types):
+            if code != EMPTY:
+                yield i // cols, i % cols, BRICK_TYPES[code], healths[i]
+
+    def occupied(self, row, col):
+        return self.cells[2 * (row * self.cols + col)] != EMPTY
+
+
+def compile_level(layout, mapping, name=""):
+    rows = len(layout)
+    cols = max((len(row) for row in layout), default=0)
+    cells = bytearray([EMPTY, 0] * (rows * cols))
+    for row_idx, row_data in enumerate(layout):
+        for col_idx, char in enumerate(row_data):
+            info = mapping.get(char)
+            if char in "0." or info is None:
+                continue
+            code = TYPE_CODES.get(info["type"])
+            if code is None:
+                raise LevelError(f"unknown brick type {info['type']!r} in level {name!r}")
+            if not 1 <= info["health"] <= 255:
+                raise LevelError(f"brick health must be 1-255 in level {name!r}")
+            i = 2 * (row_idx * cols + col_idx)
+            cells[i] = code
+            cells[i + 1] = info["health"]
+    return Level(name, rows, cols, bytes(cells))
+
+
+def as_levels(levels):
+    # Accept compiled levels, a LevelPack or the engine's dict specs
+    if isinstance(levels, LevelPack):
+        return levels
+    return [level if isinstance(level, Level) else
+            compile_level(level["layout"], level["mapping"], level.get("name", ""))
+            for level in levels]
+
+
+# === Source Format ===
+def parse_source(text):
+    shared = {}
+    levels = []
+    current = None
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("="):
+            current = {"name": line[1:].strip(), "layout": [], "mapping": dict(shared)}
+            levels.append(current)
+            continue
+        legend = LEGEND_LINE.match(line)
+        if legend:
+            char, type, health = legend.groups()
+            (current["mapping"] if current else shared)[char] = \
+                {"type": type, "health": int(health)}
+            continue
+        if current is None:
+            raise LevelError(f"line {number}: layout row before the first '= name' line")
+        current["layout"].append(line)
+    return as_levels(levels)
+
+
+# === Binary Pack ===
+def encode_pack(levels):
+    body = bytearray(HEADER.size)
+    index = []
+    for level in levels:
+        name = level.name.encode()
+        start = len(body)
+        body += RECORD.pack(level.rows, level.cols, len(name))
+        body += name
+        body += level.cells
+        index.append((start, len(body) - start))
+    index_offset = len(body)
+    for entry in index:
+        body += INDEX_ENTRY.pack(*entry)
+    HEADER.pack_into(body, 0, MAGIC, VERSION, len(index), index_offset)
+    return bytes(body)
+
+
+# Level Pack
+class LevelPack:
+    """Read-only, indexed view of a compiled pack.
+
+    Only the header is read up front; each level is decoded on access from
+    its index entry, touching just that level's bytes in the mapped file.
+    """
+
+    def __init__(self, buffer, closer=None):
+        magic, version, count, index_offset = HEADER.unpack_from(buffer)
+        if magic != MAGIC or version != VERSION:
+            raise LevelError("not a Breakout level pack")
+        self.buffer = memoryview(buffer)
+        self.count = count
+        self.index_offset = index_offset
+        self.closer = closer
+
+    @classmethod
+    def open(cls, path):
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(mapped, mapped.close)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, n):
+        if n < 0:
+            n += self.count
+        if not 0 <= n < self.count:
+            raise IndexError("level index out of range")
+        buffer = self.buffer
+        offset, _ = INDEX_ENTRY.unpack_from(buffer, self.index_offset + n * INDEX_ENTRY.size)
+        rows, cols, name_len = RECORD.unpack_from(buffer, offset)
+        start = offset + RECORD.size
+        name = bytes(buffer[start:start + name_len]).decode()
+        start += name_len
+        return Level(name, rows, cols, bytes(buffer[start:start + rows * cols * 2]))
+
+    def close(self):
+        self.buffer.release()
+        if self.closer is not None:
+            self.closer()
+
+
+def load(path):
+    """Open a compiled .bpk pack, or parse a source pack."""
+    with open(path, "rb") as f:
+        compiled = f.read(len(MAGIC)) == MAGIC
+    if compiled:
+        return LevelPack.open(path)
+    with open(path) as f:
+        return parse_source(f.read())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile and inspect Breakout level packs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compiler = commands.add_parser("compile", help="compile a source pack into a .bpk pack")
+    compiler.add_argument("source", help="source pack (.txt)")
+    compiler.add_argument("pack", help="compiled pack to write (.bpk)")
+    info = commands.add_parser("info", help="list the levels in a pack")
+    info.add_argument("pack", help="compiled or source pack")
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        with open(args.source) as f:
+            levels = parse_source(f.read())
+        with open(args.pack, "wb") as f:
+            f.write(encode_pack(levels))
+        print(f"{len(levels)} levels written to {args.pack}")
+        return 0
+    pack = load(args.pack)
+    for n in range(len(pack)):
+        level = pack[n]
+        print(f"{n + 1:>6}  {level.rows}x{level.cols}  {level.name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
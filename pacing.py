@@ -0,0 +1,105 @@
+"""Frame pacing and adaptive quality.
+
+FramePacer schedules frames against absolute deadlines from a monotonic
+clock, so timer jitter and the time spent on a frame do not accumulate
+into drift. QualityController watches how long frames take to produce and
+steps optional rendering work down when they run over budget, and back up
+once there is headroom again.
+"""
+import time
+
+import engine
+
+# Quality levels, best first
+QUALITY_LEVELS = (
+    {"name": "high", "particle_scale": 1.0, "trail_length": engine.TRAIL_LENGTH,
+     "antialiasing": True},
+    {"name": "medium", "particle_scale": 0.5, "trail_length": engine.TRAIL_LENGTH,
+     "antialiasing": True},
+    {"name": "low", "particle_scale": 0.5, "trail_length": engine.TRAIL_LENGTH // 2,
+     "antialiasing": False},
+    {"name": "lower", "particle_scale": 0.25, "trail_length": 2, "antialiasing": False},
+    {"name": "minimal", "particle_scale": 0.0, "trail_length": 0, "antialiasing": False},
+)
+
+
+# Frame Pacer
+class FramePacer:
+    def __init__(self, interval=engine.TICK_SECONDS, clock=time.perf_counter):
+        self.interval = interval
+        self.clock = clock
+        self.deadline = None
+        self.late_frames = 0
+
+    def next_delay(self):
+        """Seconds to wait until the next frame is due."""
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        elif now - self.deadline > self.interval:
+            # More than a frame late: start over from now rather than
+            # rushing out a burst of frames to catch up.
+            self.late_frames += 1
+            self.deadline = now
+        self.deadline += self.interval
+        return max(0.0, self.deadline - now)
+
+    def reset(self):
+        self.deadline = None
+
+
+# Quality Controller
+class QualityController:
+    """Picks a quality level from measured frame work time.
+
+    A smoothed frame time above the budget for ``down_frames`` frames drops
+    one level; below ``headroom`` of the budget for ``up_frames`` frames
+    raises one. Going down reacts within a fraction of a second, going up
+    waits several seconds so the level does not oscillate.
+    """
+
+    def __init__(self, budget_ms=engine.TICK_MS * 0.75, levels=QUALITY_LEVELS,
+                 down_frames=10, up_frames=180, headroom=0.5, smoothing=0.1):
+        self.budget_ms = budget_ms
+        self.levels = levels
+        self.down_frames = down_frames
+        self.up_frames = up_frames
+        self.headroom = headroom
+        self.smoothing = smoothing
+        self.level = 0
+        self.average_ms = None
+        self.over = 0
+        self.under = 0
+        self.changes = 0
+
+    @property
+    def settings(self):
+        return self.levels[self.level]
+
+    def observe(self, frame_ms):
+        """Feed one frame's work time; returns True when the level changed."""
+        if self.average_ms is None:
+            self.average_ms = frame_ms
+        else:
+            self.average_ms += (frame_ms - self.average_ms) * self.smoothing
+        if self.average_ms > self.budget_ms:
+            self.over += 1
+            self.under = 0
+        elif self.average_ms < self.budget_ms * self.headroom:
+            self.under += 1
+            self.over = 0
+        else:
+            self.over = self.under = 0
+
+        if self.over >= self.down_frames and self.level < len(self.levels) - 1:
+            self.set_level(self.level + 1)
+            return True
+        if self.under >= self.up_frames and self.level > 0:
+            self.set_level(self.level - 1)
+            return True
+        return False
+
+    def set_level(self, level):
+        self.level = level
+        self.over = self.under = 0
+        self.changes += 1
@@ -0,0 +1,84 @@
+"""Array-backed particle system.
+
+Particles are cosmetic, so they are stored column-wise in NumPy arrays and
+advanced with one vectorized update per tick instead of one object each.
+"""
+import numpy as np
+
+PARTICLE_LIFETIME = 30
+PARTICLE_SIZE = 4
+DEFAULT_MAX_PARTICLES = 2000
+
+
+# Particle System
+class ParticleSystem:
+    def __init__(self, max_particles=DEFAULT_MAX_PARTICLES, seed=None):
+        self.max_particles = max_particles
+        self.count = 0
+        self.pos = np.zeros((max_particles, 2), dtype=np.float64)
+        self.vel = np.zeros((max_particles, 2), dtype=np.float64)
+        self.life = np.zeros(max_particles, dtype=np.int32)
+        self.color = np.zeros(max_particles, dtype=np.int32)
+        # Colors are interned into a small palette so the renderer can batch
+        # particles of the same color together.
+        self.palette = []
+        self.palette_index = {}
+        self.rng = np.random.default_rng(seed)
+        self.emitted = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.count
+
+    def color_id(self, color):
+        color_id = self.palette_index.get(color)
+        if color_id is None:
+            color_id = len(self.palette)
+            self.palette.append(color)
+            self.palette_index[color] = color_id
+        return color_id
+
+    def emit(self, x, y, color, count):
+        # Anything past the cap is dropped rather than evicting live particles.
+        start = self.count
+        end = min(self.max_particles, start + count)
+        self.emitted += end - start
+        self.dropped += count - (end - start)
+        if end <= start:
+            return
+        self.pos[start:end] = (x, y)
+        self.vel[start:end] = self.rng.uniform(-2, 2, size=(end - start, 2))
+        self.life[start:end] = PARTICLE_LIFETIME
+        self.color[start:end] = self.color_id(color)
+        self.count = end
+
+    def update(self):
+        n = self.count
+        if n == 0:
+            return
+        self.pos[:n] += self.vel[:n]
+        life = self.life[:n]
+        life -= 1
+        alive = life > 0
+        if alive.all():
+            return
+        # Compact the survivors to the front of the arrays
+        keep = np.flatnonzero(alive)
+        m = len(keep)
+        self.pos[:m] = self.pos[keep]
+        self.vel[:m] = self.vel[keep]
+        self.life[:m] = self.life[keep]
+        self.color[:m] = self.color[keep]
+        self.count = m
+
+    def clear(self):
+        self.count = 0
+
+    def stats(self):
+        # The arrays act as the particle pool: emits within the cap are hits
+        return {"size": self.max_particles, "in_use": self.count,
+                "free": self.max_particles - self.count,
+                "hits": self.emitted, "misses": self.dropped}
+
+    def opacity(self):
+        return np.maximum(self.life[:self.count], 0) / float(PARTICLE_LIFETIME)
@@ -0,0 +1,43 @@
+"""Free-list object pools.
+
+Entities that come and go during play (balls, power-ups and their scene
+items) are recycled through a Pool instead of being rebuilt each time.
+"""
+
+DEFAULT_POOL_SIZES = {"balls": 8, "powerups": 16}
+
+
+# Pool
+class Pool:
+    def __init__(self, factory, size=0, reset=None):
+        self.factory = factory
+        self.reset = reset
+        self.free = [factory() for _ in range(size)]
+        self.size = size
+        self.in_use = 0
+        self.hits = 0
+        self.misses = 0
+
+    def acquire(self):
+        if self.free:
+            obj = self.free.pop()
+            self.hits += 1
+        else:
+            obj = self.factory()
+            self.misses += 1
+        if self.reset is not None:
+            self.reset(obj)
+        self.in_use += 1
+        return obj
+
+    def release(self, obj):
+        self.in_use -= 1
+        self.free.append(obj)
+
+    def release_all(self, objs):
+        for obj in objs:
+            self.release(obj)
+
+    def stats(self):
+        return {"size": self.size, "in_use": self.in_use, "free": len(self.free),
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,150 @@
+"""Per-phase frame profiler.
+
+Phase timings for the last ``capacity`` frames are kept in a fixed-size
+ring buffer so stutter can be diagnosed after the fact, from the in-game
+overlay or an exported CSV/JSON file.
+"""
+import csv
+import json
+import time
+
+import numpy as np
+
+# Simulation phases (timed inside Game.step) followed by the view's own
+PHASES = ("powerup_move", "particle_update", "powerup_paddle", "ball_collide",
+          "lost_balls", "sync", "paint")
+COUNTERS = ("balls", "bricks", "powerups", "particles")
+
+PHASE_POWERUPS = 0
+PHASE_PARTICLES = 1
+PHASE_POWERUP_PADDLE = 2
+PHASE_BALLS = 3
+PHASE_LOST_BALLS = 4
+PHASE_SYNC = 5
+PHASE_PAINT = 6
+
+DEFAULT_CAPACITY = 600
+
+
+# Frame Profiler
+class FrameProfiler:
+    def __init__(self, capacity=DEFAULT_CAPACITY, clock=time.perf_counter):
+        self.capacity = capacity
+        self.clock = clock
+        self.times = np.zeros((capacity, len(PHASES)), dtype=np.float64)
+        self.counts = np.zeros((capacity, len(COUNTERS)), dtype=np.int64)
+        self.stamps = np.zeros(capacity, dtype=np.float64)
+        self.current = np.zeros(len(PHASES), dtype=np.float64)
+        self.index = 0
+        self.filled = 0
+        self.frames = 0
+
+    def lap(self, phase, start):
+        # Charge the time since start to phase and return the new start
+        now = self.clock()
+        self.current[phase] += now - start
+        return now
+
+    def commit(self, counts):
+        """Close the current frame and store it in the ring buffer."""
+        i = self.index
+        self.times[i] = self.current * 1000.0
+        self.counts[i] = counts
+        self.stamps[i] = self.clock()
+        self.current[:] = 0
+        self.index = (i + 1) % self.capacity
+        self.filled = min(self.filled + 1, self.capacity)
+        self.frames += 1
+
+    def ordered(self, array):
+        # Rows oldest first
+        if self.filled < self.capacity:
+            return array[:self.filled]
+        return np.concatenate((array[self.index:], array[:self.index]))
+
+    def recent_mean(self, frames=60):
+        times = self.ordered(self.times)[-frames:]
+        if len(times) == 0:
+            return np.zeros(len(PHASES))
+        return times.mean(axis=0)
+
+    def last_frame_ms(self):
+        if self.filled == 0:
+            return 0.0
+        return float(self.times[(self.index - 1) % self.capacity].sum())
+
+    def last_counts(self):
+        if self.filled == 0:
+            return np.zeros(len(COUNTERS), dtype=np.int64)
+        return self.counts[(self.index - 1) % self.capacity]
+
+    def rows(self):
+        times = self.ordered(self.times)
+        counts = self.ordered(self.counts)
+        stamps = self.ordered(self.stamps)
+        first = self.frames - len(times)
+        for n in range(len(times)):
+            row = {"frame": first + n, "time": float(stamps[n])}
+            row.update(zip(PHASES, (float(v) for v in times[n])))
+            row.update(zip(COUNTERS, (int(v) for v in counts[n])))
+            yield row
+
+    def export_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=("frame", "time") + PHASES + COUNTERS)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def export_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"phases_ms": PHASES, "counters": COUNTERS,
+                       "frames": list(self.rows())}, f)
+
+
+# Input Latency
+class LatencyMeter:
+    """Time from an input event to the end of the first frame showing it.
+
+    An input is applied to the game state straight away but only moves
+    anything on the next simulation tick, so it counts as shown once a
+    frame is painted with the game past the tick the input arrived at.
+    """
+    max_pending = 64
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, clock=time.perf_counter):
+        self.capacity = capacity
+        self.clock = clock
+        self.samples = np.zeros(capacity, dtype=np.float64)
+        self.index = 0
+        self.filled = 0
+        self.pending = []
+
+    def input(self, tick):
+        if len(self.pending) >= self.max_pending:
+            # Nothing is being painted (paused or hidden); keep the newest
+            del self.pending[0]
+        self.pending.append((self.clock(), tick))
+
+    def frame(self, tick):
+        if not self.pending or self.pending[0][1] >= tick:
+            return
+        now = self.clock()
+        waiting = []
+        for start, input_tick in self.pending:
+            if input_tick < tick:
+                self.samples[self.index] = (now - start) * 1000.0
+                self.index = (self.index + 1) % self.capacity
+                self.filled = min(self.filled + 1, self.capacity)
+            else:
+                waiting.append((start, input_tick))
+        self.pending = waiting
+
+    def summary(self):
+        samples = self.samples[:self.filled]
+        if len(samples) == 0:
+            return {"count": 0}
+        return {"count": len(samples),
+                "mean_ms": float(samples.mean()),
+                "p50_ms": float(np.percentile(samples, 50)),
+                "p95_ms": float(np.percentile(samples, 95)),
+                "max_ms": float(samples.max())}
@@ -0,0 +1,266 @@
+"""Input recording and headless replay.
+
+A session is fully determined by the game's seed and the player's inputs,
+each tagged with the simulation tick it was applied at. Replaying feeds
+the same inputs back at the same ticks as fast as the engine can step and
+checks the final state hash.
+
+    python replay.py session.brkr [more.brkr ...]
+    python replay.py --selfcheck 200
+"""
+import argparse
+import random
+import struct
+import sys
+import time
+
+import engine
+import levels
+
+MAGIC = b"BRKR"
+# Version 2 added actions that carry a value. Version 3 marks the move of
+# power-up timers to the tick scheduler, which changed how stacked power-ups
+# play out and what state_hash() covers, so older files no longer verify.
+# Version 4 added a flags byte for game options the session was played with.
+VERSION = 4
+FIRST_VERIFIABLE_VERSION = 3
+HEADER = struct.Struct("<4sBqIIIqIq16sB")
+HEADER_V3 = struct.Struct("<4sBqIIIqIq16s")
+
+# Header flags
+FLAG_LARGE_BOARD = 1
+FLAG_CHAOS = 2
+
+
+class ReplayError(Exception):
+    pass
+
+
+def write_varint(out, value):
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return
+
+
+def read_varint(data, pos):
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+# Input Log
+class InputLog:
+    def __init__(self, seed, width=engine.SCENE_WIDTH, height=engine.SCENE_HEIGHT,
+                 substeps=engine.DEFAULT_SUBSTEPS, large_board=False, chaos=False):
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.substeps = substeps
+        self.large_board = large_board
+        self.chaos = chaos
+        self.events = []
+        self.final_tick = 0
+        self.final_score = 0
+        self.final_hash = bytes(16)
+
+    @classmethod
+    def for_game(cls, game):
+        return cls(game.seed, game.scene_width, game.scene_height, game.substeps,
+                   game.large_board, game.chaos)
+
+    def record(self, tick, action, value=None):
+        self.events.append((tick, action, value))
+
+    def truncate(self, tick):
+        """Forget the inputs recorded at or after tick (the game was rewound).
+
+        A rewound state is the one captured at the end of that tick's step,
+        before any input recorded at the tick was applied.
+        """
+        while self.events and self.events[-1][0] >= tick:
+            self.events.pop()
+
+    def finish(self, game):
+        self.final_tick = game.tick
+        self.final_score = game.score
+        self.final_hash = bytes.fromhex(game.state_hash())
+
+    # === Binary Format ===
+    def to_bytes(self):
+        # Header, then each event as a varint tick delta and an action byte,
+        # followed by a varint value for the actions that carry one
+        body = bytearray()
+        last = 0
+        for tick, action, value in self.events:
+            write_varint(body, tick - last)
+            body.append(action)
+            if action in engine.VALUE_ACTIONS:
+                write_varint(body, value)
+            last = tick
+        header = HEADER.pack(MAGIC, VERSION, self.seed, self.width, self.height,
+                             self.substeps, self.final_tick, len(self.events),
+                             self.final_score, self.final_hash,
+                             (FLAG_LARGE_BOARD if self.large_board else 0)
+                             | (FLAG_CHAOS if self.chaos else 0))
+        return header + bytes(body)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) < HEADER_V3.size or data[:4] != MAGIC or not 1 <= data[4] <= VERSION:
+            raise ReplayError("not a Breakout replay file")
+        version = data[4]
+        if version < FIRST_VERIFIABLE_VERSION:
+            raise ReplayError(f"recorded by an older engine (version {version}) "
+                              "whose power-up timing no longer matches")
+        header = HEADER if version >= 4 else HEADER_V3
+        (magic, version, seed, width, height, substeps, final_tick, count,
+         final_score, final_hash, *flags) = header.unpack_from(data)
+        flags = flags[0] if flags else 0
+        log = cls(seed, width, height, substeps, bool(flags & FLAG_LARGE_BOARD),
+                  bool(flags & FLAG_CHAOS))
+        pos = header.size
+        tick = 0
+        for _ in range(count):
+            delta, pos = read_varint(data, pos)
+            tick += delta
+            action = data[pos]
+            pos += 1
+            value = None
+            if action in engine.VALUE_ACTIONS:
+                value, pos = read_varint(data, pos)
+            log.events.append((tick, action, value))
+        log.final_tick = final_tick
+        log.final_score = final_score
+        log.final_hash = final_hash
+        return log
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+# === Replay ===
+def new_game(log, level_pack=None):
+    """A fresh Game set up the way the recorded session started."""
+    return engine.Game(log.width, log.height, levels=level_pack, substeps=log.substeps,
+                       seed=log.seed, large_board=log.large_board, chaos=log.chaos)
+
+
+def steps(game, log):
+    """Feed the recorded inputs to game, yielding after every tick it advances."""
+    events = log.events
+    i = 0
+    n = len(events)
+    while True:
+        while i < n and events[i][0] == game.tick:
+            game.apply_input(events[i][1], events[i][2])
+            i += 1
+        if game.tick >= log.final_tick:
+            return
+        before = game.tick
+        game.step()
+        if game.tick != before:
+            yield game
+        elif i >= n or events[i][0] != game.tick:
+            # Paused or over with no input left at this tick to change that
+            raise ReplayError(f"replay stalled at tick {game.tick}")
+
+
+def replay(log, level_pack=None):
+    """Re-run a recorded session headless and return the final Game."""
+    game = new_game(log, level_pack)
+    for _ in steps(game, log):
+        pass
+    return game
+
+
+def verify(log, level_pack=None):
+    game = replay(log, level_pack)
+    return game.state_hash() == log.final_hash.hex(), game
+
+
+def random_session(seed, ticks=3000, level_pack=None, large_board=False, chaos=False):
+    """Play a session with random inputs and return its finished log."""
+    game = engine.Game(levels=level_pack, seed=seed, large_board=large_board, chaos=chaos)
+    log = InputLog.for_game(game)
+    game.input_log = log
+    rng = random.Random(seed)
+    for _ in range(ticks):
+        roll = rng.random()
+        if roll < 0.01:
+            game.apply_input(engine.ACTION_PADDLE_TARGET, rng.randrange(game.scene_width))
+        elif roll < 0.05:
+            game.apply_input(rng.choice((engine.ACTION_LEFT_PRESS, engine.ACTION_LEFT_RELEASE,
+                                         engine.ACTION_RIGHT_PRESS, engine.ACTION_RIGHT_RELEASE)))
+        elif roll < 0.07:
+            game.apply_input(rng.choice((engine.ACTION_LEFT, engine.ACTION_RIGHT)))
+        if rng.random() < 0.01:
+            game.apply_input(engine.ACTION_LAUNCH)
+        if game.game_over:
+            game.apply_input(engine.ACTION_RESET)
+        game.step()
+    log.finish(game)
+    return log
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded Breakout sessions.")
+    parser.add_argument("files", nargs="*", help="recorded .brkr sessions")
+    parser.add_argument("--selfcheck", type=int, metavar="N",
+                        help="record and verify N random sessions in memory")
+    parser.add_argument("--levels", help="level pack the sessions were played on")
+    parser.add_argument("--large-board", action="store_true",
+                        help="play the self-check sessions on a large board")
+    parser.add_argument("--chaos", action="store_true",
+                        help="play the self-check sessions with ball-ball collisions")
+    args = parser.parse_args(argv)
+    pack = levels.load(args.levels) if args.levels else None
+
+    logs = [(path, InputLog.load(path)) for path in args.files]
+    if args.selfcheck:
+        logs += [(f"random-{seed}",
+                  InputLog.from_bytes(random_session(seed, level_pack=pack,
+                                                         large_board=args.large_board,
+                                                         chaos=args.chaos).to_bytes()))
+                 for seed in range(args.selfcheck)]
+    if not logs:
+        parser.error("nothing to replay")
+
+    failures = 0
+    total_ticks = 0
+    start = time.perf_counter()
+    for name, log in logs:
+        try:
+            ok, game = verify(log, pack)
+        except ReplayError as e:
+            print(f"ERROR    {name}: {e}")
+            failures += 1
+            continue
+        total_ticks += game.tick
+        if not ok:
+            failures += 1
+        print(f"{'OK' if ok else 'MISMATCH':<8} {name}: tick {game.tick} "
+              f"score {game.score} (recorded {log.final_score})")
+    elapsed = time.perf_counter() - start
+    print(f"{len(logs)} sessions, {total_ticks} ticks in {elapsed:.2f}s "
+          f"({total_ticks / elapsed:.0f} ticks/s), {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""Tick-driven scheduler for timed game effects.
+
+Events are plain (kind, value) data rather than callbacks, so the pending
+ones can be hashed and saved with the rest of the game state; the game
+dispatches each kind when it comes due. Time is the simulation tick:
+nothing comes due while the game is paused, and a headless or replayed
+game sees the same timings however fast it runs.
+"""
+import heapq
+
+# Entry fields; entries are lists so cancelling can flag them in place
+DUE = 0
+SEQ = 1
+KIND = 2
+VALUE = 3
+LIVE = 4
+
+
+# Scheduler
+class Scheduler:
+    """A heap of events ordered by due tick, then by scheduling order.
+
+    Cancelled events stay in the heap flagged dead and are skipped when
+    they surface, so cancelling is O(1).
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.seq = 0
+        # Latest event of each kind, for effects that replace themselves
+        self.latest = {}
+
+    def schedule(self, tick, kind, value=0, replace=False):
+        """Schedule kind at tick; with replace, its pending event is dropped."""
+        if replace:
+            self.cancel(self.latest.get(kind))
+        entry = [tick, self.seq, kind, value, True]
+        self.seq += 1
+        heapq.heappush(self.heap, entry)
+        self.latest[kind] = entry
+        return entry
+
+    def cancel(self, entry):
+        if entry is not None:
+            entry[LIVE] = False
+
+    def cancel_kind(self, kind):
+        for entry in self.heap:
+            if entry[KIND] == kind:
+                self.cancel(entry)
+
+    def ready(self, tick):
+        """Whether anything, possibly cancelled, is due by tick.
+
+        Cheaper than starting due() on the many ticks where nothing is.
+        """
+        return bool(self.heap) and self.heap[0][DUE] <= tick
+
+    def due(self, tick):
+        """Yield every live event due by tick, earliest first."""
+        heap = self.heap
+        while heap and heap[0][DUE] <= tick:
+            entry = heapq.heappop(heap)
+            if entry[LIVE]:
+                entry[LIVE] = False
+                yield entry
+
+    def clear(self):
+        self.heap = []
+        self.latest = {}
+
+    # === State ===
+    def pending(self):
+        """The live events as (due, seq, kind, value), in firing order."""
+        return sorted(tuple(entry[:LIVE]) for entry in self.heap if entry[LIVE])
+
+    def load(self, events, seq):
+        self.heap = [[due, event_seq, kind, value, True] for due, event_seq, kind, value in events]
+        heapq.heapify(self.heap)
+        self.latest = {}
+        for entry in sorted(self.heap):
+            self.latest[entry[KIND]] = entry
+        self.seq = seq
@@ -0,0 +1,366 @@
+"""Simulation on a worker thread.
+
+The worker owns the engine.Game: it drains player input from a queue,
+steps the game at the fixed tick rate and publishes what the renderer needs
+as a Snapshot. Snapshots are triple buffered, so the worker always has a
+buffer to write, the GUI always has one to read, and publishing or picking
+up the latest is a pointer swap under a lock. Brick changes are events
+rather than state, so they travel on their own queue and none are lost
+when the GUI skips a snapshot.
+
+    python simthread.py --selfcheck      # offscreen threaded GameView check
+"""
+import queue
+import sys
+import threading
+import time
+import traceback
+
+import numpy as np
+
+import engine
+
+CALL = object()
+
+
+# Snapshot State
+class PaddleState:
+    __slots__ = ("x", "prev_x", "y", "width", "height", "sticky")
+
+    def capture(self, paddle):
+        self.x = paddle.x
+        self.prev_x = paddle.prev_x
+        self.y = paddle.y
+        self.width = paddle.width
+        self.height = paddle.height
+        self.sticky = paddle.sticky
+
+
+class EntityState:
+    # A ball or power-up; key is the engine entity's identity, which stays
+    # the same while the entity is in play.
+    __slots__ = ("key", "x", "y", "prev_x", "prev_y", "type", "trail_points")
+
+    def capture_ball(self, ball):
+        self.key = id(ball)
+        self.x = ball.x
+        self.y = ball.y
+        self.prev_x = ball.prev_x
+        self.prev_y = ball.prev_y
+        self.trail_points = tuple(ball.trail_points)
+
+    def capture_powerup(self, powerup):
+        self.key = id(powerup)
+        self.x = powerup.x
+        self.y = powerup.y
+        self.prev_y = powerup.prev_y
+        self.type = powerup.type
+
+
+class BrickState:
+    """GUI-side copy of a brick, updated in place from brick events."""
+
+    __slots__ = ("key", "slot", "x", "y", "width", "height", "type", "health", "alive", "rgb")
+
+    def __init__(self, brick):
+        self.key = id(brick)
+        self.slot = brick.slot
+        self.x = brick.x
+        self.y = brick.y
+        self.width = brick.width
+        self.height = brick.height
+        self.type = brick.type
+        self.apply(brick_change(brick))
+
+    def apply(self, change):
+        _, self.health, self.alive, self.rgb = change
+
+    def color(self):
+        return self.rgb
+
+
+def brick_change(brick):
+    return (id(brick), brick.health, brick.alive, brick.color())
+
+
+class ParticleState:
+    def __init__(self, max_particles):
+        self.count = 0
+        self.pos = np.zeros((max_particles, 2), dtype=np.float64)
+        self.color = np.zeros(max_particles, dtype=np.int32)
+        self.opacities = np.zeros(max_particles, dtype=np.float64)
+        self.palette = ()
+
+    def __len__(self):
+        return self.count
+
+    def capture(self, particles):
+        n = self.count = particles.count
+        self.pos[:n] = particles.pos[:n]
+        self.color[:n] = particles.color[:n]
+        self.opacities[:n] = particles.opacity()
+        if len(self.palette) != len(particles.palette):
+            self.palette = tuple(particles.palette)
+
+    def opacity(self):
+        return self.opacities[:self.count]
+
+
+class Snapshot:
+    """Everything GameView reads from a Game, copied at one tick."""
+
+    def __init__(self, game):
+        self.paddle = PaddleState()
+        self.balls = []
+        self.powerups = []
+        self.particles = ParticleState(game.particles.max_particles)
+        self.spare = []
+        self.time = 0.0
+        self.capture(game, 0.0)
+
+    def entity_states(self, states, sources, capture):
+        # Reuse this buffer's state objects rather than allocating per tick
+        spare = self.spare
+        spare.extend(states)
+        states.clear()
+        for source in sources:
+            state = spare.pop() if spare else EntityState()
+            capture(state, source)
+            states.append(state)
+
+    def capture(self, game, now):
+        self.time = now
+        self.tick = game.tick
+        self.scene_width = game.scene_width
+        self.scene_height = game.scene_height
+        self.score = game.score
+        self.lives = game.lives
+        self.level = game.level
+        self.game_over = game.game_over
+        self.won = game.won
+        self.paused = game.paused
+        self.combo = game.combo
+        self.elapsed = game.elapsed_seconds()
+        self.counts = game.entity_counts()
+        self.held_left = game.held_left
+        self.held_right = game.held_right
+        self.paddle.capture(game.paddle)
+        self.entity_states(self.balls, game.balls, EntityState.capture_ball)
+        self.entity_states(self.powerups, game.powerups, EntityState.capture_powerup)
+        self.particles.capture(game.particles)
+
+    def elapsed_seconds(self):
+        return self.elapsed
+
+    def entity_counts(self):
+        return self.counts
+
+
+# Simulation Thread
+class SimulationThread(threading.Thread):
+    def __init__(self, game, tick_seconds=engine.TICK_SECONDS, max_steps=8,
+                 clock=time.perf_counter):
+        super().__init__(name="simulation", daemon=True)
+        self.game = game
+        self.tick_seconds = tick_seconds
+        self.max_steps = max_steps
+        self.clock = clock
+        self.inputs = queue.SimpleQueue()
+        self.brick_events = queue.SimpleQueue()
+        self.stopping = threading.Event()
+        # Triple buffer: the worker writes back, pending holds the latest
+        # published snapshot and front belongs to the GUI.
+        now = clock()
+        self.back = Snapshot(game)
+        self.pending = Snapshot(game)
+        self.front = Snapshot(game)
+        for snapshot in (self.back, self.pending, self.front):
+            snapshot.time = now
+        self.fresh = False
+        self.swap_lock = threading.Lock()
+        self.layout_serial = None
+        self.publish_bricks()
+
+    # === GUI Side ===
+    def send(self, action, value=None):
+        self.inputs.put((action, value))
+
+    def post(self, fn):
+        """Run fn(game) on the worker before its next tick."""
+        self.inputs.put((CALL, fn))
+
+    def call(self, fn, timeout=5.0):
+        """Run fn(game) on the worker and wait for its result."""
+        done = threading.Event()
+        result = []
+
+        def run(game):
+            try:
+                result.append(fn(game))
+            finally:
+                done.set()
+
+        self.post(run)
+        if not done.wait(timeout):
+            raise TimeoutError("simulation thread did not respond")
+        return result[0] if result else None
+
+    def latest(self):
+        with self.swap_lock:
+            if self.fresh:
+                self.front, self.pending = self.pending, self.front
+                self.fresh = False
+        return self.front
+
+    def take_brick_events(self):
+        events = []
+        while True:
+            try:
+                events.append(self.brick_events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def stop(self, timeout=1.0):
+        self.stopping.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    # === Worker Side ===
+    def run(self):
+        clock = self.clock
+        next_tick = clock() + self.tick_seconds
+        while not self.stopping.is_set():
+            delay = next_tick - clock()
+            if delay > 0:
+                self.stopping.wait(delay)
+                continue
+            try:
+                steps = 0
+                while next_tick <= clock() and steps < self.max_steps:
+                    self.process_inputs()
+                    self.game.step()
+                    next_tick += self.tick_seconds
+                    steps += 1
+                if next_tick <= clock():
+                    # Too far behind to catch up: drop the backlog
+                    next_tick = clock() + self.tick_seconds
+                self.process_inputs()
+                self.publish_bricks()
+                self.publish(clock())
+            except Exception as e:
+                print(f"Simulation thread error: {e}")
+                traceback.print_exc()
+
+    def process_inputs(self):
+        game = self.game
+        while True:
+            try:
+                action, value = self.inputs.get_nowait()
+            except queue.Empty:
+                return
+            if action is CALL:
+                value(game)
+            else:
+                game.apply_input(action, value)
+
+    def publish(self, now):
+        back = self.back
+        back.capture(self.game, now)
+        with self.swap_lock:
+            self.back, self.pending = self.pending, back
+            self.fresh = True
+
+    def publish_bricks(self):
+        game = self.game
+        if self.layout_serial != game.layout_serial:
+            self.layout_serial = game.layout_serial
+            game.take_dirty_bricks()
+            self.brick_events.put(("layout", [BrickState(brick) for brick in game.bricks]))
+            return
+        dirty = game.take_dirty_bricks()
+        if dirty:
+            self.brick_events.put(("changes", [brick_change(brick) for brick in dirty]))
+
+
+def selfcheck(seconds=2.0):
+    """Drive a threaded GameView offscreen; returns a list of failures."""
+    import os
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QGraphicsScene
+    import Breakout
+    import replay
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    view = Breakout.GameView(QGraphicsScene(), seed=11, threaded=True)
+    view.show()
+    failures = []
+
+    def pump(duration):
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            app.processEvents()
+            time.sleep(0.001)
+
+    gui_thread = threading.get_ident()
+    stepped_on = set()
+    step = view.game.step
+
+    def watched_step():
+        stepped_on.add(threading.get_ident())
+        step()
+
+    view.sim.call(lambda game: setattr(game, "step", watched_step))
+    start_tick = view.state.tick
+    start_x = view.state.paddle.x
+    view.apply_input(engine.ACTION_LEFT_PRESS)
+    pump(seconds / 2)
+    view.game_loop()
+    moved = start_x - view.state.paddle.x
+    view.sim.send(engine.ACTION_LEFT_RELEASE)
+    view.apply_input(engine.ACTION_LAUNCH)
+    pump(seconds / 2)
+    view.game_loop()
+    state = view.state
+    ticks = state.tick - start_tick
+
+    expected = seconds / engine.TICK_SECONDS
+    if not 0.5 * expected <= ticks <= 1.5 * expected:
+        failures.append(f"worker ran {ticks} ticks in {seconds}s, expected about {expected:.0f}")
+    if gui_thread in stepped_on or not stepped_on:
+        failures.append("game.step ran on the GUI thread")
+    if moved <= 0:
+        failures.append("held-key input did not reach the worker")
+
+    # The recorded session must replay to the same state headless
+    path = "selfcheck-threaded.brkr"
+    view.save_session(path)
+    log = replay.InputLog.load(path)
+    os.remove(path)
+    view.sim.stop()
+    ok, game = replay.verify(log)
+    if not ok:
+        failures.append(f"threaded session did not replay (tick {game.tick})")
+    print(f"worker ticks {ticks}, paddle moved {moved:.0f} px, "
+          f"{len(log.events)} inputs recorded, replay {'OK' if ok else 'MISMATCH'}")
+    view.deleteLater()
+    return failures
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check the threaded simulation.")
+    parser.add_argument("--selfcheck", action="store_true",
+                        help="run a threaded GameView on the offscreen platform")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args(argv)
+    if not args.selfcheck:
+        parser.error("nothing to do (use --selfcheck)")
+    failures = selfcheck(args.seconds)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
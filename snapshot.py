@@ -0,0 +1,503 @@
+"""Compact binary snapshots of a Game, and a rewind buffer built on them.
+
+A snapshot holds everything that decides how a game plays on: counters,
+paddle, balls, falling power-ups, pending timed events, brick health and
+order, and the RNG state. Particles and ball trails are cosmetic and, as
+in state_hash(), are left out; a restored game starts without them.
+
+The brick layout (positions, types, starting health) only changes when a
+level is built, so it is encoded apart from the per-tick state; the
+per-tick part copies the game's brick arrays whole instead of visiting
+every brick.
+
+    data = snapshot.save(game)
+    snapshot.restore(game, data)
+
+    game.rewind = Rewind()                    # records after every tick
+    game.rewind.rewind(game, engine.ms_to_ticks(10000))
+
+    python snapshot.py --selfcheck
+"""
+import argparse
+import math
+import operator
+import random
+import struct
+import sys
+import time
+import zlib
+from array import array
+from collections import deque
+
+import numpy as np
+
+import engine
+from levels import BRICK_TYPES, TYPE_CODES
+
+MAGIC = b"BRKS"
+# Version 2 stores the scheduler's events instead of a paddle power timer
+VERSION = 2
+FILE_HEADER = struct.Struct("<4sBI")
+STATE_HEADER = struct.Struct("<BqqiiiqBdddIIHHHq")
+PADDLE = struct.Struct("<dddddd?")
+RNG_STATE = struct.Struct("<625I?d")
+BALL = struct.Struct("<ddddddd??B")
+POWERUP = struct.Struct("<ddddB")
+EVENT = struct.Struct("<qqBq")
+BRICK = struct.Struct("<ddddBB")
+
+FLAG_GAME_OVER = 1
+FLAG_WON = 2
+FLAG_PAUSED = 4
+FLAG_HELD_LEFT = 8
+FLAG_HELD_RIGHT = 16
+
+POWERUP_CODES = {name: code for code, name in enumerate(engine.POWERUP_TYPES)}
+
+DEFAULT_BUDGET = 8 << 20
+KEYFRAME_INTERVAL = 60
+
+slot_key = operator.attrgetter("slot")
+
+
+class SnapshotError(Exception):
+    pass
+
+
+# === Encoding ===
+def encode_layout(game):
+    pack = BRICK.pack
+    return b"".join(pack(brick.x, brick.y, brick.width, brick.height,
+                         TYPE_CODES[brick.type], brick.max_health) for brick in game.layout)
+
+
+def decode_layout(data):
+    return [engine.Brick(x, y, width, height, BRICK_TYPES[code], max_health)
+            for x, y, width, height, code, max_health in BRICK.iter_unpack(data)]
+
+
+def encode_state(game):
+    paddle = game.paddle
+    flags = (FLAG_GAME_OVER * game.game_over | FLAG_WON * game.won |
+             FLAG_PAUSED * game.paused | FLAG_HELD_LEFT * game.held_left |
+             FLAG_HELD_RIGHT * game.held_right)
+    target = math.nan if game.paddle_target is None else game.paddle_target
+    _, internal, gauss = game.rng.getstate()
+    events = game.scheduler.pending()
+    parts = [
+        STATE_HEADER.pack(VERSION, game.tick, game.score, game.lives, game.level, game.combo,
+                          game.start_tick, flags, target, game.scene_width, game.scene_height,
+                          len(game.layout), len(game.brick_order), len(game.balls),
+                          len(game.powerups), len(events), game.scheduler.seq),
+        PADDLE.pack(paddle.x, paddle.prev_x, paddle.y, paddle.width, paddle.normal_width,
+                    paddle.speed, paddle.sticky),
+        RNG_STATE.pack(*internal, gauss is not None, gauss or 0.0),
+        game.brick_health,
+    ]
+    for ball in game.balls:
+        parts.append(BALL.pack(ball.x, ball.y, ball.prev_x, ball.prev_y, ball.vx, ball.vy,
+                               ball.stick_offset, ball.in_play, ball.stuck, ball.trail_timer))
+    for powerup in game.powerups:
+        parts.append(POWERUP.pack(powerup.x, powerup.y, powerup.prev_y, powerup.vy,
+                                  POWERUP_CODES[powerup.type]))
+    for event in events:
+        parts.append(EVENT.pack(*event))
+    # Last, so a brick leaving only shortens the tail
+    parts.append(game.brick_order.tobytes())
+    return b"".join(parts)
+
+
+def save(game):
+    """The full state of game, layout included, as bytes."""
+    layout = encode_layout(game)
+    return FILE_HEADER.pack(MAGIC, VERSION, len(layout)) + layout + encode_state(game)
+
+
+def restore(game, data):
+    """Put game back into the state save() captured."""
+    magic, version, layout_size = FILE_HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise SnapshotError("not a Breakout snapshot")
+    if version != VERSION:
+        raise SnapshotError(f"unsupported snapshot version {version}")
+    start = FILE_HEADER.size
+    layout = bytes(data[start:start + layout_size])
+    # Keep the game's own bricks when the snapshot is of the same layout
+    if layout == encode_layout(game):
+        layout = None
+    apply_state(game, data[start + layout_size:], layout)
+
+
+# === Restoring ===
+def apply_state(game, state, layout=None):
+    """Restore an encode_state() block.
+
+    With layout=None the state must belong to the game's current layout and
+    only the bricks that differ are touched; otherwise the bricks are rebuilt
+    from the encoded layout.
+    """
+    try:
+        (version, tick, score, lives, level, combo, start_tick, flags, target, width,
+         height, slots, brick_count, ball_count, powerup_count, event_count,
+         event_seq) = STATE_HEADER.unpack_from(state)
+    except struct.error:
+        raise SnapshotError("truncated snapshot") from None
+    if version != VERSION:
+        raise SnapshotError(f"unsupported snapshot version {version}")
+    size = (STATE_HEADER.size + PADDLE.size + RNG_STATE.size + slots +
+            ball_count * BALL.size + powerup_count * POWERUP.size + event_count * EVENT.size +
+            4 * brick_count)
+    if len(state) != size:
+        raise SnapshotError("truncated snapshot")
+    pos = STATE_HEADER.size
+    paddle_fields = PADDLE.unpack_from(state, pos)
+    pos += PADDLE.size
+    rng_fields = RNG_STATE.unpack_from(state, pos)
+    pos += RNG_STATE.size
+    health = bytearray(state[pos:pos + slots])
+    pos += slots
+    balls = [BALL.unpack_from(state, pos + i * BALL.size) for i in range(ball_count)]
+    pos += ball_count * BALL.size
+    powerups = [POWERUP.unpack_from(state, pos + i * POWERUP.size) for i in range(powerup_count)]
+    pos += powerup_count * POWERUP.size
+    events = [EVENT.unpack_from(state, pos + i * EVENT.size) for i in range(event_count)]
+    pos += event_count * EVENT.size
+    order = array("I")
+    order.frombytes(state[pos:])
+
+    if layout is not None:
+        rebuild_bricks(game, decode_layout(layout), health, order)
+    elif len(game.layout) != slots:
+        raise SnapshotError("snapshot is of a different brick layout")
+    else:
+        update_bricks(game, health, order)
+    game.brick_health = health
+    game.brick_order = order
+    game.live_bricks = brick_count
+    game.destroyed = []
+
+    if (width, height) != (game.scene_width, game.scene_height):
+        game.resize_board(width, height)
+    game.tick = tick
+    game.score = score
+    game.lives = lives
+    game.level = level
+    game.combo = combo
+    game.start_tick = start_tick
+    game.game_over = bool(flags & FLAG_GAME_OVER)
+    game.won = bool(flags & FLAG_WON)
+    game.paused = bool(flags & FLAG_PAUSED)
+    game.held_left = bool(flags & FLAG_HELD_LEFT)
+    game.held_right = bool(flags & FLAG_HELD_RIGHT)
+    game.paddle_target = None if math.isnan(target) else target
+
+    paddle = game.paddle
+    (paddle.x, paddle.prev_x, paddle.y, paddle.width, paddle.normal_width, paddle.speed,
+     paddle.sticky) = paddle_fields
+    game.scheduler.load(events, event_seq)
+
+    game.clear_entities()
+    for fields in balls:
+        ball = game.ball_pool.acquire()
+        (ball.x, ball.y, ball.prev_x, ball.prev_y, ball.vx, ball.vy, ball.stick_offset,
+         ball.in_play, ball.stuck, ball.trail_timer) = fields
+        game.balls.append(ball)
+    for x, y, prev_y, vy, code in powerups:
+        powerup = game.powerup_pool.acquire()
+        powerup.spawn(x, y, engine.POWERUP_TYPES[code])
+        powerup.prev_y = prev_y
+        powerup.vy = vy
+        game.powerups.append(powerup)
+
+    # Last: acquiring balls above draws from the generator
+    gauss = rng_fields[626] if rng_fields[625] else None
+    game.rng.setstate((3, rng_fields[:625], gauss))
+
+
+def rebuild_bricks(game, layout, health, order):
+    for slot, brick in enumerate(layout):
+        brick.slot = slot
+        brick.health = health[slot]
+        brick.alive = False
+        brick.index = -1
+    game.bricks = [layout[slot] for slot in order]
+    for index, brick in enumerate(game.bricks):
+        brick.index = index
+        brick.alive = True
+    # Inserting in slot order gives every grid cell the order it had in play
+    game.grid.clear()
+    for brick in layout:
+        if brick.alive:
+            game.grid.insert(brick)
+    game.layout = layout
+    game.dirty_bricks = set()
+    game.layout_serial += 1
+
+
+def update_bricks(game, health, order):
+    # Touch only the bricks whose health or presence differs, and hand them
+    # to the renderers as dirty
+    layout = game.layout
+    old_alive = np.zeros(len(layout), dtype=bool)
+    old_alive[np.frombuffer(game.brick_order, dtype=np.uint32)] = True
+    new_alive = np.zeros(len(layout), dtype=bool)
+    new_alive[np.frombuffer(order, dtype=np.uint32)] = True
+    new_health = np.frombuffer(health, dtype=np.uint8)
+    changed = (np.frombuffer(game.brick_health, dtype=np.uint8) != new_health) | \
+        (old_alive != new_alive)
+    for slot in np.flatnonzero(changed).tolist():
+        brick = layout[slot]
+        brick.health = health[slot]
+        alive = bool(new_alive[slot])
+        if alive != brick.alive:
+            brick.alive = alive
+            if alive:
+                game.grid.insert_ordered(brick, slot_key)
+            else:
+                game.grid.remove(brick)
+                brick.index = -1
+        game.dirty_bricks.add(brick)
+    game.bricks = [layout[slot] for slot in order]
+    for index, brick in enumerate(game.bricks):
+        brick.index = index
+
+
+def xor_bytes(data, base):
+    # XOR data with the overlapping start of base; applying it twice with
+    # the same base gives data back
+    out = np.frombuffer(data, dtype=np.uint8).copy()
+    n = min(len(data), len(base))
+    out[:n] ^= np.frombuffer(base, dtype=np.uint8, count=n)
+    return out.tobytes()
+
+
+# Rewind Buffer
+class RewindGroup:
+    __slots__ = ("layout", "keyframe", "frames", "size")
+
+    def __init__(self, layout, keyframe):
+        self.layout = layout
+        self.keyframe = keyframe
+        self.frames = []
+        self.size = 0
+
+
+class Rewind:
+    """The last ticks of a game, delta encoded within a memory budget.
+
+    Every keyframe_interval ticks a state is stored whole; each tick in
+    between stores its XOR against that keyframe, which is mostly zeros and
+    compresses to a few dozen bytes. Restoring any tick is one decompress
+    and one XOR. Past the budget the oldest keyframe goes, together with
+    the ticks that depend on it.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, keyframe_interval=KEYFRAME_INTERVAL):
+        self.budget = budget
+        self.keyframe_interval = keyframe_interval
+        self.groups = deque()
+        # Compressed layouts by id, stored once for all the ticks using them
+        self.layouts = {}
+        self.layout_id = None
+        self.layout_serial = None
+        self.next_layout_id = 0
+        self.key_state = None
+        self.size = 0
+
+    def record(self, game):
+        if game.layout_serial != self.layout_serial:
+            self.layout_serial = game.layout_serial
+            self.add_layout(zlib.compress(encode_layout(game), 1))
+        state = encode_state(game)
+        groups = self.groups
+        group = groups[-1] if groups else None
+        if group is None or self.key_state is None or group.layout != self.layout_id or \
+                len(group.frames) >= self.keyframe_interval:
+            group = RewindGroup(self.layout_id, zlib.compress(state, 1))
+            group.size = len(group.keyframe)
+            groups.append(group)
+            self.key_state = state
+            self.size += group.size
+            blob = None
+        else:
+            blob = zlib.compress(xor_bytes(state, self.key_state), 1)
+            group.size += len(blob)
+            self.size += len(blob)
+        group.frames.append((game.tick, blob))
+        while self.size > self.budget and len(groups) > 1:
+            self.drop(groups.popleft())
+
+    def add_layout(self, layout):
+        current = self.layouts.get(self.layout_id)
+        if current == layout:
+            return
+        self.layout_id = self.next_layout_id
+        self.next_layout_id += 1
+        self.layouts[self.layout_id] = layout
+        self.size += len(layout)
+        self.prune_layouts()
+
+    def drop(self, group):
+        self.size -= group.size
+        self.prune_layouts()
+
+    def prune_layouts(self):
+        # Keep the current layout and those some stored tick refers to
+        used = {group.layout for group in self.groups}
+        used.add(self.layout_id)
+        for layout_id in [key for key in self.layouts if key not in used]:
+            self.size -= len(self.layouts.pop(layout_id))
+
+    def clear(self):
+        self.groups.clear()
+        self.layouts.clear()
+        self.layout_id = self.layout_serial = self.key_state = None
+        self.size = 0
+
+    def oldest_tick(self):
+        return self.groups[0].frames[0][0] if self.groups else None
+
+    def stats(self):
+        frames = sum(len(group.frames) for group in self.groups)
+        return {"frames": frames, "seconds": frames * engine.TICK_SECONDS,
+                "keyframes": len(self.groups), "layouts": len(self.layouts),
+                "bytes": self.size, "budget": self.budget}
+
+    def rewind(self, game, ticks):
+        """Restore the state of ticks ago (or the oldest kept); returns its tick.
+
+        Later ticks are dropped, and so are the inputs recorded after it,
+        so a recorded session still replays to the rewound game.
+        """
+        if not self.groups:
+            return None
+        target = max(game.tick - ticks, self.oldest_tick())
+        groups = self.groups
+        while len(groups) > 1 and groups[-1].frames[0][0] > target:
+            self.drop(groups.pop())
+        group = groups[-1]
+        index = max(i for i, (tick, _) in enumerate(group.frames) if tick <= target)
+        tick, blob = group.frames[index]
+        state = zlib.decompress(group.keyframe)
+        if blob is not None:
+            state = xor_bytes(zlib.decompress(blob), state)
+        same_layout = group.layout == self.layout_id and game.layout_serial == self.layout_serial
+        apply_state(game, state, None if same_layout else zlib.decompress(self.layouts[group.layout]))
+
+        # The frame just restored is recorded again by the next tick, into
+        # a fresh group
+        for _, dropped in group.frames[index:]:
+            size = len(group.keyframe) if dropped is None else len(dropped)
+            group.size -= size
+            self.size -= size
+        del group.frames[index:]
+        self.key_state = None
+        self.layout_id = group.layout
+        self.layout_serial = game.layout_serial
+        if not group.frames:
+            self.drop(groups.pop())
+        self.prune_layouts()
+        if game.input_log is not None:
+            game.input_log.truncate(tick)
+        return tick
+
+
+# === Self-check ===
+def drive(game, ticks, seed):
+    """Step with inputs that depend only on seed and tick, so the same ticks
+    played twice get the same inputs."""
+    for _ in range(ticks):
+        rng = random.Random(seed * 1000003 + game.tick)
+        if game.game_over:
+            game.apply_input(engine.ACTION_RESET)
+        balls = [ball for ball in game.balls if ball.in_play]
+        if balls and rng.random() < 0.9:
+            lowest = max(balls, key=operator.attrgetter("y"))
+            game.apply_input(engine.ACTION_PADDLE_TARGET,
+                             int(lowest.x + rng.uniform(-40, 40)) % game.scene_width)
+        if rng.random() < 0.02:
+            game.apply_input(engine.ACTION_LAUNCH)
+        game.step()
+
+
+def selfcheck(seed=1, long_ticks=30000):
+    """Check save/restore and rewind against state hashes; returns failures."""
+    failures = []
+
+    # Save, play on, restore, play the same ticks again
+    game = engine.Game(seed=seed)
+    drive(game, 1500, seed)
+    # Saved with power-up timers pending, due within the ticks played on
+    game.apply_powerup("expand")
+    game.apply_powerup("sticky")
+    start = time.perf_counter()
+    data = save(game)
+    save_ms = (time.perf_counter() - start) * 1000
+    saved_hash = game.state_hash()
+    drive(game, 1000, seed)
+    expected = game.state_hash()
+    start = time.perf_counter()
+    restore(game, data)
+    restore_ms = (time.perf_counter() - start) * 1000
+    if game.state_hash() != saved_hash:
+        failures.append("restore did not reproduce the saved state")
+    drive(game, 1000, seed)
+    if game.state_hash() != expected:
+        failures.append("restored game diverged on the same inputs")
+    other = engine.Game(seed=seed + 1)
+    restore(other, data)
+    drive(other, 1000, seed)
+    if other.state_hash() != expected:
+        failures.append("snapshot restored into another game diverged")
+    print(f"snapshot {len(data)} bytes, save {save_ms:.2f} ms, restore {restore_ms:.2f} ms")
+
+    # A long session with a rewind buffer: bounded size, exact rewinds
+    game = engine.Game(seed=seed)
+    game.rewind = rewind = Rewind(budget=1 << 20)
+    hashes = {}
+    peak = 0
+    start = time.perf_counter()
+    while game.tick < long_ticks:
+        drive(game, 100, seed)
+        hashes[game.tick] = game.state_hash()
+        peak = max(peak, rewind.size)
+    per_tick_us = (time.perf_counter() - start) / game.tick * 1e6
+    if peak > rewind.budget:
+        failures.append(f"rewind buffer grew to {peak} bytes, budget {rewind.budget}")
+    stats = rewind.stats()
+    ten_seconds = engine.ms_to_ticks(10000)
+    if stats["frames"] < ten_seconds:
+        failures.append(f"rewind buffer keeps only {stats['seconds']:.1f}s")
+    end_tick = game.tick
+    target = end_tick - ten_seconds
+    target -= target % 100
+    start = time.perf_counter()
+    tick = rewind.rewind(game, end_tick - target)
+    rewind_ms = (time.perf_counter() - start) * 1000
+    if tick != target or game.state_hash() != hashes[target]:
+        failures.append(f"rewind to tick {target} did not reproduce its state")
+    drive(game, end_tick - target, seed)
+    if game.state_hash() != hashes[end_tick]:
+        failures.append("rewound game diverged on the same inputs")
+    print(f"{end_tick} ticks recorded at {per_tick_us:.0f} us/tick: {stats['frames']} ticks "
+          f"({stats['seconds']:.0f}s) in {stats['bytes']} bytes, peak {peak}; "
+          f"rewind 10s took {rewind_ms:.2f} ms")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check game snapshots and rewind.")
+    parser.add_argument("--selfcheck", action="store_true",
+                        help="verify save/restore and rewind against state hashes")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    if not args.selfcheck:
+        parser.error("nothing to do (use --selfcheck)")
+    failures = selfcheck(args.seed)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
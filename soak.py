@@ -0,0 +1,291 @@
+"""Unattended soak test with leak and drift detection.
+
+An autoplayer predicts where each ball will reach the paddle and steers
+there through the normal input path, launching balls and restarting after
+a game over, so the game runs across levels and restarts at full speed.
+Every few thousand ticks the process RSS, the scene's item count, the
+entity counts and the mean tick time are sampled; any of them that keeps
+growing from one part of the run to the next is reported as a leak or
+drift, and the run exits with status 1.
+
+    python soak.py --minutes 10              # engine only
+    python soak.py --view --ticks 200000     # offscreen GameView as well
+    python soak.py --hours 12 --output soak.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import engine
+
+DEFAULT_TICKS = 100000
+SAMPLE_TICKS = 2000
+# The first part of a run fills pools, caches and buffers; growth is only
+# judged after it. The view's rewind buffer takes minutes of play to reach
+# its budget, so RSS is only judged once it has.
+WARMUP_FRACTION = 0.1
+REWIND_FULL = 0.9
+GROWTH_WINDOWS = 4
+# A metric grows when its window means rise every time and the last is
+# this much above the first
+GROWTH_TOLERANCE = 0.1
+
+# Paddle offsets the autoplayer aims with, as a fraction of half its width
+MIN_AIM = 0.15
+MAX_AIM = 0.8
+
+METRICS = ("rss_kb", "scene_items", "balls", "powerups", "particles", "tick_ms")
+
+
+# Landing Prediction
+def predict_landing(ball, paddle_y, width):
+    """Where a ball's center will be when it comes down to paddle_y.
+
+    Returns ``(x, ticks)``, or None for a ball that is not in flight or is
+    already below the paddle. The ball is followed in a straight line,
+    mirrored off the side walls and the ceiling; bricks are ignored, so the
+    prediction is exact once the ball is clear of them.
+    """
+    if not ball.in_play or ball.vy == 0:
+        return None
+    r = ball.radius
+    cx, cy = ball.center()
+    target = paddle_y - r
+    if ball.vy > 0:
+        distance = target - cy
+    else:
+        # Up to the ceiling, then all the way down
+        distance = (cy - r) + (target - r)
+    if distance < 0:
+        return None
+    ticks = distance / abs(ball.vy)
+    # Fold the unbounded x back between the side walls
+    span = width - 2 * r
+    x = (cx + ball.vx * ticks - r) % (2 * span)
+    if x > span:
+        x = 2 * span - x
+    return x + r, ticks
+
+
+# Autoplayer
+class AutoPlayer:
+    """Plays a Game through apply_input(), so its sessions replay like a player's.
+
+    The paddle goes to where the next ball will land, shifted so the ball
+    leaves at an angle towards the lowest brick. A dead-center hit would
+    send it straight up and down forever.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.target = None
+        self.restarts = 0
+
+    def play(self):
+        game = self.game
+        if game.game_over:
+            game.apply_input(engine.ACTION_RESET)
+            self.restarts += 1
+            return
+        paddle = game.paddle
+        best = None
+        stuck = False
+        for ball in game.balls:
+            stuck = stuck or ball.stuck
+            landing = predict_landing(ball, paddle.y, game.scene_width)
+            if landing is not None and (best is None or landing[1] < best[1]):
+                best = landing
+        if stuck:
+            game.apply_input(engine.ACTION_LAUNCH)
+        if best is None:
+            target = game.scene_width // 2
+        else:
+            target = round(best[0] - self.aim(best[0]) * paddle.width / 2)
+        if target != self.target:
+            game.apply_input(engine.ACTION_PADDLE_TARGET, target)
+            self.target = target
+
+    def aim(self, landing_x):
+        """Where on the paddle to take the ball, from -1 (left end) to 1."""
+        game = self.game
+        goal = max(game.bricks, key=lambda brick: brick.y, default=None)
+        if goal is None:
+            return MIN_AIM
+        # Bounce off the paddle sets vx to 5 * offset; climbing at the
+        # serve speed, the ball reaches the brick's row after rise ticks
+        rise = max(1.0, (game.paddle.y - goal.y - goal.height) / 4)
+        offset = (goal.x + goal.width / 2 - landing_x) / rise / 5
+        offset = max(-MAX_AIM, min(MAX_AIM, offset))
+        if abs(offset) < MIN_AIM:
+            offset = MIN_AIM if offset >= 0 else -MIN_AIM
+        return offset
+
+
+# Sampling
+def rss_kb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        # No /proc: fall back to the peak, which still shows steady growth
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def window_means(values, windows=GROWTH_WINDOWS):
+    size = len(values) // windows
+    return [sum(values[i * size:(i + 1) * size]) / size for i in range(windows)]
+
+
+def monotonic_growth(values, windows=GROWTH_WINDOWS, tolerance=GROWTH_TOLERANCE):
+    """Window means if they rise every window by tolerance overall, else None."""
+    if len(values) < windows:
+        return None
+    means = window_means(values, windows)
+    if all(b > a for a, b in zip(means, means[1:])) and \
+            means[-1] - means[0] > tolerance * max(abs(means[0]), 1):
+        return means
+    return None
+
+
+class SceneHarness:
+    """A single-threaded GameView on the offscreen platform, painted every frame."""
+
+    def __init__(self, game):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt6.QtGui import QImage, QPainter
+        from PyQt6.QtWidgets import QApplication, QGraphicsScene
+        import Breakout
+
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+        self.scene = QGraphicsScene()
+        self.view = Breakout.GameView(self.scene, game=game)
+        self.view.timer.stop()
+        # The view records the session for saving; the autoplayer's inputs
+        # would only grow that log for as long as the run lasts
+        game.input_log = None
+        self.image = QImage(self.view.size(), QImage.Format.Format_ARGB32_Premultiplied)
+        self.painter_class = QPainter
+
+    def frame(self):
+        self.view.sync_scene()
+        painter = self.painter_class(self.image)
+        self.view.render(painter)
+        painter.end()
+        self.app.processEvents()
+
+    def item_count(self):
+        return len(self.scene.items())
+
+
+# Soak
+def soak(ticks=DEFAULT_TICKS, seconds=None, seed=0, view=False, levels=None,
+         sample_ticks=SAMPLE_TICKS, progress=None):
+    """Play until ticks or seconds run out and return the samples and findings."""
+    game = engine.Game(levels=levels, seed=seed)
+    harness = SceneHarness(game) if view else None
+    player = AutoPlayer(game)
+    clock = time.perf_counter
+    start = clock()
+    samples = []
+    step_time = 0.0
+    tick = 0
+    while True:
+        player.play()
+        t = clock()
+        game.step()
+        if harness is not None:
+            harness.frame()
+        step_time += clock() - t
+        tick += 1
+        if tick % sample_ticks == 0:
+            rewind = game.rewind
+            samples.append({
+                "tick": tick,
+                "rss_kb": rss_kb(),
+                "scene_items": harness.item_count() if harness is not None else 0,
+                "balls": len(game.balls),
+                "powerups": len(game.powerups),
+                "particles": len(game.particles),
+                "rewind_full": rewind is None or rewind.size >= REWIND_FULL * rewind.budget,
+                "tick_ms": step_time / sample_ticks * 1000,
+                "level": game.level,
+                "restarts": player.restarts,
+            })
+            step_time = 0.0
+            if progress is not None:
+                progress(samples[-1])
+            if seconds is not None and clock() - start >= seconds:
+                break
+        if seconds is None and tick >= ticks:
+            break
+
+    judged = samples[int(len(samples) * WARMUP_FRACTION):]
+    settled = [sample for sample in judged if sample["rewind_full"]]
+    growth = {}
+    for metric in METRICS:
+        series = settled if metric == "rss_kb" else judged
+        means = monotonic_growth([sample[metric] for sample in series])
+        if means is not None:
+            growth[metric] = means
+    return {
+        "ticks": tick,
+        "seconds": clock() - start,
+        "seed": seed,
+        "view": view,
+        "restarts": player.restarts,
+        "max_level": max((sample["level"] for sample in samples), default=game.level),
+        "samples": samples,
+        "rss_judged": len(settled) >= GROWTH_WINDOWS,
+        "growth": growth,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Soak-test Breakout with an autoplayer.")
+    length = parser.add_mutually_exclusive_group()
+    length.add_argument("--ticks", type=int, default=DEFAULT_TICKS)
+    length.add_argument("--minutes", type=float)
+    length.add_argument("--hours", type=float)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--levels", help="level pack to play")
+    parser.add_argument("--view", action="store_true",
+                        help="drive an offscreen GameView too and count its scene items")
+    parser.add_argument("--sample-ticks", type=int, default=SAMPLE_TICKS,
+                        help=f"ticks between samples (default {SAMPLE_TICKS})")
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--quiet", action="store_true", help="no progress lines")
+    args = parser.parse_args(argv)
+
+    seconds = args.hours * 3600 if args.hours else args.minutes * 60 if args.minutes else None
+    pack = None
+    if args.levels:
+        import levels
+        pack = levels.load(args.levels)
+
+    def progress(sample):
+        print(f"tick {sample['tick']:>9}  level {sample['level']:>3}  "
+              f"restarts {sample['restarts']:>4}  rss {sample['rss_kb']:>7} KB  "
+              f"items {sample['scene_items']:>5}  particles {sample['particles']:>5}  "
+              f"{sample['tick_ms']:.3f} ms/tick", file=sys.stderr)
+
+    report = soak(args.ticks, seconds, args.seed, args.view, pack, args.sample_ticks,
+                  None if args.quiet else progress)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(f"{report['ticks']} ticks in {report['seconds']:.1f}s, "
+          f"{report['restarts']} restarts, reached level {report['max_level']}")
+    if not report["rss_judged"]:
+        print("RSS not judged: the rewind buffer was still filling", file=sys.stderr)
+    for metric, means in report["growth"].items():
+        trend = " -> ".join(f"{mean:.4g}" for mean in means)
+        print(f"GROWTH {metric}: {trend}", file=sys.stderr)
+    return 1 if report["growth"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""Spatial indexes used by the simulation."""
+import math
+
+import numpy as np
+
+
+# Uniform Grid
+class UniformGrid:
+    """Buckets rectangles into fixed-size cells.
+
+    Items are anything with ``x``, ``y``, ``width`` and ``height``. An item is
+    stored in every cell its rectangle overlaps, so queries only have to look
+    at the cells a search box touches.
+    """
+
+    def __init__(self, cell_width, cell_height, origin_x=0, origin_y=0):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.origin_x = origin_x
+        self.origin_y = origin_y
+        self.cells = {}
+        self.count = 0
+        # Lowest edge of anything inserted since the last clear, so callers
+        # can skip queries that are entirely below every item
+        self.bottom = -math.inf
+
+    def cell_range(self, x0, y0, x1, y1):
+        cw = self.cell_width
+        ch = self.cell_height
+        return (int((x0 - self.origin_x) // cw), int((y0 - self.origin_y) // ch),
+                int((x1 - self.origin_x) // cw), int((y1 - self.origin_y) // ch))
+
+    def item_cells(self, item):
+        # Edges are exclusive, so an item ending exactly on a cell border
+        # does not spill into the next cell.
+        c0, r0, c1, r1 = self.cell_range(item.x, item.y,
+                                         item.x + item.width - 1e-9,
+                                         item.y + item.height - 1e-9)
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                yield col, row
+
+    def insert(self, item):
+        cells = self.cells
+        for key in self.item_cells(item):
+            bucket = cells.get(key)
+            if bucket is None:
+                cells[key] = [item]
+            else:
+                bucket.append(item)
+        self.count += 1
+        self.bottom = max(self.bottom, item.y + item.height)
+
+    def insert_ordered(self, item, key):
+        """Insert item so every cell it touches stays sorted by key(item)."""
+        self.insert(item)
+        cells = self.cells
+        for cell in self.item_cells(item):
+            bucket = cells[cell]
+            if len(bucket) > 1:
+                bucket.sort(key=key)
+
+    def remove(self, item):
+        cells = self.cells
+        for key in self.item_cells(item):
+            bucket = cells.get(key)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(item)
+            except ValueError:
+                continue
+            if not bucket:
+                del cells[key]
+        self.count -= 1
+
+    def clear(self):
+        self.cells = {}
+        self.count = 0
+        self.bottom = -math.inf
+
+    def query(self, x0, y0, x1, y1):
+        """Yield items in the cells touched by the box (x0, y0)-(x1, y1).
+
+        Items spanning several cells may be yielded more than once; callers
+        doing an exact overlap test afterwards can ignore that.
+        """
+        cells = self.cells
+        c0, r0, c1, r1 = self.cell_range(x0, y0, x1, y1)
+        for row in range(r0, r1 + 1):
+            for col in range(c0, c1 + 1):
+                bucket = cells.get((col, row))
+                if bucket:
+                    yield from bucket
+
+
+# Sort and Sweep
+def sweep_pairs(xs, ys, size):
+    """Pairs of equal circles of diameter size that overlap.
+
+    xs and ys are NumPy arrays of the circles' top-left corners. The circles
+    are sorted along x and each is only tested against the ones after it
+    that start less than a diameter further right. The sweep runs one
+    vectorised pass per offset in the sorted order and stops at the first
+    offset with no candidate left, since sorting means larger offsets are
+    further away.
+
+    Returns ``(tested, first, second)``: the number of candidate pairs the
+    sweep tested, and index arrays into xs of the overlapping pairs.
+    """
+    n = len(xs)
+    order = np.argsort(xs, kind="stable")
+    sx = xs[order]
+    sy = ys[order]
+    limit = size * size
+    tested = 0
+    firsts = []
+    seconds = []
+    for k in range(1, n):
+        dx = sx[k:] - sx[:-k]
+        near = dx < size
+        count = int(np.count_nonzero(near))
+        if not count:
+            break
+        tested += count
+        dy = sy[k:] - sy[:-k]
+        hit = np.flatnonzero(near & (dx * dx + dy * dy < limit))
+        if len(hit):
+            firsts.append(order[hit])
+            seconds.append(order[hit + k])
+    if not firsts:
+        empty = np.zeros(0, dtype=np.intp)
+        return tested, empty, empty
+    return tested, np.concatenate(firsts), np.concatenate(seconds)
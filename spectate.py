@@ -0,0 +1,636 @@
+"""Live spectator streaming over localhost.
+
+A SpectatorServer runs an asyncio event loop on its own thread inside the
+game process. Game.step() hands it every tick; it encodes one frame per
+tick on the game thread and the loop fans the same bytes out to every
+connected client. Frames are delta encoded: each carries only the
+sections that changed since the previous tick (status, paddle, balls,
+power-ups and the bricks whose health changed), and a keyframe with the
+whole brick layout is sent when a client joins and whenever the layout is
+rebuilt.
+
+Writes never wait for a client. Each client's transport buffers what it
+has not read yet; a client whose buffer passes max_buffer stops getting
+frames until it drains, then resyncs from a fresh keyframe. A slow or
+stalled spectator costs the game loop nothing.
+
+    python Breakout.py --spectate 8765
+    python spectate.py watch --port 8765           # headless reference client
+    python spectate.py bench --clients 100 --ticks 1200
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+import engine
+from levels import BRICK_TYPES, TYPE_CODES
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Unsent bytes a client may have queued before it is skipped and resynced;
+# the backlog has to halve before the keyframe is sent.
+MAX_CLIENT_BUFFER = 256 * 1024
+# Frames handed to the event loop but not yet fanned out. Past this the
+# game thread skips ticks: the next delta covers them, so clients see a
+# lower frame rate instead of the loop's queue growing.
+MAX_PENDING_FRAMES = 16
+
+STREAM_MAGIC = b"BRKV"
+STREAM_VERSION = 1
+HELLO = struct.Struct("<4sB")
+# Frame header: body length, tick, section mask
+FRAME = struct.Struct("<IqB")
+
+# Sections, in the order they appear in a frame body
+SECTION_LAYOUT = 1
+SECTION_STATUS = 2
+SECTION_PADDLE = 4
+SECTION_BALLS = 8
+SECTION_POWERUPS = 16
+SECTION_BRICKS = 32
+KEYFRAME = SECTION_LAYOUT | SECTION_STATUS | SECTION_PADDLE | SECTION_BALLS | SECTION_POWERUPS
+
+LAYOUT = struct.Struct("<III")           # scene width, height, brick count
+BRICK = struct.Struct("<ffffBBB")        # x, y, width, height, type, max health, health
+STATUS = struct.Struct("<qHHB")          # score, lives, level, flags
+PADDLE = struct.Struct("<fff")           # x, y, width
+COUNT = struct.Struct("<H")
+BALL = struct.Struct("<ff")
+POWERUP = struct.Struct("<ffB")          # x, y, type
+BRICK_COUNT = struct.Struct("<I")
+BRICK_CHANGE = struct.Struct("<IB")      # slot, health (0 once destroyed)
+
+FLAG_GAME_OVER = 1
+FLAG_WON = 2
+
+POWERUP_TYPE_IDS = {name: i for i, name in enumerate(engine.POWERUP_TYPES)}
+
+
+class SpectateError(Exception):
+    pass
+
+
+# Encoding
+def visible_health(game):
+    """Health per layout slot, with destroyed bricks at 0."""
+    health = np.frombuffer(game.brick_health, dtype=np.uint8).copy()
+    gone = np.ones(len(health), dtype=bool)
+    gone[np.frombuffer(game.brick_order, dtype=np.uint32)] = False
+    health[gone] = 0
+    return health
+
+
+def encode_layout(game, health):
+    parts = [LAYOUT.pack(game.scene_width, game.scene_height, len(game.layout))]
+    for brick, hp in zip(game.layout, health.tolist()):
+        parts.append(BRICK.pack(brick.x, brick.y, brick.width, brick.height,
+                                TYPE_CODES[brick.type], brick.max_health, hp))
+    return b"".join(parts)
+
+
+class FrameEncoder:
+    """Turns successive game states into delta frames.
+
+    Each section is packed every tick and compared with what the previous
+    frame sent; only the ones that differ go out.
+    """
+
+    def __init__(self):
+        self.serial = None
+        self.health = None
+        self.sections = {}
+
+    def pack_sections(self, game):
+        flags = (FLAG_GAME_OVER if game.game_over else 0) | (FLAG_WON if game.won else 0)
+        paddle = game.paddle
+        balls = game.balls
+        powerups = game.powerups
+        return {
+            SECTION_STATUS: STATUS.pack(game.score, game.lives, game.level, flags),
+            SECTION_PADDLE: PADDLE.pack(paddle.x, paddle.y, paddle.width),
+            SECTION_BALLS: COUNT.pack(len(balls)) + b"".join(
+                [BALL.pack(ball.x, ball.y) for ball in balls]),
+            SECTION_POWERUPS: COUNT.pack(len(powerups)) + b"".join(
+                [POWERUP.pack(p.x, p.y, POWERUP_TYPE_IDS[p.type]) for p in powerups]),
+        }
+
+    def delta(self, game):
+        """The frame taking the previous one's state to game's."""
+        sections = self.pack_sections(game)
+        health = visible_health(game)
+        mask = 0
+        parts = []
+        if game.layout_serial != self.serial:
+            # A new layout replaces every brick; send it whole
+            mask |= SECTION_LAYOUT
+            parts.append(encode_layout(game, health))
+            self.serial = game.layout_serial
+            changed = None
+        else:
+            changed = np.flatnonzero(health != self.health)
+        for section in (SECTION_STATUS, SECTION_PADDLE, SECTION_BALLS, SECTION_POWERUPS):
+            packed = sections[section]
+            if packed != self.sections.get(section):
+                mask |= section
+                parts.append(packed)
+        if changed is not None and len(changed):
+            mask |= SECTION_BRICKS
+            parts.append(BRICK_COUNT.pack(len(changed)))
+            parts.extend(BRICK_CHANGE.pack(slot, hp)
+                         for slot, hp in zip(changed.tolist(), health[changed].tolist()))
+        self.sections = sections
+        self.health = health
+        return frame(game.tick, mask, parts)
+
+    def keyframe(self, game):
+        """A frame carrying the whole of the state the last delta left."""
+        parts = [encode_layout(game, self.health)]
+        parts.extend(self.sections[section] for section in
+                     (SECTION_STATUS, SECTION_PADDLE, SECTION_BALLS, SECTION_POWERUPS))
+        return frame(game.tick, KEYFRAME, parts)
+
+
+def frame(tick, mask, parts):
+    body = b"".join(parts)
+    return FRAME.pack(len(body), tick, mask) + body
+
+
+# Decoding
+class SpectatorState:
+    """A client's mirror of the game, kept up to date by apply()."""
+
+    def __init__(self):
+        self.tick = -1
+        self.scene_width = 0
+        self.scene_height = 0
+        self.bricks = []
+        self.health = bytearray()
+        self.score = 0
+        self.lives = 0
+        self.level = 0
+        self.flags = 0
+        self.paddle = (0.0, 0.0, 0.0)
+        self.balls = []
+        self.powerups = []
+        self.frames = 0
+        self.keyframes = 0
+
+    def apply(self, tick, mask, body):
+        if not mask & SECTION_LAYOUT and self.tick < 0:
+            raise SpectateError("stream did not start with a keyframe")
+        offset = 0
+        if mask & SECTION_LAYOUT:
+            self.scene_width, self.scene_height, count = LAYOUT.unpack_from(body, offset)
+            offset += LAYOUT.size
+            self.bricks = []
+            self.health = bytearray(count)
+            for slot, (x, y, w, h, kind, max_health, hp) in enumerate(
+                    BRICK.iter_unpack(body[offset:offset + count * BRICK.size])):
+                self.bricks.append((x, y, w, h, BRICK_TYPES[kind], max_health))
+                self.health[slot] = hp
+            offset += count * BRICK.size
+            if mask & KEYFRAME == KEYFRAME:
+                self.keyframes += 1
+        if mask & SECTION_STATUS:
+            self.score, self.lives, self.level, self.flags = STATUS.unpack_from(body, offset)
+            offset += STATUS.size
+        if mask & SECTION_PADDLE:
+            self.paddle = PADDLE.unpack_from(body, offset)
+            offset += PADDLE.size
+        if mask & SECTION_BALLS:
+            (count,) = COUNT.unpack_from(body, offset)
+            offset += COUNT.size
+            end = offset + count * BALL.size
+            self.balls = list(BALL.iter_unpack(body[offset:end]))
+            offset = end
+        if mask & SECTION_POWERUPS:
+            (count,) = COUNT.unpack_from(body, offset)
+            offset += COUNT.size
+            end = offset + count * POWERUP.size
+            self.powerups = list(POWERUP.iter_unpack(body[offset:end]))
+            offset = end
+        if mask & SECTION_BRICKS:
+            (count,) = BRICK_COUNT.unpack_from(body, offset)
+            offset += BRICK_COUNT.size
+            end = offset + count * BRICK_CHANGE.size
+            health = self.health
+            for slot, hp in BRICK_CHANGE.iter_unpack(body[offset:end]):
+                health[slot] = hp
+            offset = end
+        if offset != len(body):
+            raise SpectateError(f"frame for tick {tick} has {len(body) - offset} stray bytes")
+        self.tick = tick
+        self.frames += 1
+
+    @property
+    def game_over(self):
+        return bool(self.flags & FLAG_GAME_OVER)
+
+    def live_bricks(self):
+        return sum(1 for hp in self.health if hp)
+
+    def view(self):
+        """Everything a spectator draws, for comparing two mirrors."""
+        return (self.tick, self.scene_width, self.scene_height, self.bricks, bytes(self.health),
+                self.score, self.lives, self.level, self.flags, self.paddle, self.balls,
+                self.powerups)
+
+
+async def watch(host=DEFAULT_HOST, port=DEFAULT_PORT, state=None, on_frame=None):
+    """Mirror the stream from a server into state until it closes; returns state."""
+    state = state if state is not None else SpectatorState()
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        magic, version = HELLO.unpack(await reader.readexactly(HELLO.size))
+        if magic != STREAM_MAGIC or version != STREAM_VERSION:
+            raise SpectateError(f"not a spectator stream (version {version})")
+        while True:
+            try:
+                header = await reader.readexactly(FRAME.size)
+            except asyncio.IncompleteReadError:
+                return state
+            length, tick, mask = FRAME.unpack(header)
+            body = await reader.readexactly(length)
+            state.apply(tick, mask, body)
+            if on_frame is not None:
+                await on_frame(state, FRAME.size + length)
+    finally:
+        writer.close()
+
+
+# === Server ===
+class Client:
+    __slots__ = ("writer", "synced", "frames", "bytes", "resyncs")
+
+    def __init__(self, writer):
+        self.writer = writer
+        # Until a keyframe reaches it, deltas mean nothing to the client
+        self.synced = False
+        self.frames = 0
+        self.bytes = 0
+        self.resyncs = 0
+
+
+class SpectatorServer:
+    """Streams a game to localhost clients from a background event loop.
+
+    publish() is the only method the game thread calls. It encodes the
+    tick's frame (and a keyframe when a client is waiting for one) and
+    queues the fan-out on the loop without waiting for it.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, max_buffer=MAX_CLIENT_BUFFER):
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.encoder = FrameEncoder()
+        self.clients = []
+        self.handlers = set()
+        self.key_wanted = False
+        # Each counter has one writer thread, so neither needs a lock
+        self.queued = 0
+        self.fanned_out = 0
+        self.loop = None
+        self.stopping = None
+        self.thread = None
+        self.error = None
+        self.ready = threading.Event()
+        # Stats
+        self.frames = 0
+        self.frame_bytes = 0
+        self.skipped = 0
+        self.failures = 0
+        self.keyframes = 0
+        self.keyframe_bytes = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.encode_seconds = 0.0
+        self.broadcast_seconds = 0.0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="spectators", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise SpectateError(f"cannot listen on {self.host}:{self.port}: {self.error}")
+        return self
+
+    def run(self):
+        try:
+            asyncio.run(self.serve())
+        except Exception as e:
+            self.error = e
+            self.ready.set()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopping = asyncio.Event()
+        server = await asyncio.start_server(self.connect, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        async with server:
+            await self.stopping.wait()
+        # Hanging up ends each client's handler
+        for client in self.clients:
+            client.writer.close()
+        if self.handlers:
+            await asyncio.wait(self.handlers)
+
+    async def connect(self, reader, writer):
+        client = Client(writer)
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        writer.write(HELLO.pack(STREAM_MAGIC, STREAM_VERSION))
+        self.clients.append(client)
+        self.key_wanted = True
+        try:
+            # Spectators only listen; wait for them to hang up
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.remove(client)
+            self.handlers.discard(task)
+            writer.close()
+
+    def stop(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.stopping.set)
+            self.thread.join()
+
+    # Game thread
+    def publish(self, game):
+        if not self.clients:
+            # Whoever connects next starts from a keyframe anyway
+            return
+        if self.queued - self.fanned_out >= MAX_PENDING_FRAMES:
+            self.skipped += 1
+            return
+        start = time.thread_time()
+        try:
+            delta = self.encoder.delta(game)
+            key = None
+            if self.key_wanted:
+                key = self.encoder.keyframe(game)
+                self.key_wanted = False
+        except Exception as e:
+            # A spectator must never take the game down. Start over from an
+            # empty encoder, whose next delta carries the whole state.
+            self.failures += 1
+            if self.failures == 1:
+                print(f"spectator frame for tick {game.tick} failed: {e!r}", file=sys.stderr)
+            self.encoder = FrameEncoder()
+            return
+        if key is not None:
+            self.keyframes += 1
+            self.keyframe_bytes += len(key)
+        self.frames += 1
+        self.frame_bytes += len(delta)
+        self.encode_seconds += time.thread_time() - start
+        self.queued += 1
+        try:
+            self.loop.call_soon_threadsafe(self.broadcast, delta, key)
+        except RuntimeError:
+            # The loop has shut down; the game goes on without spectators
+            pass
+
+    # Event loop thread
+    def broadcast(self, delta, key):
+        # Thread CPU time, so waits for the GIL are not counted as work
+        start = time.thread_time()
+        self.fanned_out += 1
+        for client in self.clients:
+            transport = client.writer.transport
+            if transport.is_closing():
+                continue
+            backlog = transport.get_write_buffer_size()
+            if client.synced:
+                if backlog > self.max_buffer:
+                    # Too far behind: stop feeding it until it drains
+                    client.synced = False
+                    client.resyncs += 1
+                    self.resyncs += 1
+                    self.dropped += 1
+                    continue
+                data = delta
+            elif backlog > self.max_buffer // 2:
+                self.dropped += 1
+                continue
+            elif key is None:
+                self.key_wanted = True
+                continue
+            else:
+                client.synced = True
+                data = key
+            transport.write(data)
+            client.frames += 1
+            client.bytes += len(data)
+            self.bytes_sent += len(data)
+        self.broadcast_seconds += time.thread_time() - start
+
+    def stats(self):
+        frames = max(1, self.frames)
+        return {
+            "clients": len(self.clients),
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "failures": self.failures,
+            "bytes_per_tick": self.frame_bytes / frames,
+            "keyframes": self.keyframes,
+            "keyframe_bytes": self.keyframe_bytes / max(1, self.keyframes),
+            "bytes_sent": self.bytes_sent,
+            "dropped": self.dropped,
+            "resyncs": self.resyncs,
+            "encode_us": self.encode_seconds / frames * 1e6,
+            "fanout_us": self.broadcast_seconds / frames * 1e6,
+        }
+
+
+# === Benchmark ===
+async def run_clients(port, count, stalled=0):
+    """Mirror a stream with count clients until the server hangs up.
+
+    stalled more clients connect and never read. Returns each mirror's
+    digest and the bytes it received.
+    """
+    states = [SpectatorState() for _ in range(count)]
+    received = [0] * count
+
+    async def one(i):
+        async def tally(state, size):
+            received[i] += size
+        await watch(port=port, state=states[i], on_frame=tally)
+
+    stalls = [await asyncio.open_connection(DEFAULT_HOST, port) for _ in range(stalled)]
+    await asyncio.gather(*(one(i) for i in range(count)))
+    for reader, writer in stalls:
+        writer.close()
+    return {"digests": [view_digest(state.view()) for state in states], "bytes": received}
+
+
+def view_digest(view):
+    return hashlib.md5(repr(view).encode()).hexdigest()
+
+
+def expected_view(game):
+    """What a perfectly synced client shows for game."""
+    encoder = FrameEncoder()
+    encoder.delta(game)
+    key = encoder.keyframe(game)
+    length, tick, mask = FRAME.unpack_from(key)
+    state = SpectatorState()
+    state.apply(tick, mask, key[FRAME.size:])
+    return state.view()
+
+
+def bench(clients=100, ticks=1200, rate=1.0, stalled=0, seed=0, large_board=False,
+          levels=None, timeout=30.0):
+    """Stream an autoplayed game to clients and check every mirror at the end.
+
+    The clients run in a child process, as real spectators would, so the
+    game thread shares the interpreter with the server alone.
+    """
+    from soak import AutoPlayer
+
+    game = engine.Game(levels=levels, seed=seed, large_board=large_board)
+    server = SpectatorServer(port=0).start()
+    game.spectators = server
+    child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "clients",
+                              "--port", str(server.port), "--count", str(clients),
+                              "--stalled", str(stalled)], stdout=subprocess.PIPE)
+    try:
+        deadline = time.perf_counter() + timeout
+        while len(server.clients) < clients + stalled:
+            if time.perf_counter() > deadline or child.poll() is not None:
+                raise SpectateError(f"only {len(server.clients)} clients connected")
+            time.sleep(0.01)
+
+        player = AutoPlayer(game)
+        tick_seconds = engine.TICK_SECONDS / rate if rate else 0.0
+        step_time = 0.0
+        worst_step = 0.0
+        start = time.perf_counter()
+        for i in range(ticks):
+            player.play()
+            t = time.perf_counter()
+            game.step()
+            elapsed = time.perf_counter() - t
+            step_time += elapsed
+            worst_step = max(worst_step, elapsed)
+            if tick_seconds:
+                delay = start + (i + 1) * tick_seconds - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+        seconds = time.perf_counter() - start
+
+        # Send whatever skipped ticks left out, then hang up; closing a
+        # transport still flushes what it buffered
+        game.spectators = None
+        deadline = time.perf_counter() + timeout
+        while server.queued != server.fanned_out and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        server.publish(game)
+    finally:
+        server.stop()
+    stats = server.stats()
+    output, _ = child.communicate(timeout=timeout)
+    results = json.loads(output)
+    expected = view_digest(expected_view(game))
+    stats.update({
+        "ticks": ticks,
+        "seconds": seconds,
+        "watchers": clients,
+        "stalled": stalled,
+        "in_sync": results["digests"].count(expected),
+        "client_bytes_per_tick": sum(results["bytes"]) / max(1, clients) / ticks,
+        "step_ms": step_time / ticks * 1000,
+        "worst_step_ms": worst_step * 1000,
+    })
+    return stats
+
+
+# === CLI ===
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch or benchmark Breakout spectator streams.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    watcher = commands.add_parser("watch", help="mirror a running game and print its state")
+    watcher.add_argument("--host", default=DEFAULT_HOST)
+    watcher.add_argument("--port", type=int, default=DEFAULT_PORT)
+    bencher = commands.add_parser("bench", help="measure frame size and fan-out")
+    bencher.add_argument("--clients", type=int, default=100)
+    bencher.add_argument("--ticks", type=int, default=1200)
+    bencher.add_argument("--rate", type=float, default=1.0,
+                         help="speed relative to real time; 0 runs uncapped (default 1)")
+    bencher.add_argument("--stalled", type=int, default=0,
+                         help="extra clients that connect and never read")
+    bencher.add_argument("--seed", type=int, default=0)
+    bencher.add_argument("--large-board", action="store_true")
+    bencher.add_argument("--levels", help="level pack to play")
+    # The benchmark's client process
+    clients = commands.add_parser("clients")
+    clients.add_argument("--port", type=int, default=DEFAULT_PORT)
+    clients.add_argument("--count", type=int, default=100)
+    clients.add_argument("--stalled", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == "watch":
+        return watch_main(args.host, args.port)
+    if args.command == "clients":
+        print(json.dumps(asyncio.run(run_clients(args.port, args.count, args.stalled))))
+        return 0
+
+    pack = None
+    if args.levels:
+        import levels
+        pack = levels.load(args.levels)
+    stats = bench(args.clients, args.ticks, args.rate, args.stalled, args.seed,
+                  args.large_board, pack)
+    print(f"{stats['watchers']} clients (+{stats['stalled']} stalled), {stats['ticks']} ticks "
+          f"in {stats['seconds']:.2f}s")
+    print(f"  frame {stats['bytes_per_tick']:.1f} bytes/tick, keyframe "
+          f"{stats['keyframe_bytes']:.0f} bytes x{stats['keyframes']}, "
+          f"{stats['client_bytes_per_tick']:.1f} bytes/tick per client")
+    print(f"  encode {stats['encode_us']:.1f} us/tick on the game thread, fan-out "
+          f"{stats['fanout_us']:.1f} us/tick on the server thread")
+    print(f"  step {stats['step_ms']:.3f} ms/tick, worst {stats['worst_step_ms']:.3f} ms; "
+          f"{stats['skipped']} ticks skipped, {stats['dropped']} frames dropped, "
+          f"{stats['resyncs']} resyncs")
+    print(f"  {stats['in_sync']}/{stats['watchers']} clients in sync at the end")
+    return 0 if stats["in_sync"] == stats["watchers"] else 1
+
+
+def watch_main(host, port):
+    last = [time.perf_counter(), 0]
+
+    async def report(state, size):
+        last[1] += size
+        now = time.perf_counter()
+        if now - last[0] >= 1.0:
+            print(f"tick {state.tick:>8}  score {state.score:>6}  lives {state.lives}  "
+                  f"level {state.level:>3}  balls {len(state.balls):>4}  "
+                  f"bricks {state.live_bricks():>5}  {last[1] / (now - last[0]) / 1024:.1f} KB/s")
+            last[:] = [now, 0]
+
+    try:
+        asyncio.run(watch(host, port, on_frame=report))
+    except (OSError, SpectateError) as e:
+        print(f"watch failed: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())